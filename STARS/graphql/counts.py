@@ -0,0 +1,139 @@
+"""
+Approximate totalCount for large connections.
+
+`totalCount` is an exact COUNT(*) of the filtered queryset on every page
+load. Connections built on CountedConnection also offer
+`approximateTotalCount { count isExact }`, which clients opt into when a
+"about 12,000 reviews" is good enough:
+
+- Unfiltered querysets read the table's row estimate from
+  pg_class.reltuples (kept up to date by autovacuum/ANALYZE).
+- Filtered querysets reuse a count cached in the last
+  GRAPHQL_COUNT_CACHE_TTL seconds, or ask the planner (EXPLAIN) how many
+  rows they match.
+- Estimates below GRAPHQL_APPROXIMATE_COUNT_THRESHOLD are cheap to count,
+  so they are counted exactly (and cached), under a
+  GRAPHQL_EXACT_COUNT_TIMEOUT_MS statement timeout in case the planner was
+  wrong; the estimate is returned when it runs out.
+
+Only root Query fields use CountedConnection: the optimizer prefetches
+nested connections only when they are exactly DjangoCursorConnection.
+Databases other than PostgreSQL are always counted exactly.
+"""
+import hashlib
+import json
+
+import strawberry
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections, transaction
+from django.db.models import QuerySet
+from strawberry import relay
+from strawberry_django.optimizer import is_optimized_by_prefetching
+from strawberry_django.pagination import get_total_count
+from strawberry_django.relay import DjangoCursorConnection
+from strawberry_django.resolvers import django_resolver
+
+COUNT_CACHE_PREFIX = "gql_count"
+
+
+@strawberry.type(description="A number of rows, counted or estimated by the database.")
+class TotalCountEstimate:
+    count: int
+    is_exact: bool = strawberry.field(description="False when `count` is a planner estimate or a recently cached count.")
+
+
+def _is_unfiltered(qs: QuerySet) -> bool:
+    query = qs.query
+    return (
+        not query.where and not query.distinct and query.group_by is None and not query.combinator
+        and query.low_mark == 0 and query.high_mark is None
+    )
+
+
+def _table_estimate(qs: QuerySet) -> int:
+    """pg_class.reltuples for the queryset's table, -1 when it was never analyzed."""
+    with connections[qs.db].cursor() as cursor:
+        cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [qs.model._meta.db_table])
+        row = cursor.fetchone()
+    return int(row[0]) if row else -1
+
+
+def plan_rows(explained: str) -> int:
+    """Row estimate of the top plan node in EXPLAIN (FORMAT JSON) output, as QuerySet.explain returns it."""
+    plan = json.loads(explained)
+    # psycopg decodes the json column into [{"Plan": ...}] and Django re-encodes each element,
+    # so the list is usually gone; a driver returning the raw text keeps it
+    if isinstance(plan, list):
+        plan = plan[0]
+    return int(plan["Plan"]["Plan Rows"])
+
+
+def _planner_estimate(qs: QuerySet) -> int:
+    return plan_rows(qs.order_by().explain(format="json"))
+
+
+def _cache_key(qs: QuerySet) -> str:
+    sql, params = qs.order_by().query.sql_with_params()
+    digest = hashlib.sha256(f"{qs.db}:{sql}:{params!r}".encode()).hexdigest()[:32]
+    return f"{COUNT_CACHE_PREFIX}:{digest}"
+
+
+def _bounded_count(qs: QuerySet):
+    """The exact count, or None when it takes longer than GRAPHQL_EXACT_COUNT_TIMEOUT_MS."""
+    try:
+        with transaction.atomic(using=qs.db):
+            with connections[qs.db].cursor() as cursor:
+                cursor.execute("SET LOCAL statement_timeout = %s", [settings.GRAPHQL_EXACT_COUNT_TIMEOUT_MS])
+            return qs.count()
+    except DatabaseError as e:
+        print(f"Exact count gave up, using the estimate: {e}")
+        return None
+
+
+def _cache_call(func, *args):
+    # A cache outage only costs the reuse
+    try:
+        return func(*args)
+    except Exception as e:
+        print(f"Count cache unavailable: {e}")
+        return None
+
+
+def estimate_count(qs: QuerySet) -> TotalCountEstimate:
+    """Exact count when it is cheap, an estimate otherwise (sync)."""
+    if qs.query.is_empty():
+        return TotalCountEstimate(count=0, is_exact=True)
+    if is_optimized_by_prefetching(qs) or connections[qs.db].vendor != "postgresql":
+        return TotalCountEstimate(count=get_total_count(qs), is_exact=True)
+
+    threshold = settings.GRAPHQL_APPROXIMATE_COUNT_THRESHOLD
+    if _is_unfiltered(qs):
+        estimate = _table_estimate(qs)
+        if estimate >= threshold:
+            return TotalCountEstimate(count=estimate, is_exact=False)
+
+    key = _cache_key(qs)
+    cached = _cache_call(cache.get, key)
+    if cached is not None:
+        return TotalCountEstimate(count=cached, is_exact=False)
+
+    estimate = _planner_estimate(qs)
+    if estimate >= threshold:
+        return TotalCountEstimate(count=estimate, is_exact=False)
+
+    count = _bounded_count(qs)
+    if count is None:
+        return TotalCountEstimate(count=estimate, is_exact=False)
+    _cache_call(cache.set, key, count, settings.GRAPHQL_COUNT_CACHE_TTL)
+    return TotalCountEstimate(count=count, is_exact=True)
+
+
+# Nested fields keep UserCursorConnection and friends (see pagination.py), so root ones need their own name
+@strawberry.type(name="CountedConnection", description="A connection to a list of items.")
+class CountedConnection(DjangoCursorConnection[relay.NodeType]):
+    @strawberry.field(description="Total quantity of nodes, estimated on large tables (see totalCount for an exact one).")
+    def approximate_total_count(self) -> TotalCountEstimate:
+        assert self.total_count_qs is not None
+        # The count needs a query, so it runs in a thread under async
+        return django_resolver(estimate_count, qs_hook=None)(self.total_count_qs)
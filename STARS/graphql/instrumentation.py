@@ -0,0 +1,280 @@
+"""
+Per-resolver timing and SQL accounting for GraphQL operations.
+
+A sampled operation (GRAPHQL_INSTRUMENTATION_SAMPLE_RATE, or any request
+with the `X-Stars-Timing: 1` header from staff or under DEBUG) records:
+
+- wall time per resolver path ("reviews.edges.node.user"), for root fields,
+  relations and fields with their own resolver. Plain columns are not timed.
+  Paths are made of field names, so aliased fields share their field's path.
+- SQL query count and time, overall and per resolver path, through an
+  execute_wrapper installed on every database connection (see
+  install_query_recorder).
+- cache hits and misses of STARS/utils/cache.py, per key prefix.
+- thread hops: resolver calls that ran SQL. Queries cannot run on the event
+  loop, so each of them crossed into a sync_to_async thread at least once.
+
+Sampled operations feed the histograms in STARS/services/metrics.py. With
+the header, the numbers also come back under `extensions.timing`. Operations
+that are not sampled pay one context variable lookup per field and query;
+only their total duration and SQL query count are recorded.
+"""
+import contextvars
+import random
+import time
+from collections import defaultdict
+from inspect import isawaitable
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from graphql import FieldNode, FragmentSpreadNode
+from strawberry.extensions import SchemaExtension
+from strawberry.types.graphql import OperationType
+
+from STARS.services.metrics import COUNT_BUCKETS, counter, histogram
+
+DEBUG_HEADER = "HTTP_X_STARS_TIMING"
+# Resolver paths listed in a debug response, slowest first
+DEBUG_TOP_PATHS = 50
+
+REQUEST_SECONDS = histogram(
+    "stars_graphql_request_duration_seconds", "Wall time of GraphQL operations", ["operation", "cache"],
+)
+DB_QUERIES = counter("stars_db_queries_total", "SQL queries executed", ["database"])
+
+OPERATION_SECONDS = histogram(
+    "stars_graphql_operation_duration_seconds", "Wall time of sampled GraphQL operations", ["operation"],
+)
+OPERATION_QUERIES = histogram(
+    "stars_graphql_operation_sql_queries", "SQL queries per sampled GraphQL operation", ["operation"],
+    buckets=COUNT_BUCKETS,
+)
+RESOLVER_SECONDS = histogram(
+    "stars_graphql_resolver_duration_seconds", "Wall time per resolver call in sampled operations", ["path"],
+)
+RESOLVER_QUERIES = counter(
+    "stars_graphql_resolver_sql_queries_total", "SQL queries per resolver path in sampled operations", ["path"],
+)
+OPERATION_HOPS = histogram(
+    "stars_graphql_operation_thread_hops", "Resolver calls that ran SQL per sampled GraphQL operation",
+    ["operation"], buckets=COUNT_BUCKETS,
+)
+
+_recorder: contextvars.ContextVar[Optional["Recorder"]] = contextvars.ContextVar("graphql_recorder", default=None)
+# (normalized path, concrete path) of the resolver running in this context
+_path: contextvars.ContextVar[Optional[tuple]] = contextvars.ContextVar("graphql_resolver_path", default=None)
+
+
+class Recorder:
+    def __init__(self):
+        self.started = time.perf_counter()
+        # normalized path -> [calls, seconds, max seconds, queries, query seconds]
+        self.resolvers: Dict[str, list] = defaultdict(lambda: [0, 0.0, 0.0, 0, 0.0])
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.hops = set()
+        # key prefix -> [hits, misses]
+        self.cache: Dict[str, list] = defaultdict(lambda: [0, 0])
+        # response keys (aliases) -> normalized path
+        self.paths: Dict[tuple, str] = {}
+
+    def normalized_path(self, info, keys: tuple) -> str:
+        path = self.paths.get(keys)
+        if path is None:
+            path = self.paths[keys] = _field_path(info, keys)
+        return path
+
+    def resolved(self, path: str, seconds: float) -> None:
+        entry = self.resolvers[path]
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+
+    def queried(self, seconds: float) -> None:
+        self.queries += 1
+        self.query_seconds += seconds
+        current = _path.get()
+        if current is not None:
+            path, concrete = current
+            entry = self.resolvers[path]
+            entry[3] += 1
+            entry[4] += seconds
+            self.hops.add(concrete)
+
+    def as_dict(self) -> Dict[str, Any]:
+        paths = sorted(self.resolvers.items(), key=lambda item: item[1][1], reverse=True)[:DEBUG_TOP_PATHS]
+        return {
+            "durationMs": round((time.perf_counter() - self.started) * 1000, 2),
+            "sql": {"queries": self.queries, "durationMs": round(self.query_seconds * 1000, 2)},
+            "threadHops": len(self.hops),
+            "cache": {prefix: {"hits": hits, "misses": misses} for prefix, (hits, misses) in self.cache.items()},
+            "resolvers": [
+                {
+                    "path": path, "calls": calls, "durationMs": round(seconds * 1000, 2),
+                    "maxMs": round(slowest * 1000, 2), "sqlQueries": queries, "sqlMs": round(query_seconds * 1000, 2),
+                }
+                for path, (calls, seconds, slowest, queries, query_seconds) in paths
+            ],
+        }
+
+
+def _record_query(execute, sql, params, many, context):
+    DB_QUERIES.inc(database=context["connection"].alias)
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.queried(time.perf_counter() - start)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created receiver (see signals.py)."""
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def record_cache(key_prefix: str, hit: bool) -> None:
+    recorder = _recorder.get()
+    if recorder is not None:
+        recorder.cache[key_prefix][0 if hit else 1] += 1
+
+
+_operation_labels = set()
+
+
+def operation_label(name: Optional[str]) -> str:
+    """Metric label for an operation name. Clients pick names, so only the first few hundred are kept apart."""
+    if not name:
+        return "anonymous"
+    if name not in _operation_labels:
+        if len(_operation_labels) >= settings.METRICS_MAX_OPERATION_NAMES:
+            return "other"
+        _operation_labels.add(name)
+    return name
+
+
+def _find_field(selections, key: str, fragments) -> Optional[FieldNode]:
+    for selection in selections:
+        if isinstance(selection, FieldNode):
+            if (selection.alias or selection.name).value == key:
+                return selection
+            continue
+        if isinstance(selection, FragmentSpreadNode):
+            fragment = fragments.get(selection.name.value)
+            selection_set = fragment.selection_set if fragment else None
+        else:
+            selection_set = selection.selection_set
+        found = _find_field(selection_set.selections, key, fragments) if selection_set else None
+        if found is not None:
+            return found
+    return None
+
+
+def _field_path(info, keys: tuple) -> str:
+    """
+    "reviews.edges.node.user" for the response keys of a resolver. Aliases are
+    chosen by clients, so they are traced back to field names in the document.
+    """
+    names = []
+    selections = info.operation.selection_set.selections
+    for key in keys[:-1]:
+        field = _find_field(selections, key, info.fragments)
+        if field is None:
+            names.append("?")
+            selections = ()
+            continue
+        names.append(field.name.value)
+        selections = field.selection_set.selections if field.selection_set else ()
+    names.append(info.field_name)
+    return ".".join(names)
+
+
+def _timed(info) -> bool:
+    if info.parent_type is info.schema.query_type or info.parent_type is info.schema.mutation_type:
+        return True
+    field = info.parent_type.fields[info.field_name].extensions.get("strawberry-definition")
+    return field is not None and (field.base_resolver is not None or getattr(field, "is_relation", False))
+
+
+class InstrumentationExtension(SchemaExtension):
+    recorder: Optional[Recorder] = None
+    debug: bool = False
+
+    async def _debug_requested(self) -> bool:
+        request = getattr(self.execution_context.context, "request", None)
+        if request is None or request.META.get(DEBUG_HEADER) != "1":
+            return False
+        if settings.DEBUG:
+            return True
+        user = await request.auser() if hasattr(request, "auser") else getattr(request, "user", None)
+        return user is not None and user.is_staff
+
+    async def on_operation(self):
+        started = time.perf_counter()
+        self.recorder = None
+        self.debug = await self._debug_requested()
+        if not self.debug and random.random() >= settings.GRAPHQL_INSTRUMENTATION_SAMPLE_RATE:
+            yield
+            self._record_request(started)
+            return
+
+        recorder = self.recorder = Recorder()
+        token = _recorder.set(recorder)
+        try:
+            yield
+        finally:
+            _recorder.reset(token)
+        operation = self._record_request(started)
+        OPERATION_SECONDS.observe(time.perf_counter() - recorder.started, operation=operation)
+        OPERATION_QUERIES.observe(recorder.queries, operation=operation)
+        OPERATION_HOPS.observe(len(recorder.hops), operation=operation)
+        for path, (calls, seconds, _, queries, _) in recorder.resolvers.items():
+            if calls:
+                RESOLVER_SECONDS.observe(seconds / calls, path=path)
+            if queries:
+                RESOLVER_QUERIES.inc(queries, path=path)
+
+    def _record_request(self, started: float) -> str:
+        context = self.execution_context
+        operation = operation_label(context.operation_name)
+        if context.operation_type != OperationType.SUBSCRIPTION:
+            REQUEST_SECONDS.observe(time.perf_counter() - started, operation=operation, cache="miss")
+        return operation
+
+    def resolve(self, _next, root, info, *args, **kwargs):
+        recorder = _recorder.get()
+        if recorder is None or not _timed(info):
+            return _next(root, info, *args, **kwargs)
+
+        keys = info.path.as_list()
+        path = (
+            recorder.normalized_path(info, tuple(k for k in keys if not isinstance(k, int))),
+            ".".join(str(k) for k in keys),
+        )
+        token = _path.set(path)
+        start = time.perf_counter()
+        try:
+            result = _next(root, info, *args, **kwargs)
+        finally:
+            _path.reset(token)
+        if not isawaitable(result):
+            recorder.resolved(path[0], time.perf_counter() - start)
+            return result
+
+        async def _await():
+            token = _path.set(path)
+            try:
+                return await result
+            finally:
+                _path.reset(token)
+                recorder.resolved(path[0], time.perf_counter() - start)
+
+        return _await()
+
+    def get_results(self) -> Dict[str, Any]:
+        if self.recorder is None or not self.debug:
+            return {}
+        return {"timing": self.recorder.as_dict()}
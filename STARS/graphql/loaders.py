@@ -0,0 +1,95 @@
+"""
+Per-request DataLoaders for viewer-state fields.
+
+Fields like Review.likedByCurrentUser used to run one exists() query (and one
+thread hop) per object. Their resolvers now load through the loaders below,
+so a page of N reviews costs one query per field instead of N.
+
+Loaders are created on first use and kept on the request's context, which
+makes their caches last exactly one request (or one subscription).
+"""
+from typing import Dict, List, Tuple
+
+from asgiref.sync import sync_to_async
+from django.db.models import Min, Q
+from strawberry.dataloader import DataLoader
+from strawberry.types import Info
+
+from STARS import models
+
+CONTEXT_ATTRIBUTE = "stars_loaders"
+
+
+def current_user(info: Info):
+    context = info.context
+    if isinstance(context, dict):
+        return context.get("user")
+    request = getattr(context, "request", None)
+    return getattr(request, "user", None)
+
+
+class ViewerLoaders:
+    def __init__(self, user):
+        # request.user is lazy and may hit the session table, so it is only
+        # looked at inside the sync queries
+        self.user = user
+        # model -> DataLoader of (liked, disliked) by primary key
+        self._reactions: Dict[type, DataLoader] = {}
+        self.first_review_date = DataLoader(load_fn=self._load_first_review_dates)
+
+    def reactions(self, model) -> DataLoader:
+        loader = self._reactions.get(model)
+        if loader is None:
+            loader = self._reactions[model] = DataLoader(load_fn=lambda pks: self._load_reactions(model, pks))
+        return loader
+
+    async def _load_reactions(self, model, pks: List[int]) -> List[Tuple[bool, bool]]:
+        def _query():
+            if self.user is None or self.user.is_anonymous:
+                return [(False, False)] * len(pks)
+            # Both flags in one thread hop: one IN query per relation
+            liked = set(
+                model.liked_by.through.objects
+                .filter(**{f"{model._meta.model_name}_id__in": pks, "user_id": self.user.pk})
+                .values_list(f"{model._meta.model_name}_id", flat=True)
+            )
+            disliked = set(
+                model.disliked_by.through.objects
+                .filter(**{f"{model._meta.model_name}_id__in": pks, "user_id": self.user.pk})
+                .values_list(f"{model._meta.model_name}_id", flat=True)
+            )
+            return [(pk in liked, pk in disliked) for pk in pks]
+
+        return await sync_to_async(_query)()
+
+    async def _load_first_review_dates(self, keys: List[Tuple[int, int, int]]):
+        """Earliest review date per (user_id, content_type_id, object_id)."""
+        def _query():
+            match = Q()
+            for user_id, content_type_id, object_id in set(keys):
+                match |= Q(user_id=user_id, content_type_id=content_type_id, object_id=object_id)
+            first = {
+                (row["user_id"], row["content_type_id"], row["object_id"]): row["first"]
+                for row in models.Review.objects.filter(match)
+                .order_by()
+                .values("user_id", "content_type_id", "object_id")
+                .annotate(first=Min("date_created"))
+            }
+            return [first.get(key) for key in keys]
+
+        return await sync_to_async(_query)()
+
+
+def get_loaders(info: Info) -> ViewerLoaders:
+    context = info.context
+    if isinstance(context, dict):
+        loaders = context.get(CONTEXT_ATTRIBUTE)
+        if loaders is None:
+            loaders = context[CONTEXT_ATTRIBUTE] = ViewerLoaders(current_user(info))
+        return loaders
+
+    loaders = getattr(context, CONTEXT_ATTRIBUTE, None)
+    if loaders is None:
+        loaders = ViewerLoaders(current_user(info))
+        setattr(context, CONTEXT_ATTRIBUTE, loaders)
+    return loaders
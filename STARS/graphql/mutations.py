@@ -2,26 +2,25 @@ import strawberry
 import strawberry_django
 import re
 import os
-import requests
 from strawberry import auto
-from typing import List, Optional
+from typing import Callable, List, Optional
 from django.contrib.auth.models import User
 from asgiref.sync import sync_to_async
 from channels.db import database_sync_to_async
 from asgiref.sync import async_to_sync
 from django.db.models import Count, Q
 from strawberry.types import Info
+from strawberry.types.base import StrawberryList, StrawberryOptional, has_object_definition
 from django.contrib.auth import password_validation, login, authenticate, logout
 from django.core.exceptions import ValidationError
 from django.db import transaction
 from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
 import enum
 from datetime import datetime
 from .subscriptions import broadcast_conversation_update, broadcast_message_event
 from ..services.itunes import iTunesService  # Ensure this service exists from previous step
-from dateutil import parser
 import asyncio
-import colorsys
 
 
 
@@ -33,12 +32,19 @@ from allauth.socialaccount.models import SocialApp, SocialLogin, SocialToken
 
 from . import types
 
-import base64
-import tempfile
-import cloudinary.uploader
 from django.db import transaction
 from STARS import models
 from ..services.apple_music import AppleMusicService
+from ..services import media_uploads
+from ..services.images import process_image_from_url
+from ..services.image_pool import ImageIngestionPool
+from ..services.podcast_import import bulk_import_podcasts
+from ..services.project_import import import_project
+from ..services.http import get_sync_client
+from ..services import jobs
+from ..services.podcast_feeds import refresh_podcast_descriptions
+from ..utils.cache import CacheKeys, invalidate_pattern
+from ..utils.colors import muted_palette
 
 def get_high_res_artwork(url: str) -> str:
     if not url: return ""
@@ -55,123 +61,6 @@ ITUNES_GENRES = {
 }
 
 
-def ensure_muted_color(hex_color: str, max_saturation: float = 0.5) -> str:
-    """
-    Parses a hex color, converts to HLS, and caps the saturation.
-    Returns the modified hex string.
-    """
-    if not hex_color:
-        return None
-
-    # 1. Clean the hex string
-    hex_clean = hex_color.lstrip('#')
-    if len(hex_clean) != 6:
-        return hex_color  # Return original if malformed
-
-    # 2. Convert Hex to RGB (0-1 range)
-    r = int(hex_clean[0:2], 16) / 255.0
-    g = int(hex_clean[2:4], 16) / 255.0
-    b = int(hex_clean[4:6], 16) / 255.0
-
-    # 3. Convert RGB to HLS (Hue, Lightness, Saturation)
-    h, l, s = colorsys.rgb_to_hls(r, g, b)
-
-    # 4. "Add Gray" / Desaturate
-    # If the color is more vibrant than our limit, we clamp it down.
-    if s > max_saturation:
-        s = max_saturation
-
-        # 5. Convert back to RGB
-    r_new, g_new, b_new = colorsys.hls_to_rgb(h, l, s)
-
-    # 6. Convert back to Hex
-    def to_int(val):
-        return max(0, min(255, int(val * 255)))
-
-    return f"#{to_int(r_new):02x}{to_int(g_new):02x}{to_int(b_new):02x}"
-
-
-def process_image_from_url(image_url: str):
-    """
-    Downloads image from a URL, uploads to Cloudinary, extracts colors,
-    and mutes them if they are too vibrant.
-    Returns: (secure_url, primary_color, secondary_color)
-    """
-    if not image_url:
-        return None, None, None
-
-    # Apple Music URLs often come as '.../100x100bb.jpg' or with placeholders '{w}x{h}'
-    if "{w}" in image_url and "{h}" in image_url:
-        final_url = image_url.replace("{w}", "1024").replace("{h}", "1024")
-    else:
-        final_url = image_url
-
-    try:
-        response = requests.get(final_url, stream=True)
-        if response.status_code != 200:
-            return None, None, None
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as temp_file:
-            for chunk in response.iter_content(chunk_size=4096):
-                temp_file.write(chunk)
-            temp_file.flush()
-
-            # Upload to Cloudinary
-            upload_result = cloudinary.uploader.upload(temp_file.name, colors=True)
-
-        os.unlink(temp_file.name)
-
-        url = upload_result.get("secure_url")
-        raw_colors = upload_result.get("colors", [])
-
-        # Get raw hex colors
-        raw_primary = raw_colors[0][0] if len(raw_colors) > 0 else None
-        raw_secondary = raw_colors[1][0] if len(raw_colors) > 1 else None
-
-        # --- THE MAGIC HAPPENS HERE ---
-        # We process the colors to ensure they aren't eye-straining.
-        # 0.5 to 0.6 is usually a good "comfortable" saturation limit.
-        primary = ensure_muted_color(raw_primary, max_saturation=0.55)
-        secondary = ensure_muted_color(raw_secondary, max_saturation=0.55)
-
-        return url, primary, secondary
-
-    except Exception as e:
-        print(f"Error processing image: {e}")
-        return None, None, None
-
-
-def get_or_create_project_genres(genre_names: List[str], project):
-    if not genre_names:
-        return
-
-    # 1. Deduplicate while preserving order and filter out generic labels
-    unique_names = [name for name in dict.fromkeys(genre_names) if name != "Music"]
-
-    for i, name in enumerate(unique_names, start=1):
-        genre_obj, _ = models.MusicGenre.objects.get_or_create(title=name)
-        models.ProjectGenresOrdered.objects.create(
-            project=project,
-            genre=genre_obj,
-            position=i
-        )
-
-
-def get_or_create_song_genres(genre_names: List[str], song):
-    if not genre_names:
-        return
-
-    unique_names = [name for name in dict.fromkeys(genre_names) if name != "Music"]
-
-    for i, name in enumerate(unique_names, start=1):
-        genre_obj, _ = models.MusicGenre.objects.get_or_create(title=name)
-        models.SongGenresOrdered.objects.create(
-            song=song,
-            genre=genre_obj,
-            position=i
-        )
-
-
 def get_or_create_artist_genres(genre_names: List[str], artist):
     if not genre_names:
         return
@@ -399,6 +288,7 @@ class MessageDataInput:
     text: Optional[str] = None
     media_data: Optional[str] = None # Use this for Base64 (Camera/Gallery)
     media_url: Optional[str] = None  # NEW: Use this for direct links (Klipy/GIPHY)
+    upload_id: Optional[strawberry.ID] = None # Finished upload from POST /uploads/
     message_type: str = "TEXT"
     replying_to_messsage_id: Optional[str] = None
 
@@ -406,7 +296,8 @@ class MessageDataInput:
 
 @strawberry.input
 class CoverDataInput:
-    image_file: str
+    image_file: Optional[str] = None # Base64, kept for older clients
+    upload_id: Optional[strawberry.ID] = None # Finished upload from POST /uploads/
 
 
 @strawberry.input
@@ -437,6 +328,9 @@ class SearchHistoryCreateInput:
     category: str
 
 
+# Artist pictures processed at once while importing
+ARTIST_PICTURE_CONCURRENCY = 8
+
 MARINA_AND_THE_DIAMONDS_ID = "306359292"
 MARINA_ID = "1451242169"
 
@@ -455,23 +349,48 @@ def _format_list_to_string(items: List[str]) -> str:
     return f"{', '.join(items[:-1])} & {items[-1]}"
 
 async def _fetch_missing_artist_data(am_ids: set, am_service) -> dict:
+    if not am_ids:
+        return {}
+
+    # One query for the IDs we already have
+    existing_ids = set(await sync_to_async(list)(
+        models.Artist.objects.filter(apple_music_id__in=am_ids).values_list("apple_music_id", flat=True)
+    ))
+    missing_ids = [am_id for am_id in am_ids if am_id not in existing_ids]
+    if not missing_ids:
+        return {}
+
+    # Batched bulk lookup instead of one request per artist
+    try:
+        artists_json = await am_service.get_artists_by_ids(missing_ids, country="us")
+    except Exception:
+        return {}
+
+    # Pictures downloaded and hosted concurrently, with a bound
+    pictures = {}
+
+    async def _on_picture(am_id, result):
+        pictures[am_id] = result
+
+    pool = ImageIngestionPool(concurrency=ARTIST_PICTURE_CONCURRENCY, on_progress=lambda stats: None)
+    await pool.run(
+        [(a["id"], a.get("attributes", {}).get("artwork", {}).get("url", "")) for a in artists_json],
+        _on_picture,
+    )
+
     artists_data = {}
-    for am_id in am_ids:
-        exists = await sync_to_async(models.Artist.objects.filter(apple_music_id=am_id).exists)()
-        if exists: continue
-        try:
-            artist_json = await am_service.get_artist(f"/v1/catalog/us/artists/{am_id}")
-            attrs = artist_json.get("attributes", {})
-            pic_url, primary, secondary = await sync_to_async(process_image_from_url)(attrs.get("artwork", {}).get("url", ""))
-            artists_data[am_id] = {
-                "name": attrs.get("name", ""),
-                "apple_music_url": attrs.get("url", ""),
-                "picture": pic_url or "",
-                "primary_color": primary,
-                "secondary_color": secondary,
-                "genres": attrs.get("genreNames", [])
-            }
-        except Exception: pass
+    for artist_json in artists_json:
+        am_id = artist_json["id"]
+        attrs = artist_json.get("attributes", {})
+        pic_url, primary, secondary = pictures.get(am_id, (None, None, None))
+        artists_data[am_id] = {
+            "name": attrs.get("name", ""),
+            "apple_music_url": attrs.get("url", ""),
+            "picture": pic_url or "",
+            "primary_color": primary,
+            "secondary_color": secondary,
+            "genres": attrs.get("genreNames", [])
+        }
     return artists_data
 
 async def _fetch_performance_artists(am_ids: set, am_service) -> dict:
@@ -484,6 +403,27 @@ async def _process_cover(cover_url: str):
         return await sync_to_async(process_image_from_url)(cover_url)
     except Exception: return None, None, None
 
+async def _resolve_cover_image(user, data: CoverDataInput, fallback_color: Optional[str] = None):
+    """
+    Returns (url, primary_color, secondary_color) for a CoverDataInput, either from
+    a finished upload (preferred) or from a legacy base64 payload.
+    """
+    if data.upload_id:
+        upload = await media_uploads.get_completed_upload(
+            data.upload_id, user, kind=models.MediaUpload.MediaKind.IMAGE
+        )
+        primary, secondary = muted_palette(
+            [c for c in (upload.primary_color, upload.secondary_color) if c], fallback=fallback_color
+        )
+        return upload.url, primary, secondary
+
+    if data.image_file:
+        return await media_uploads.store_base64_media(
+            data.image_file, models.MediaUpload.MediaKind.IMAGE, fallback_color=fallback_color
+        )
+
+    raise Exception("An upload_id or image_file is required.")
+
 def _create_artist_from_data(am_id: str, adata: dict) -> models.Artist:
     artist = models.Artist.objects.create(
         apple_music_id=am_id, name=adata["name"], picture=adata["picture"],
@@ -500,97 +440,7 @@ def _get_or_create_artist_node(am_id: str, fetched_data: dict) -> Optional[model
     return artist
 
 
-def _determine_project_type(is_single: bool, song_count: int, songs: List) -> str:
-    """
-    Determine project type following Apple Music's classification rules:
-    SINGLE:
-    - 1-3 tracks, each under 10 minutes
-    EP:
-    - 4-6 tracks with total duration under 30 minutes
-    - OR 1-3 tracks where at least one track is 10+ minutes (under 30 min total)
-    ALBUM:
-    - 7+ tracks (regardless of duration)
-    - OR any project over 30 minutes total duration
-    """
-
-    # Calculate total length in minutes
-
-    total_length_ms = sum(s.length or 0 for s in songs)
-    total_length_minutes = total_length_ms / 60000
-
-    # ALBUM: 7+ tracks or total duration over 30 minutes
-    if song_count >= 7 or total_length_minutes > 30:
-        return models.Project.ProjectType.ALBUM
-
-    # For 1-3 tracks
-    if song_count <= 3:
-        # Check if any track is 10+ minutes (600,000 ms)
-        has_long_track = any((s.length or 0) >= 600000 for s in songs)
-        if has_long_track:
-            # 1-3 tracks with at least one 10+ min track = EP (if under 30 min total)
-            if total_length_minutes <= 30:
-                return models.Project.ProjectType.EP
-            else:
-                return models.Project.ProjectType.ALBUM
-        else:
-            # 1-3 tracks, all under 10 minutes = SINGLE
-            return models.Project.ProjectType.SINGLE
-
-    # EP: 4-6 tracks with under 30 minutes total
-    if 4 <= song_count <= 6:
-        if total_length_minutes <= 30:
-            return models.Project.ProjectType.EP
-        else:
-            # Over 30 minutes = ALBUM
-            return models.Project.ProjectType.ALBUM
-
-    # Default fallback (shouldn't reach here with valid data)
-    return models.Project.ProjectType.ALBUM
-
-def _link_artists_to_song(song_obj, am_ids: List[str], get_artist_fn):
-    unique_ids = list(dict.fromkeys(am_ids))
-    for j, s_am_id in enumerate(unique_ids):
-        s_artist = get_artist_fn(s_am_id)
-        if s_artist:
-            models.SongArtist.objects.create(song=song_obj, artist=s_artist, position=j + 1)
-
-def _get_or_create_song(song_in, get_artist_fn, info: strawberry.Info) -> Optional[models.Song]:
-    if song_in.song_id: return models.Song.objects.filter(pk=song_in.song_id).first()
-    song_obj = models.Song.objects.create(
-        apple_music_id=song_in.apple_music_id, title=song_in.title,
-        length=song_in.length or 0, preview=song_in.preview_url,
-        apple_music=song_in.apple_music_url, release_date=song_in.release_date,
-        is_out=song_in.is_out, user=info.context.request.user
-    )
-    if song_in.genres: get_or_create_song_genres(song_in.genres, song_obj)
-    if song_in.artists_apple_music_ids:
-        _link_artists_to_song(song_obj, song_in.artists_apple_music_ids, get_artist_fn)
-    return song_obj
-
-def _handle_project_songs(project, song_inputs, get_artist_fn, info: strawberry.Info) -> int:
-    total_length = 0
-    for song_in in song_inputs:
-        song_obj = _get_or_create_song(song_in, get_artist_fn, info)
-        if song_obj:
-            models.ProjectSong.objects.create(
-                project=project, song=song_obj, position=song_in.position, disc_number=song_in.disc_number
-            )
-            total_length += song_obj.length
-    return total_length
-
-def _apply_project_metadata(project, data, cover_data, info: strawberry.Info):
-    if data.genres: get_or_create_project_genres(data.genres, project)
-    cover_url, p, s = cover_data
-    if cover_url:
-        models.Cover.objects.create(image=cover_url, content_object=project, position=1, primary_color=p, secondary_color=s, is_confirmed=True, user=info.context.request.user)
-
-def _link_project_artists(project, am_ids, get_artist_fn):
-    for i, am_id in enumerate(am_ids or []):
-        artist = get_artist_fn(am_id)
-        if artist:
-            models.ProjectArtist.objects.create(project=project, artist=artist, position=i + 1)
-
-def _resolve_or_create_event(data: PerformanceVideoInput, info: strawberry.Info) -> Optional[models.Event]:
+def _resolve_or_create_event(data: PerformanceVideoInput, user) -> Optional[models.Event]:
     if data.event_id: return models.Event.objects.get(pk=data.event_id)
     if not data.event_name: return None
     series = None
@@ -600,20 +450,20 @@ def _resolve_or_create_event(data: PerformanceVideoInput, info: strawberry.Info)
         series = models.EventSeries.objects.get(pk=data.event_series_id)
         is_one_time, event_type = False, series.series_type
     elif data.event_series_name:
-        series = models.EventSeries.objects.create(name=data.event_series_name, series_type=event_type, user=info.context.request.user)
+        series = models.EventSeries.objects.create(name=data.event_series_name, series_type=event_type, user=user)
         is_one_time = False
     return models.Event.objects.create(
         event_type=event_type, name=data.event_name, date=data.event_date,
-        location=data.event_location or "", is_one_time=is_one_time, series=series, user=info.context.request.user
+        location=data.event_location or "", is_one_time=is_one_time, series=series, user=user
     )
 
-def _create_performance_video_record(data, thumb_data, event, artists_data, info: strawberry.Info) -> models.PerformanceVideo:
+def _create_performance_video_record(data, thumb_data, event, artists_data, user) -> models.PerformanceVideo:
     t_url, t_p, t_s = thumb_data
     pv = models.PerformanceVideo.objects.create(
         youtube_id=data.youtube_id, title=data.title, channel_name=data.channel_name,
         release_date=data.published_at, length=data.length_ms, youtube=data.youtube_url,
         thumbnail=t_url, primary_color=t_p, secondary_color=t_s,
-        number_of_songs=len(data.songs_ids or []), event=event, user=info.context.request.user
+        number_of_songs=len(data.songs_ids or []), event=event, user=user
     )
     if data.songs_ids: pv.songs.set(models.Song.objects.filter(pk__in=data.songs_ids))
     if data.artists_apple_music_ids:
@@ -844,7 +694,7 @@ def fetch_youtube_metadata(video_url: str):
         f"https://www.googleapis.com/youtube/v3/videos"
         f"?part=snippet&id={video_id}&key={YOUTUBE_API_KEY}"
     )
-    response = requests.get(api_url)
+    response = get_sync_client("youtube").get(api_url)
     data = response.json()
 
     if "items" not in data or not data["items"]:
@@ -859,6 +709,230 @@ def fetch_youtube_metadata(video_url: str):
     return title, published_at, thumbnail
 
 
+async def _create_project(data: ProjectCreateInput, user) -> models.Project:
+    am_service = AppleMusicService()
+
+    # 1. Preparation & ID Swapping
+    data.artists_apple_music_ids = _prepare_am_ids(data.artists_apple_music_ids)
+    all_am_ids = set(data.artists_apple_music_ids)
+
+    for s in (data.songs or []):
+        s.artists_apple_music_ids = _prepare_am_ids(s.artists_apple_music_ids)
+        if not s.song_id:
+            all_am_ids.update(s.artists_apple_music_ids)
+
+    # 2. Async Network Calls
+    cover_data = await _process_cover(data.cover_url)
+    artists_to_create_data = await _fetch_missing_artist_data(all_am_ids, am_service)
+
+    # 3. Database Transaction
+    def _create_sync():
+        if not user or not user.is_authenticated:
+            raise Exception("Authentication required.")
+
+        with transaction.atomic():
+            return import_project(data, cover_data, artists_to_create_data, user)
+
+    return await database_sync_to_async(_create_sync)()
+
+
+async def _add_performance_video(data: PerformanceVideoInput, user) -> models.PerformanceVideo:
+    am_service = AppleMusicService()
+
+    # 1. ID Swap & Global Sanitization
+    data.artists_apple_music_ids = _prepare_am_ids(data.artists_apple_music_ids)
+
+    # 2. Async Preparation
+    artists_to_create_data = await _fetch_performance_artists(
+        set(data.artists_apple_music_ids),
+        am_service
+    )
+    thumb_data = await sync_to_async(process_image_from_url)(data.thumbnail_url)
+
+    # 3. Synchronous Execution
+    def _sync():
+        if not user or not user.is_authenticated:
+            raise Exception("Authentication required.")
+
+        with transaction.atomic():
+            event = _resolve_or_create_event(data, user)
+            # --- TITLE CONSTRUCTION LOGIC ---
+            # 1. Get Artist names (from fetched data or DB)
+            artist_names = []
+            for am_id in data.artists_apple_music_ids:
+                artist = _get_or_create_artist_node(am_id, artists_to_create_data)
+                if artist:
+                    artist_names.append(artist.name)
+
+            # 2. Get Song titles
+            song_titles = list(models.Song.objects.filter(
+                pk__in=data.songs_ids
+            ).values_list('title', flat=True))
+
+            # 3. Format the strings
+            artists_str = _format_list_to_string(artist_names)
+            songs_str = _format_list_to_string(song_titles)
+
+            # 4. Assemble: "Artist A & Artist B performing Song X & Song Y"
+            new_title = f"{artists_str} performing {songs_str}"
+
+            # 5. Add Event suffix if applicable
+            if event:
+                new_title = f"{new_title} ({event.name})"
+
+            data.title = new_title
+            # --------------------------------
+            return _create_performance_video_record(
+                data, thumb_data, event, artists_to_create_data, user
+            )
+
+    return await database_sync_to_async(_sync)()
+
+
+async def _import_all_top_podcasts(user, progress: Optional[Callable[[float, str], None]] = None) -> str:
+    """
+    Massive import: Fetches Top 200 podcasts from every genre ~5000 total.
+    `progress(fraction, message)` is called between the steps (jobs pass JobContext.report).
+    """
+    def _progress(fraction: float, message: str):
+        if progress:
+            progress(fraction, message)
+
+    itunes_service = iTunesService()
+
+    # 1. Parallel Fetching
+    tasks = []
+    for genre_id in ITUNES_GENRES.keys():
+        tasks.append(itunes_service.get_podcasts_by_genre(genre_id, limit=200))
+
+    print("Starting massive iTunes fetch...")
+    all_results_lists = await asyncio.gather(*tasks)
+
+    flat_results = [item for sublist in all_results_lists for item in sublist]
+    _progress(0.2, f"Fetched {len(flat_results)} podcasts from iTunes")
+
+    # 2. Database Save: bulk inserts in chunked transactions, no network I/O inside them
+    result = await database_sync_to_async(bulk_import_podcasts)(
+        flat_results,
+        user=user,
+        cover_url_for=lambda item: get_high_res_artwork(item.get("artworkUrl600", "")),
+    )
+    count = result.created
+    # bulk_create skips post_save, so clear the podcast caches once here
+    await invalidate_pattern(f"{CacheKeys.PODCAST_SEARCH}*")
+    print(
+        f"Saved {count} new podcasts ({result.skipped} already imported) "
+        f"at {result.rows_per_second:.0f} rows/s, ingesting {len(result.cover_jobs)} covers..."
+    )
+
+    _progress(0.3, f"Saved {count} new podcasts")
+
+    # 3. Covers: downloaded and hosted concurrently, each attached as soon as it is ready
+    podcast_content_type = await database_sync_to_async(ContentType.objects.get_for_model)(models.Podcast)
+
+    def _attach_cover(podcast_id, result):
+        image_url, primary, secondary = result
+        models.Cover.objects.create(
+            image=image_url,
+            content_type=podcast_content_type,
+            object_id=podcast_id,
+            position=1,
+            primary_color=primary,
+            secondary_color=secondary,
+            user=user
+        )
+
+    async def _on_cover(podcast_id, result):
+        await database_sync_to_async(_attach_cover)(podcast_id, result)
+
+    def _on_pool_progress(stats):
+        print(f"Image ingestion: {stats.summary()}")
+        if progress and stats.total:
+            done = (stats.completed + stats.failed) / stats.total
+            _progress(0.3 + 0.7 * done, f"Covers: {stats.summary()}")
+
+    pool = ImageIngestionPool(on_progress=_on_pool_progress)
+    stats = await pool.run(result.cover_jobs, _on_cover)
+
+    return f"Imported {count} new podcasts. Covers: {stats.summary()}"
+
+
+# -----------------------------------------------------------------------------
+# Background jobs (run by `manage.py run_jobs`, see services/jobs.py)
+# -----------------------------------------------------------------------------
+
+def _payload_value(field_type, value):
+    if value is None:
+        return None
+    if isinstance(field_type, StrawberryOptional):
+        return _payload_value(field_type.of_type, value)
+    if isinstance(field_type, StrawberryList):
+        return [_payload_value(field_type.of_type, item) for item in value]
+    if has_object_definition(field_type):
+        return _input_from_payload(field_type, value)
+    if field_type is datetime and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def _input_from_payload(input_cls, payload: dict):
+    """Rebuilds a (possibly nested) strawberry input from its strawberry.asdict() form."""
+    return input_cls(**{
+        field.python_name: _payload_value(field.type, payload[field.python_name])
+        for field in input_cls.__strawberry_definition__.fields
+        if field.python_name in payload
+    })
+
+
+def _job_payload(data) -> dict:
+    payload = strawberry.asdict(data)
+    return {key: value for key, value in payload.items() if value is not strawberry.UNSET}
+
+
+async def _enqueue_job(info: strawberry.Info, kind: str, payload: dict, idempotency_key: Optional[str] = None,
+                       staff_only: bool = False) -> models.Job:
+    user = info.context.request.user
+    if not user.is_authenticated:
+        raise Exception("Authentication required.")
+    if staff_only and not user.is_staff and not user.is_superuser:
+        raise Exception("Unauthorized access.")
+    # Keys are only unique per user and kind
+    key = f"{kind}:{user.id}:{idempotency_key}" if idempotency_key else None
+    return await database_sync_to_async(jobs.enqueue)(kind, payload, user=user, idempotency_key=key)
+
+
+@jobs.job_handler("import_all_top_podcasts")
+async def _run_import_all_top_podcasts(ctx: jobs.JobContext, payload: dict):
+    return {"message": await _import_all_top_podcasts(ctx.user, progress=ctx.report)}
+
+
+@jobs.job_handler("create_project")
+async def _run_create_project(ctx: jobs.JobContext, payload: dict):
+    project = await _create_project(_input_from_payload(ProjectCreateInput, payload), ctx.user)
+    return {"project_id": project.pk}
+
+
+@jobs.job_handler("add_performance_video")
+async def _run_add_performance_video(ctx: jobs.JobContext, payload: dict):
+    video = await _add_performance_video(_input_from_payload(PerformanceVideoInput, payload), ctx.user)
+    return {"performance_video_id": video.pk}
+
+
+@jobs.job_handler("refresh_podcast_feeds")
+async def _run_refresh_podcast_feeds(ctx: jobs.JobContext, payload: dict):
+    total = await database_sync_to_async(models.Podcast.objects.count)()
+
+    def _on_progress(stats):
+        if total:
+            ctx.report(stats.processed / total, stats.summary())
+
+    stats = await refresh_podcast_descriptions(only_missing=payload.get("only_missing", False), on_progress=_on_progress)
+    if stats.updated:
+        # bulk_update skips post_save, so clear the podcast caches once here
+        await invalidate_pattern(f"{CacheKeys.PODCAST_SEARCH}*")
+    return {"message": stats.summary()}
+
+
 @strawberry.type
 class Mutation:
     update_artist: types.Artist = strawberry_django.mutations.update(ArtistUpdateInput)
@@ -950,79 +1024,21 @@ class Mutation:
     async def import_all_top_podcasts(self, info: strawberry.Info) -> SuccessMessage:
         """
         Massive import: Fetches Top 200 podcasts from every genre ~5000 total.
+        Takes minutes; prefer enqueueImportAllTopPodcasts.
         """
         user = info.context.request.user
         if not user.is_staff and not user.is_superuser:  # Optional security check
             raise Exception("Unauthorized access.")
 
-        itunes_service = iTunesService()
-
-        # 1. Parallel Fetching
-        tasks = []
-        for genre_id in ITUNES_GENRES.keys():
-            tasks.append(itunes_service.get_podcasts_by_genre(genre_id, limit=200))
-
-        print("Starting massive iTunes fetch...")
-        all_results_lists = await asyncio.gather(*tasks)
-        await itunes_service.close()
-
-        flat_results = [item for sublist in all_results_lists for item in sublist]
-
-        # 2. Database Save (Sync Wrapper)
-        def _bulk_save():
-            created_count = 0
-            # Deduplicate by ID before hitting DB
-            unique_podcasts = {str(p.get("collectionId")): p for p in flat_results}
-
-            with transaction.atomic():
-                for collection_id, item in unique_podcasts.items():
-                    if not collection_id: continue
-
-                    # Check existence
-                    if models.Podcast.objects.filter(apple_podcasts_id=collection_id).exists():
-                        continue
-
-                    # Parse Date
-                    try:
-                        since_date = parser.parse(item.get("releaseDate", "")).date()
-                    except:
-                        since_date = datetime.now().date()
-
-                    # Create Podcast
-                    podcast = models.Podcast.objects.create(
-                        apple_podcasts_id=collection_id,
-                        title=item.get("collectionName", "Unknown")[:500],
-                        host=item.get("artistName", "Unknown")[:500],
-                        since=since_date,
-                        apple_podcasts=item.get("collectionViewUrl"),
-                        user=user
-                    )
-
-                    get_or_create_podcast_genres(item.get("genres", []), podcast)
-
-                    cover_url = get_high_res_artwork(item.get("artworkUrl600", ""))
-
-                    if cover_url:
-                        try:
-                            cover_image_url, cover_primary, cover_secondary = process_image_from_url(cover_url)
-                        except Exception as e:
-                            print(f"Error processing podcast cover image: {e}")
+        return SuccessMessage(message=await _import_all_top_podcasts(user))
 
-                    if cover_image_url:
-                        models.Cover.objects.create(
-                            image=cover_image_url,
-                            content_object=podcast,
-                            position=1,
-                            primary_color=cover_primary,
-                            secondary_color=cover_secondary,
-                            user=user
-                        )
-
-                    created_count += 1
-            return created_count
+    @strawberry.mutation
+    async def enqueue_import_all_top_podcasts(self, info: strawberry.Info) -> types.Job:
+        return await _enqueue_job(info, "import_all_top_podcasts", {}, staff_only=True)
 
-        count = await database_sync_to_async(_bulk_save)()
-        return SuccessMessage(message=f"Imported {count} new podcasts.")
+    @strawberry.mutation
+    async def enqueue_refresh_podcast_feeds(self, info: strawberry.Info, missing_only: bool = False) -> types.Job:
+        return await _enqueue_job(info, "refresh_podcast_feeds", {"only_missing": missing_only}, staff_only=True)
 
     @strawberry.mutation
     async def import_podcast_from_itunes(self, info: strawberry.Info, apple_podcasts_id: str) -> types.Podcast:
@@ -1037,9 +1053,8 @@ class Mutation:
 
         # --- NEW: Fetch the actual description from RSS ---
         feed_url = item.get("feedUrl")
-        description_text = await itunes_service.fetch_description_from_rss(feed_url)
-
-        await itunes_service.close()
+        feed = await itunes_service.fetch_feed_description(feed_url)
+        description_text = feed.description if feed else ""
 
         if not item:
             raise Exception("Podcast not found on iTunes.")
@@ -1068,6 +1083,11 @@ class Mutation:
                     host=item.get("artistName", "Unknown")[:500],
                     description=description_text,  # <--- Clean text from RSS
                     apple_podcasts=item.get("collectionViewUrl"),
+                    # Validators let refresh_podcast_feeds use conditional GETs later
+                    feed_url=feed_url or None,
+                    feed_etag=feed.etag[:255] if feed else "",
+                    feed_last_modified=feed.last_modified[:64] if feed else "",
+                    feed_checked_at=timezone.now() if feed else None,
                     user=user
                 )
 
@@ -1132,57 +1152,13 @@ class Mutation:
 
     @strawberry.mutation
     async def add_performance_video(self, info: strawberry.Info, data: PerformanceVideoInput) -> types.PerformanceVideo:
-        am_service = AppleMusicService()
-
-        # 1. ID Swap & Global Sanitization
-        data.artists_apple_music_ids = _prepare_am_ids(data.artists_apple_music_ids)
+        return await _add_performance_video(data, info.context.request.user)
 
-        # 2. Async Preparation
-        artists_to_create_data = await _fetch_performance_artists(
-            set(data.artists_apple_music_ids),
-            am_service
-        )
-        thumb_data = await sync_to_async(process_image_from_url)(data.thumbnail_url)
-        await am_service.close()
-
-        # 3. Synchronous Execution
-        def _sync():
-            if not info.context.request.user.is_authenticated:
-                raise Exception("Authentication required.")
-
-            with transaction.atomic():
-                event = _resolve_or_create_event(data, info)
-                # --- TITLE CONSTRUCTION LOGIC ---
-                # 1. Get Artist names (from fetched data or DB)
-                artist_names = []
-                for am_id in data.artists_apple_music_ids:
-                    artist = _get_or_create_artist_node(am_id, artists_to_create_data)
-                    if artist:
-                        artist_names.append(artist.name)
-
-                # 2. Get Song titles
-                song_titles = list(models.Song.objects.filter(
-                    pk__in=data.songs_ids
-                ).values_list('title', flat=True))
-
-                # 3. Format the strings
-                artists_str = _format_list_to_string(artist_names)
-                songs_str = _format_list_to_string(song_titles)
-
-                # 4. Assemble: "Artist A & Artist B performing Song X & Song Y"
-                new_title = f"{artists_str} performing {songs_str}"
-
-                # 5. Add Event suffix if applicable
-                if event:
-                    new_title = f"{new_title} ({event.name})"
-
-                data.title = new_title
-                # --------------------------------
-                return _create_performance_video_record(
-                    data, thumb_data, event, artists_to_create_data, info
-                )
-
-        return await database_sync_to_async(_sync)()
+    @strawberry.mutation
+    async def enqueue_add_performance_video(self, info: strawberry.Info, data: PerformanceVideoInput,
+                                            idempotency_key: Optional[str] = None) -> types.Job:
+        """addPerformanceVideo as a background job; follow it with the job query or jobUpdates."""
+        return await _enqueue_job(info, "add_performance_video", _job_payload(data), idempotency_key)
     '''
     @strawberry.mutation
     async def create_artist(self, info: strawberry.Info, data: ArtistCreateInput) -> types.Artist:
@@ -1221,58 +1197,13 @@ class Mutation:
 
     @strawberry.mutation
     async def create_project(self, info: strawberry.Info, data: ProjectCreateInput) -> types.Project:
-        am_service = AppleMusicService()
-
-        # 1. Preparation & ID Swapping
-        data.artists_apple_music_ids = _prepare_am_ids(data.artists_apple_music_ids)
-        all_am_ids = set(data.artists_apple_music_ids)
+        return await _create_project(data, info.context.request.user)
 
-        for s in (data.songs or []):
-            s.artists_apple_music_ids = _prepare_am_ids(s.artists_apple_music_ids)
-            if not s.song_id:
-                all_am_ids.update(s.artists_apple_music_ids)
-
-        # 2. Async Network Calls
-        cover_data = await _process_cover(data.cover_url)
-        artists_to_create_data = await _fetch_missing_artist_data(all_am_ids, am_service)
-        await am_service.close()
-
-        # 3. Database Transaction
-        def _create_sync():
-            if not info.context.request.user.is_authenticated:
-                raise Exception("Authentication required.")
-
-            with transaction.atomic():
-                # Artist Node Creator (closure)
-                def get_artist_node(am_id):
-                    artist = models.Artist.objects.filter(apple_music_id=am_id).first()
-                    if not artist and am_id in artists_to_create_data:
-                        artist = _create_artist_from_data(am_id, artists_to_create_data[am_id])
-                    return artist
-
-                # Create Project
-                project = models.Project.objects.create(
-                    apple_music_id=data.apple_music_id, title=data.title,
-                    number_of_songs=data.number_of_songs, release_date=data.release_date,
-                    project_type=_determine_project_type(data.is_single, data.number_of_songs, data.songs or []),
-                    apple_music=data.apple_music_url, record_label=data.record_label,
-                    user=info.context.request.user
-                )
-
-                # Metadata & Artists
-                _apply_project_metadata(project, data, cover_data, info)
-                _link_project_artists(project, data.artists_apple_music_ids, get_artist_node)
-
-                # Songs
-                project.length = _handle_project_songs(project, data.songs or [], get_artist_node, info)
-                project.save(update_fields=["length"])
-
-                if data.alternative_versions:
-                    project.alternative_versions.set(models.Project.objects.filter(pk__in=data.alternative_versions))
-
-                return project
-
-        return await database_sync_to_async(_create_sync)()
+    @strawberry.mutation
+    async def enqueue_create_project(self, info: strawberry.Info, data: ProjectCreateInput,
+                                     idempotency_key: Optional[str] = None) -> types.Job:
+        """createProject as a background job; follow it with the job query or jobUpdates."""
+        return await _enqueue_job(info, "create_project", _job_payload(data), idempotency_key)
 
 
     @strawberry.mutation
@@ -2207,29 +2138,19 @@ class Mutation:
                 if len(participant_ids) < 2:
                     raise Exception("A conversation requires at least two participants.")
 
-                # Check if a conversation with these exact participants already exists
-                existing_conversation = (
-                    models.Conversation.objects
-                    .annotate(
-                        total=Count('participants', distinct=True),
-                        matched=Count(
-                            'participants',
-                            filter=Q(participants__id__in=participant_ids),
-                            distinct=True
-                        ),
-                    )
-                    .filter(total=len(participant_ids), matched=len(participant_ids))
-                    .first()
-                )
-
-                if existing_conversation:
-                    return existing_conversation
+                # Only users that actually exist take part in the key
+                user_ids = set(User.objects.filter(id__in=participant_ids).values_list('id', flat=True))
+                if len(user_ids) < 2:
+                    raise Exception("A conversation requires at least two participants.")
 
-                # If no conversation exists, create a new one
-                new_conversation = models.Conversation.objects.create()
-                participants = list(User.objects.filter(id__in=participant_ids))
-                new_conversation.participants.set(participants)
-                return new_conversation
+                # Exact-participant lookup is a single probe on the unique participants_key index
+                participants_key = models.Conversation.build_participants_key(user_ids)
+                conversation, created = models.Conversation.objects.get_or_create(
+                    participants_key=participants_key
+                )
+                if created:
+                    conversation.participants.set(user_ids)
+                return conversation
 
         return await database_sync_to_async(_create_conversation_sync)()
 
@@ -2243,47 +2164,6 @@ class Mutation:
         if not await database_sync_to_async(lambda: user.is_authenticated)():
             raise Exception("Authentication required.")
 
-        async def _upload_to_cloudinary(file_path: str, resource_type: str) -> str:
-            """Upload file to Cloudinary asynchronously"""
-            loop = asyncio.get_event_loop()
-            upload_res = await loop.run_in_executor(
-                None,
-                lambda: cloudinary.uploader.upload(file_path, resource_type=resource_type)
-            )
-            return upload_res.get("secure_url")
-
-        async def _handle_media_upload(m_type: str, media_data: str) -> str | None:
-            """Handle media uploads without blocking"""
-            if m_type in ["IMAGE", "VIDEO"] and media_data:
-                # Decode base64
-                header, encoded = media_data.split(",", 1) if "," in media_data else (None, media_data)
-                file_ext = ".mp4" if m_type == "VIDEO" else ".png"
-
-                # Write file asynchronously
-                loop = asyncio.get_event_loop()
-                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=file_ext)
-
-                # Decode and write in executor to avoid blocking
-                await loop.run_in_executor(
-                    None,
-                    lambda: temp_file.write(base64.b64decode(encoded))
-                )
-                temp_file.flush()
-                temp_file.close()
-
-                try:
-                    # Upload to Cloudinary asynchronously
-                    final_url = await _upload_to_cloudinary(
-                        temp_file.name,
-                        "video" if m_type == "VIDEO" else "image"
-                    )
-                    return final_url
-                finally:
-                    # Clean up temp file
-                    await loop.run_in_executor(None, lambda: os.unlink(temp_file.name))
-
-            return None
-
         # Handle media upload outside of transaction (async, can take time)
         m_type = data.message_type.upper()
         final_media_url = None
@@ -2292,9 +2172,14 @@ class Mutation:
         if data.media_url:
             final_media_url = data.media_url
 
-        # 2. If no URL, but we have data, try to upload (Camera/Gallery)
-        elif data.media_data:
-            final_media_url = await _handle_media_upload(m_type, data.media_data)
+        # 2. A finished chunked upload (Camera/Gallery)
+        elif data.upload_id and m_type in ["IMAGE", "VIDEO"]:
+            upload = await media_uploads.get_completed_upload(data.upload_id, user, kind=m_type)
+            final_media_url = upload.url
+
+        # 3. If no URL, but we have data, try to upload (Camera/Gallery, older clients)
+        elif data.media_data and m_type in ["IMAGE", "VIDEO"]:
+            final_media_url, _, _ = await media_uploads.store_base64_media(data.media_data, m_type)
 
         # Database operations in sync function
         def _create_message_sync():
@@ -2520,43 +2405,7 @@ class Mutation:
         if not await database_sync_to_async(lambda: user.is_authenticated)():
             raise Exception("Authentication required.")
 
-        # Decode base64 outside transaction
-        loop = asyncio.get_event_loop()
-        image_data = await loop.run_in_executor(
-            None,
-            lambda: base64.b64decode(data.image_file)
-        )
-
-        # Write to temp file asynchronously
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-        await loop.run_in_executor(
-            None,
-            lambda: temp_file.write(image_data)
-        )
-        temp_file.flush()
-        temp_file.close()
-        temp_path = temp_file.name
-
-        try:
-            # Upload to Cloudinary asynchronously
-            upload_result = await loop.run_in_executor(
-                None,
-                lambda: cloudinary.uploader.upload(temp_path, colors=True)
-            )
-
-            uploaded_url = upload_result.get("secure_url")
-            raw_colors = upload_result.get("colors", [])
-
-            # Extract and mute colors
-            raw_primary = raw_colors[0][0] if len(raw_colors) > 0 else "#ffffff"
-            raw_secondary = raw_colors[1][0] if len(raw_colors) > 1 else "#ffffff"
-
-            primary_muted = ensure_muted_color(raw_primary, max_saturation=0.55)
-            secondary_muted = ensure_muted_color(raw_secondary, max_saturation=0.55)
-
-        finally:
-            # Clean up temp file asynchronously
-            await loop.run_in_executor(None, lambda: os.unlink(temp_path))
+        uploaded_url, primary_muted, secondary_muted = await _resolve_cover_image(user, data, fallback_color="#ffffff")
 
         # Now do database operations
         def _sync():
@@ -2591,43 +2440,7 @@ class Mutation:
         if not await database_sync_to_async(lambda: user.is_authenticated)():
             raise Exception("Authentication required.")
 
-        # Decode base64 outside transaction
-        loop = asyncio.get_event_loop()
-        image_data = await loop.run_in_executor(
-            None,
-            lambda: base64.b64decode(data.image_file)
-        )
-
-        # Write to temp file asynchronously
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-        await loop.run_in_executor(
-            None,
-            lambda: temp_file.write(image_data)
-        )
-        temp_file.flush()
-        temp_file.close()
-        temp_path = temp_file.name
-
-        try:
-            # Upload to Cloudinary asynchronously
-            upload_result = await loop.run_in_executor(
-                None,
-                lambda: cloudinary.uploader.upload(temp_path, colors=True)
-            )
-
-            uploaded_url = upload_result.get("secure_url")
-            raw_colors = upload_result.get("colors", [])
-
-            # Extract and mute colors
-            raw_primary = raw_colors[0][0] if len(raw_colors) > 0 else "#ffffff"
-            raw_secondary = raw_colors[1][0] if len(raw_colors) > 1 else "#ffffff"
-
-            primary_muted = ensure_muted_color(raw_primary, max_saturation=0.55)
-            secondary_muted = ensure_muted_color(raw_secondary, max_saturation=0.55)
-
-        finally:
-            # Clean up temp file asynchronously
-            await loop.run_in_executor(None, lambda: os.unlink(temp_path))
+        uploaded_url, primary_muted, secondary_muted = await _resolve_cover_image(user, data, fallback_color="#ffffff")
 
         # Now do database operations
         def _sync():
@@ -2661,43 +2474,7 @@ class Mutation:
         if not await database_sync_to_async(lambda: user.is_authenticated)():
             raise Exception("Authentication required.")
 
-        # Decode base64 outside transaction
-        loop = asyncio.get_event_loop()
-        image_data = await loop.run_in_executor(
-            None,
-            lambda: base64.b64decode(data.image_file)
-        )
-
-        # Write to temp file asynchronously
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-        await loop.run_in_executor(
-            None,
-            lambda: temp_file.write(image_data)
-        )
-        temp_file.flush()
-        temp_file.close()
-        temp_path = temp_file.name
-
-        try:
-            # Upload to Cloudinary asynchronously
-            upload_result = await loop.run_in_executor(
-                None,
-                lambda: cloudinary.uploader.upload(temp_path, colors=True)
-            )
-
-            uploaded_url = upload_result.get("secure_url")
-            raw_colors = upload_result.get("colors", [])
-
-            # Extract and mute colors
-            raw_primary = raw_colors[0][0] if len(raw_colors) > 0 else None
-            raw_secondary = raw_colors[1][0] if len(raw_colors) > 1 else None
-
-            primary_muted = ensure_muted_color(raw_primary, max_saturation=0.55)
-            secondary_muted = ensure_muted_color(raw_secondary, max_saturation=0.55)
-
-        finally:
-            # Clean up temp file asynchronously
-            await loop.run_in_executor(None, lambda: os.unlink(temp_path))
+        uploaded_url, primary_muted, secondary_muted = await _resolve_cover_image(user, data)
 
         # Now do database operations
         def _sync():
@@ -2734,43 +2511,7 @@ class Mutation:
         if not await database_sync_to_async(lambda: user.is_authenticated)():
             raise Exception("Authentication required.")
 
-        # Decode base64 outside transaction
-        loop = asyncio.get_event_loop()
-        image_data = await loop.run_in_executor(
-            None,
-            lambda: base64.b64decode(data.image_file)
-        )
-
-        # Write to temp file asynchronously
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-        await loop.run_in_executor(
-            None,
-            lambda: temp_file.write(image_data)
-        )
-        temp_file.flush()
-        temp_file.close()
-        temp_path = temp_file.name
-
-        try:
-            # Upload to Cloudinary asynchronously
-            upload_result = await loop.run_in_executor(
-                None,
-                lambda: cloudinary.uploader.upload(temp_path, colors=True)
-            )
-
-            uploaded_url = upload_result.get("secure_url")
-            raw_colors = upload_result.get("colors", [])
-
-            # Extract and mute colors
-            raw_primary = raw_colors[0][0] if len(raw_colors) > 0 else None
-            raw_secondary = raw_colors[1][0] if len(raw_colors) > 1 else None
-
-            primary_muted = ensure_muted_color(raw_primary, max_saturation=0.55)
-            secondary_muted = ensure_muted_color(raw_secondary, max_saturation=0.55)
-
-        finally:
-            # Clean up temp file asynchronously
-            await loop.run_in_executor(None, lambda: os.unlink(temp_path))
+        uploaded_url, primary_muted, secondary_muted = await _resolve_cover_image(user, data)
 
         # Now do database operations
         def _sync():
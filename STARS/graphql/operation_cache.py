@@ -0,0 +1,333 @@
+"""
+Full-response cache for public GraphQL queries.
+
+Artist, project and event pages get the same response for every anonymous
+visitor. A cacheable query's response is stored already serialized, keyed by
+the query's sha256, operation name, variables and scope:
+
+- "public": the query selects no viewer-dependent field, so the response is
+  the same for everyone, signed in or not.
+- "anon": it does select one (likedByCurrentUser, me...), but the viewer is
+  anonymous, so the field is constant. Signed-in viewers bypass the cache.
+
+CachedGraphQLView answers hits before strawberry runs at all (no parse,
+execution or serialization). OperationCacheExtension fills the cache, and
+also serves hits for callers that go through schema.execute directly.
+
+Every response is tagged with the nodes it contains ("Artist:12") and their
+types ("type:Review"). Saving a row bumps its node tag. Creating or deleting
+one also bumps its type tag and the nodes it points to, since their lists
+change. A hit is only served if none of its tags moved since it was stored
+(see bump_tags, wired in signals.py). Writes through queryset.update() skip signals and are bounded by
+GRAPHQL_RESPONSE_CACHE_TTL.
+"""
+import hashlib
+import json
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.http import HttpResponse
+from graphql import ExecutionResult as GraphQLExecutionResult
+from graphql import (
+    FieldNode, FragmentDefinitionNode, FragmentSpreadNode, InlineFragmentNode, ObjectFieldNode,
+    OperationDefinitionNode, get_named_type, is_abstract_type, visit,
+)
+from graphql.language import Visitor
+from strawberry import relay
+from strawberry.extensions import SchemaExtension
+from strawberry.types.graphql import OperationType
+from strawberry.django.views import AsyncGraphQLView
+
+from .instrumentation import REQUEST_SECONDS, operation_label
+from .persisted_queries import query_hash
+from .viewer import VIEWER_ANNOTATIONS, VIEWER_INDEPENDENT
+
+CACHE_KEY_PREFIX = "gql_response"
+TAG_KEY_PREFIX = "gql_tag"
+
+SCOPE_PUBLIC, SCOPE_ANONYMOUS = "public", "anon"
+
+# Fields (and order arguments) whose value depends on who is asking
+VIEWER_DEPENDENT_FIELDS = {"me", "job", "likedByCurrentUser", "dislikedByCurrentUser"} | {
+    name
+    for annotations in VIEWER_ANNOTATIONS.values()
+    for name, (attname, _) in annotations.items()
+    if attname not in VIEWER_INDEPENDENT
+}
+
+
+def _ttl() -> int:
+    return settings.GRAPHQL_RESPONSE_CACHE_TTL
+
+
+def response_key(sha256: str, operation_name: Optional[str], variables: Optional[dict], scope: str) -> str:
+    variables_hash = hashlib.sha256(
+        json.dumps(variables or {}, sort_keys=True, separators=(",", ":"), default=str).encode()
+    ).hexdigest()[:32]
+    return f"{CACHE_KEY_PREFIX}:{sha256}:{operation_name or ''}:{variables_hash}:{scope}"
+
+
+def _tag_key(tag: str) -> str:
+    return f"{TAG_KEY_PREFIX}:{tag}"
+
+
+def bump_tags(tags: Iterable[str]) -> None:
+    """Invalidates every cached response carrying one of `tags` (sync)."""
+    if _ttl() <= 0:
+        return
+    version = time.time_ns()
+    # Tags outlive every response stored under their old version
+    cache.set_many({_tag_key(tag): version for tag in tags}, _ttl() * 2)
+
+
+def tags_for_change(instance, created_or_deleted: bool) -> Set[str]:
+    """
+    Tags a saved or deleted row invalidates. New and deleted rows also change
+    the lists of the objects they point to, so those nodes are bumped too.
+    """
+    model_name = type(instance).__name__
+    tags = {f"{model_name}:{instance.pk}"}
+    if not created_or_deleted:
+        return tags
+
+    tags.add(f"type:{model_name}")
+    for field in instance._meta.concrete_fields:
+        if field.many_to_one and field.related_model is not None:
+            target_id = getattr(instance, field.attname)
+            if target_id is not None:
+                tags.add(f"{field.related_model.__name__}:{target_id}")
+    for field in instance._meta.private_fields:
+        # Generic foreign keys (reviews and covers of any content)
+        ct_id = getattr(instance, getattr(field, "ct_field", "") + "_id", None)
+        object_id = getattr(instance, getattr(field, "fk_field", ""), None)
+        if ct_id and object_id is not None:
+            model = ContentType.objects.get_for_id(ct_id).model_class()
+            if model is not None:
+                tags.add(f"{model.__name__}:{object_id}")
+    return tags
+
+
+def _current_versions(tags: List[str]) -> Dict[str, int]:
+    found = cache.get_many([_tag_key(tag) for tag in tags])
+    return {tag: found.get(_tag_key(tag), 0) for tag in tags}
+
+
+def _lookup(keys: List[str]) -> Optional[str]:
+    """The first still-valid response body stored under `keys` (sync)."""
+    entries = cache.get_many(keys)
+    for key in keys:
+        entry = entries.get(key)
+        if entry and _current_versions(list(entry["tags"])) == entry["tags"]:
+            return entry["body"]
+    return None
+
+
+def _store(key: str, body: str, tags: Set[str]) -> None:
+    cache.set(key, {"body": body, "tags": _current_versions(sorted(tags))}, _ttl())
+
+
+def _node_tag(type_name: str, value) -> str:
+    if isinstance(value, str):
+        # Relay ids are base64 "Type:pk"; plain types expose the pk itself
+        try:
+            value = relay.GlobalID.from_id(value).node_id
+        except Exception:
+            pass
+    return f"{type_name}:{value}"
+
+
+def _collect_tags(schema, parent_type, selection_set, values: list, fragments: dict, tags: Set[str],
+                  spread: Optional[Set[tuple]] = None) -> None:
+    """
+    Walks a selection set and the matching result objects. Every object type a
+    field can return gets a type tag, even when the result is empty, so the
+    first row created still invalidates the response. Objects that carry their
+    id also get a node tag.
+
+    `spread` holds the (fragment, type) pairs already walked over `values`: a
+    fragment spread again over the same results adds no tags, and walking it
+    each time would grow exponentially with fragments that spread each other.
+    """
+    if spread is None:
+        spread = set()
+    for selection in selection_set.selections:
+        if isinstance(selection, FragmentSpreadNode):
+            fragment = fragments.get(selection.name.value)
+            key = (selection.name.value, parent_type.name)
+            if fragment is None or key in spread:
+                continue
+            spread.add(key)
+        elif isinstance(selection, InlineFragmentNode):
+            fragment = selection
+        else:
+            fragment = None
+        if fragment is not None:
+            condition = fragment.type_condition
+            fragment_type = schema.get_type(condition.name.value) if condition else parent_type
+            _collect_tags(schema, fragment_type, fragment.selection_set, values, fragments, tags, spread)
+            continue
+
+        field = getattr(parent_type, "fields", {}).get(selection.name.value)
+        if field is None or selection.selection_set is None:
+            continue
+        return_type = get_named_type(field.type)
+        possible = schema.get_possible_types(return_type) if is_abstract_type(return_type) else [return_type]
+        tags.update(f"type:{t.name}" for t in possible)
+
+        key = selection.alias.value if selection.alias else selection.name.value
+        children = []
+        stack = [value.get(key) for value in values if isinstance(value, dict)]
+        while stack:
+            child = stack.pop()
+            if isinstance(child, list):
+                stack.extend(child)
+            elif isinstance(child, dict):
+                children.append(child)
+        if not children:
+            continue
+
+        id_key = next(
+            (s.alias.value if s.alias else "id" for s in selection.selection_set.selections
+             if isinstance(s, FieldNode) and s.name.value == "id"),
+            None,
+        )
+        for child in children:
+            type_name = child.get("__typename") or (None if is_abstract_type(return_type) else return_type.name)
+            if id_key and type_name and child.get(id_key) is not None:
+                tags.add(_node_tag(type_name, child[id_key]))
+        _collect_tags(schema, return_type, selection.selection_set, children, fragments, tags)
+
+
+def tags_for(schema, document, operation_name: Optional[str], data: dict) -> Set[str]:
+    """Type and node tags for a result (see _collect_tags)."""
+    fragments = {d.name.value: d for d in document.definitions if isinstance(d, FragmentDefinitionNode)}
+    operations = [d for d in document.definitions if isinstance(d, OperationDefinitionNode)]
+    operation = next((o for o in operations if o.name and o.name.value == operation_name), operations[0])
+    tags: Set[str] = set()
+    _collect_tags(schema, schema.query_type, operation.selection_set, [data], fragments, tags)
+    return tags
+
+
+class _ViewerFieldFinder(Visitor):
+    def __init__(self):
+        super().__init__()
+        self.found = False
+
+    def enter_field(self, node: FieldNode, *args):
+        if node.name.value in VIEWER_DEPENDENT_FIELDS:
+            self.found = True
+
+    def enter_object_field(self, node: ObjectFieldNode, *args):
+        if node.name.value in VIEWER_DEPENDENT_FIELDS:
+            self.found = True
+
+
+def selects_viewer_fields(document) -> bool:
+    finder = _ViewerFieldFinder()
+    visit(document, finder)
+    return finder.found
+
+
+async def _viewer_is_anonymous(request) -> bool:
+    anonymous = getattr(request, "graphql_viewer_anonymous", None)
+    if anonymous is None:
+        user = await request.auser() if hasattr(request, "auser") else getattr(request, "user", None)
+        anonymous = user is None or not user.is_authenticated
+        request.graphql_viewer_anonymous = anonymous
+    return anonymous
+
+
+class OperationCacheExtension(SchemaExtension):
+    async def on_execute(self):
+        context = self.execution_context
+        request = getattr(context.context, "request", None)
+        if _ttl() <= 0 or request is None or context.operation_type != OperationType.QUERY:
+            yield
+            return
+
+        if selects_viewer_fields(context.graphql_document):
+            if not await _viewer_is_anonymous(request):
+                yield
+                return
+            scope = SCOPE_ANONYMOUS
+        else:
+            scope = SCOPE_PUBLIC
+
+        # The name the client sent, as CachedGraphQLView sees it (not the one inferred from the document)
+        operation_name = getattr(context, "_provided_operation_name", None)
+        key = response_key(query_hash(context.query), operation_name, context.variables, scope)
+        body = await self._safe(_lookup, [key])
+        if body is not None:
+            context.result = GraphQLExecutionResult(data=json.loads(body)["data"])
+            yield
+            return
+
+        yield
+        result = context.result
+        if isinstance(result, GraphQLExecutionResult) and not result.errors and result.data is not None:
+            body = json.dumps({"data": result.data})
+            tags = tags_for(context.schema._schema, context.graphql_document, context.operation_name, result.data)
+            await self._safe(_store, key, body, tags)
+
+    @staticmethod
+    async def _safe(func, *args):
+        # A cache outage only costs the speed-up
+        try:
+            return await sync_to_async(func)(*args)
+        except Exception as e:
+            print(f"GraphQL response cache unavailable: {e}")
+            return None
+
+
+class CachedGraphQLView(AsyncGraphQLView):
+    """Serves cached responses (see OperationCacheExtension) without running strawberry."""
+
+    def _cache_request(self, request) -> Optional[dict]:
+        if request.method == "GET":
+            data = request.GET
+            try:
+                variables = json.loads(data["variables"]) if data.get("variables") else None
+                extensions = json.loads(data["extensions"]) if data.get("extensions") else None
+            except ValueError:
+                return None
+        elif request.method == "POST" and request.content_type == "application/json":
+            try:
+                data = json.loads(request.body)
+            except ValueError:
+                return None
+            if not isinstance(data, dict):
+                return None  # Batches go the normal way
+            variables, extensions = data.get("variables"), data.get("extensions")
+        else:
+            return None
+
+        query = data.get("query")
+        persisted = (extensions or {}).get("persistedQuery") if isinstance(extensions, dict) else None
+        sha256 = query_hash(query) if query else (persisted or {}).get("sha256Hash")
+        if not sha256 or not isinstance(variables, (dict, type(None))):
+            return None
+        return {"sha256": sha256, "operation_name": data.get("operationName"), "variables": variables}
+
+    async def dispatch(self, request, *args, **kwargs):
+        started = time.perf_counter()
+        if _ttl() > 0 and "text/html" not in request.headers.get("accept", ""):
+            lookup = self._cache_request(request)
+            if lookup is not None:
+                scopes = [SCOPE_PUBLIC]
+                if await _viewer_is_anonymous(request):
+                    scopes.append(SCOPE_ANONYMOUS)
+                keys = [
+                    response_key(lookup["sha256"], lookup["operation_name"], lookup["variables"], scope)
+                    for scope in scopes
+                ]
+                body = await OperationCacheExtension._safe(_lookup, keys)
+                if body is not None:
+                    REQUEST_SECONDS.observe(
+                        time.perf_counter() - started, operation=operation_label(lookup["operation_name"]), cache="hit",
+                    )
+                    return HttpResponse(body, content_type="application/json")
+        return await super().dispatch(request, *args, **kwargs)
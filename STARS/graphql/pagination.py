@@ -0,0 +1,141 @@
+"""
+Keyset (seek) pagination for large connections.
+
+DjangoCursorConnection already pages with cursors rather than OFFSET, but:
+
+- its pk tie-breaker is always ascending, so `-date_created` pages sort on
+  (date_created DESC, id ASC), which no plain btree index can serve in
+  order without a sort;
+- `after`/`before` become `a < x OR (a = x AND id > y)`, which Postgres
+  applies as a filter while scanning from the top of the index, so page N
+  reads every row of the pages before it.
+
+KeysetConnection appends the pk in the direction of the last ordering
+column (see with_tiebreaker), and when every ordering column is a
+non-null column of the model sorted the same way, it seeks with a row
+comparison instead: `(date_created, id) < (x, y)`. That is an index
+condition on the matching composite index (migration 0074), so every page
+costs the same as the first. Other orderings (nullable columns,
+annotations, mixed directions) still use the expanded comparison; that is
+why Conversation.latest_message_time is not nullable (migration 0078).
+
+Cursors keep DjangoCursorConnection's format, and approximateTotalCount
+comes from CountedConnection (counts.py).
+
+Only root Query fields use KeysetConnection. The optimizer prefetches a
+nested connection for all parents at once only when its type is exactly
+DjangoCursorConnection, so nested fields (Review.comments, User.reviews...)
+keep that type; a subclass there would cost one query per parent.
+"""
+from typing import Any, Optional
+
+from django.db import models
+from django.db.models import F, Func, QuerySet, Value
+from django.db.models.lookups import GreaterThan, LessThan
+import strawberry
+from strawberry import relay
+from strawberry_django.optimizer import is_optimized_by_prefetching
+from strawberry_django.relay.cursor_connection import (
+    OrderedCollectionCursor, _get_order_by, annotate_ordering_fields,
+)
+
+from .counts import CountedConnection
+
+
+class _Row(Func):
+    """A row value, `(a, b, ...)`, comparable column by column."""
+    function = ""
+    template = "(%(expressions)s)"
+    output_field = models.Field()
+
+
+def with_tiebreaker(qs: QuerySet) -> QuerySet:
+    """Orders `qs` by its current ordering plus the pk, in the direction of the last column."""
+    order_bys = _get_order_by(qs)
+    for order_by in order_bys:
+        if getattr(getattr(order_by.expression, "field", None), "primary_key", False):
+            return qs
+
+    descending = bool(order_bys) and order_bys[-1].descending
+    pk = F("pk").resolve_expression(qs.query)
+    qs = qs._chain()
+    # The resolved ordering includes Meta.ordering, which an explicit order_by would replace
+    qs.query.order_by = tuple(order_bys) + (pk.desc() if descending else pk.asc(),)
+    qs.query.default_ordering = False
+    return qs
+
+
+def _seek(qs: QuerySet, cursor: str, before: bool) -> Optional[QuerySet]:
+    """`qs` filtered past `cursor` with a row comparison, or None when the ordering does not allow one."""
+    annotated, descriptors, _ = annotate_ordering_fields(qs)
+    directions = {descriptor.order_by.descending for descriptor in descriptors}
+    if len(directions) != 1 or any(descriptor.maybe_null for descriptor in descriptors):
+        return None
+    if any(descriptor.attname.startswith("_strawberry_order_field_") for descriptor in descriptors):
+        return None
+
+    values = OrderedCollectionCursor.from_cursor(cursor, descriptors).field_values
+    if any(value is None for value in values):
+        return None
+    columns = _Row(*(descriptor.order_by.expression for descriptor in descriptors))
+    bounds = _Row(*(
+        Value(value, output_field=descriptor.order_by.expression.output_field)
+        for descriptor, value in zip(descriptors, values)
+    ))
+    # Forwards through a descending order means smaller values
+    lookup = LessThan if directions.pop() ^ before else GreaterThan
+    return annotated.filter(lookup(columns, bounds))
+
+
+# Nested fields keep ReviewCursorConnection and friends, so root ones need their own name
+@strawberry.type(name="KeysetConnection", description="A connection to a list of items.")
+class KeysetConnection(CountedConnection[relay.NodeType]):
+    @classmethod
+    def resolve_connection(
+        cls,
+        nodes,
+        *,
+        info,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        first: Optional[int] = None,
+        last: Optional[int] = None,
+        max_results: Optional[int] = None,
+        **kwargs: Any,
+    ):
+        if isinstance(nodes, QuerySet) and not is_optimized_by_prefetching(nodes):
+            nodes = with_tiebreaker(nodes)
+            # Seeking filters the page itself, not the total count
+            total_count_qs = nodes
+            for cursor, is_before in ((after, False), (before, True)):
+                if not cursor:
+                    continue
+                seeked = _seek(nodes, cursor, is_before)
+                if seeked is not None:
+                    nodes = seeked
+                    if is_before:
+                        before = None
+                    else:
+                        after = None
+            connection = super().resolve_connection(
+                nodes, info=info, before=before, after=after, first=first, last=last,
+                max_results=max_results, **kwargs,
+            )
+            return _with_total_count_qs(connection, total_count_qs)
+
+        return super().resolve_connection(
+            nodes, info=info, before=before, after=after, first=first, last=last,
+            max_results=max_results, **kwargs,
+        )
+
+
+def _with_total_count_qs(connection, total_count_qs: QuerySet):
+    def _set(resolved):
+        resolved.total_count_qs = total_count_qs
+        return resolved
+
+    if hasattr(connection, "__await__"):
+        async def _await():
+            return _set(await connection)
+        return _await()
+    return _set(connection)
@@ -0,0 +1,177 @@
+"""
+Automatic persisted queries (the Apollo APQ protocol) for /graphql/.
+
+Clients send `extensions.persistedQuery.sha256Hash` and leave the query out.
+If the server does not know the hash yet it answers with a
+`PersistedQueryNotFound` error, and the client retries once with the full
+text, which is then stored under the hash.
+
+- Query texts are shared by all workers through the Django cache (Redis).
+- Each worker keeps an LRU of parsed documents by hash, and remembers which of
+  them passed validation. Known operations skip both parse and validate,
+  including plain requests that send the full text of a known query.
+- GRAPHQL_PERSISTED_QUERIES = "allowlist" only runs operations registered
+  with `manage.py register_persisted_queries`; anything else is refused.
+  "auto" (the default) stores whatever clients send, "off" disables all of it.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from graphql import DocumentNode, parse
+from strawberry.extensions import SchemaExtension
+
+CACHE_KEY_PREFIX = "persisted_query"
+
+MODE_OFF, MODE_AUTO, MODE_ALLOWLIST = "off", "auto", "allowlist"
+
+
+class PersistedQueryNotFound(Exception):
+    def __init__(self):
+        # Clients match on this exact message before resending the full text
+        super().__init__("PersistedQueryNotFound")
+
+
+class PersistedQueryNotAllowed(Exception):
+    def __init__(self):
+        super().__init__("PersistedQueryNotAllowed: this operation is not on the allowlist.")
+
+
+@dataclass
+class _Document:
+    query: str
+    document: DocumentNode
+    allowed: bool
+    validated: bool = False
+
+
+class DocumentLRU:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, _Document]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sha256: str) -> Optional[_Document]:
+        with self._lock:
+            entry = self._entries.get(sha256)
+            if entry is not None:
+                self._entries.move_to_end(sha256)
+            return entry
+
+    def put(self, sha256: str, entry: _Document) -> None:
+        with self._lock:
+            self._entries[sha256] = entry
+            self._entries.move_to_end(sha256)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+documents = DocumentLRU(settings.GRAPHQL_PERSISTED_QUERIES_LRU_SIZE)
+
+
+def query_hash(query: str) -> str:
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+def _cache_key(sha256: str) -> str:
+    return f"{CACHE_KEY_PREFIX}:{sha256}"
+
+
+def store_query(query: str, allowed: bool = False) -> str:
+    """Stores a query text under its hash (sync). Allowlisted queries never expire."""
+    sha256 = query_hash(query)
+    timeout = None if allowed else settings.GRAPHQL_PERSISTED_QUERIES_TTL
+    cache.set(_cache_key(sha256), {"query": query, "allowed": allowed}, timeout)
+    return sha256
+
+
+async def _load_stored(sha256: str) -> Optional[dict]:
+    try:
+        return await sync_to_async(cache.get)(_cache_key(sha256))
+    except Exception as e:
+        print(f"Persisted query read failed: {e}")
+        return None
+
+
+async def _save(query: str) -> None:
+    try:
+        await sync_to_async(store_query)(query)
+    except Exception as e:
+        print(f"Persisted query write failed: {e}")
+
+
+class PersistedQueryExtension(SchemaExtension):
+    entry: Optional[_Document] = None
+
+    async def on_operation(self):
+        self.entry = None
+        mode = settings.GRAPHQL_PERSISTED_QUERIES
+        if mode == MODE_OFF:
+            yield
+            return
+        await self._resolve(mode)
+        yield
+
+    async def _resolve(self, mode: str) -> None:
+        context = self.execution_context
+        persisted = (context.operation_extensions or {}).get("persistedQuery") or {}
+        sent_hash = persisted.get("sha256Hash")
+        query = context.query
+
+        if query:
+            sha256 = query_hash(query)
+            if sent_hash and sent_hash != sha256:
+                raise Exception("provided sha does not match query")
+        elif sent_hash:
+            sha256 = sent_hash
+        else:
+            return  # No query at all; strawberry reports it
+
+        entry = documents.get(sha256)
+        if entry is not None and mode == MODE_ALLOWLIST and not entry.allowed:
+            # It may have been registered since this worker first saw it
+            entry = None
+        if entry is None:
+            stored = await _load_stored(sha256)
+            if stored is None and not query:
+                raise PersistedQueryNotFound()
+            if stored is None and mode == MODE_ALLOWLIST:
+                raise PersistedQueryNotAllowed()
+            text = stored["query"] if stored else query
+            # Parse errors surface through the normal parsing step
+            try:
+                document = parse(text, **context.parse_options)
+            except Exception:
+                context.query = text
+                return
+            entry = _Document(text, document, allowed=bool(stored and stored.get("allowed")))
+            documents.put(sha256, entry)
+            if stored is None and sent_hash:
+                await _save(text)
+
+        if mode == MODE_ALLOWLIST and not entry.allowed:
+            raise PersistedQueryNotAllowed()
+
+        self.entry = entry
+        context.query = entry.query
+        context.graphql_document = entry.document
+
+    def on_validate(self):
+        context = self.execution_context
+        if self.entry is not None and self.entry.validated:
+            # Already validated against this schema in this worker
+            context.pre_execution_errors = []
+            yield
+            return
+        yield
+        if self.entry is not None and not context.pre_execution_errors:
+            self.entry.validated = True
@@ -0,0 +1,284 @@
+"""
+Static cost analysis for GraphQL operations.
+
+Before anything executes, each operation is scored from its document and
+variables:
+
+- Every field selecting an object costs 1, scalars are free, and the fields
+  in FIELD_COSTS (upstream API calls, search) cost more.
+- A connection multiplies what is selected under it by `first`/`last`
+  (the page size when absent); list fields with a `limit` argument use it.
+- Depth counts nested fields, not counting the edges/node wrappers of
+  connections. Aliases are limited too, since each alias repeats a field.
+
+An operation over GRAPHQL_MAX_DEPTH, GRAPHQL_MAX_ALIASES or its budget
+(GRAPHQL_MAX_COST, or GRAPHQL_OPERATION_COST_BUDGETS[document hash]) is
+refused. Each client (the user, or the address our GRAPHQL_TRUSTED_PROXY_COUNT
+proxies saw) also draws its costs from a shared token bucket
+(GRAPHQL_COST_RATE per second, up to GRAPHQL_COST_BURST), so a burst of
+expensive queries is throttled; cached responses are still served. The
+score is reported under `extensions.cost` in the response.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from graphql import ExecutionResult as GraphQLExecutionResult
+from graphql import (
+    FieldNode, FragmentDefinitionNode, FragmentSpreadNode, GraphQLError, InlineFragmentNode,
+    OperationDefinitionNode, get_named_type, is_abstract_type, is_list_type, is_object_type,
+)
+from graphql.type import GraphQLNonNull
+from graphql.utilities import value_from_ast_untyped
+
+from strawberry.extensions import SchemaExtension
+
+from STARS.graphql.persisted_queries import query_hash
+from STARS.services.upstream_guard import reserve_tokens
+
+# "Type.field" -> cost of one call, before multipliers
+FIELD_COSTS = {
+    "Query.searchMusic": 20,
+    "Query.searchPodcasts": 20,
+    "Query.matchSongsByTitleAndArtists": 20,
+    "Query.matchProjectsByTitleAndArtists": 20,
+    "Query.searchItunesPodcasts": 50,
+    "Query.searchYoutubeVideos": 100,
+    "Query.getYoutubeVideoByUrl": 20,
+    "Query.getYoutubeVideosByUrls": 50,
+    "Query.searchAppleMusicAlbums": 50,
+    "Query.searchAppleMusicArtists": 50,
+    "Query.getAlbumDetail": 50,
+    "Query.getAppleMusicArtistDetail": 50,
+    "Query.getAppleMusicArtistTopSongs": 50,
+}
+
+CONNECTION_WRAPPERS = {"edges", "node", "nodes", "pageInfo"}
+# Page size of a connection queried without first/last (strawberry's max_results)
+DEFAULT_PAGE_SIZE = 100
+# Assumed size of a plain list without a limit argument
+DEFAULT_LIST_SIZE = 10
+
+KEY_PREFIX = "stars:graphql:cost"
+
+
+@dataclass
+class OperationCost:
+    cost: int = 0
+    depth: int = 0
+    aliases: int = 0
+
+
+# Field selections walked per operation before it is refused unanalyzed
+MAX_ANALYZED_SELECTIONS = 10000
+
+
+class _Exceeded(Exception):
+    """Stops the walk once the cost is known to be over the limit."""
+
+    def __init__(self, cost: int):
+        self.cost = cost
+
+
+class _Analyzer:
+    def __init__(self, schema, fragments: Dict[str, FragmentDefinitionNode], variables: Dict[str, Any],
+                 limit: Optional[int] = None):
+        self.schema = schema
+        self.fragments = fragments
+        self.variables = variables or {}
+        self.limit = limit
+        self.selections = 0
+        # (fragment name, type name) -> OperationCost of one spread, depth relative to the spread
+        self.fragment_costs: Dict[Tuple[str, str], OperationCost] = {}
+
+    def _argument(self, node: FieldNode, name: str):
+        for argument in node.arguments or ():
+            if argument.name.value == name:
+                return value_from_ast_untyped(argument.value, self.variables)
+        return None
+
+    def _multiplier(self, node: FieldNode, field_type) -> int:
+        named = get_named_type(field_type)
+        if named.name.endswith("Connection"):
+            size = self._argument(node, "first") or self._argument(node, "last") or DEFAULT_PAGE_SIZE
+            return max(1, min(int(size), DEFAULT_PAGE_SIZE))
+        unwrapped = field_type.of_type if isinstance(field_type, GraphQLNonNull) else field_type
+        if is_list_type(unwrapped):
+            limit = self._argument(node, "limit")
+            return max(1, int(limit)) if isinstance(limit, int) else DEFAULT_LIST_SIZE
+        return 1
+
+    def _fragment_cost(self, parent_type, name: str, visited: frozenset) -> OperationCost:
+        key = (name, parent_type.name)
+        cost = self.fragment_costs.get(key)
+        if cost is None:
+            fragment = self.fragments[name]
+            fragment_type = self.schema.get_type(fragment.type_condition.name.value)
+            cost = self.fragment_costs[key] = self.selection_cost(fragment_type, fragment.selection_set, visited | {name})
+        return cost
+
+    def selection_cost(self, parent_type, selection_set, visited: frozenset = frozenset()) -> OperationCost:
+        """
+        Cost of one instance of `parent_type` with this selection; `depth` is
+        counted from `parent_type`. Every subtotal is a lower bound of the
+        operation's cost, so the walk stops as soon as one is over the limit.
+        """
+        total = OperationCost()
+
+        def add(part: OperationCost, multiplier: int = 1, own: int = 0, depth: int = 0):
+            total.cost += own + multiplier * part.cost
+            total.depth = max(total.depth, depth + part.depth)
+            total.aliases += part.aliases
+            if self.limit is not None and total.cost > self.limit:
+                raise _Exceeded(total.cost)
+
+        for selection in selection_set.selections:
+            if isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                if name in self.fragments and name not in visited:
+                    add(self._fragment_cost(parent_type, name, visited))
+                continue
+            if isinstance(selection, InlineFragmentNode):
+                condition = selection.type_condition
+                fragment_type = self.schema.get_type(condition.name.value) if condition else parent_type
+                add(self.selection_cost(fragment_type, selection.selection_set, visited))
+                continue
+
+            self.selections += 1
+            if self.selections > MAX_ANALYZED_SELECTIONS:
+                raise _Exceeded(max(total.cost, (self.limit or 0) + 1))
+            if selection.alias:
+                total.aliases += 1
+            field = getattr(parent_type, "fields", {}).get(selection.name.value)
+            if field is None or selection.selection_set is None:
+                continue  # Scalars (and __typename) are free
+
+            named = get_named_type(field.type)
+            wrapper = selection.name.value in CONNECTION_WRAPPERS
+
+            own = 0 if wrapper else FIELD_COSTS.get(f"{parent_type.name}.{selection.name.value}", 1)
+            # An abstract type is charged for its most expensive member selection
+            child_types = self.schema.get_possible_types(named) if is_abstract_type(named) else [named]
+            children = [
+                self.selection_cost(t, selection.selection_set, visited) for t in child_types if is_object_type(t)
+            ] or [OperationCost()]
+            child = OperationCost(
+                max(c.cost for c in children), max(c.depth for c in children), max(c.aliases for c in children),
+            )
+            multiplier = 1 if wrapper else self._multiplier(selection, field.type)
+            add(child, multiplier=multiplier, own=own, depth=0 if wrapper else 1)
+        return total
+
+
+def analyze(schema, document, operation_name: Optional[str], variables: Optional[Dict[str, Any]],
+            limit: Optional[int] = None) -> OperationCost:
+    """
+    Scores the operation. With a `limit`, the walk stops once the cost is
+    known to exceed it (or after MAX_ANALYZED_SELECTIONS fields) and returns
+    a cost over the limit.
+    """
+    fragments = {d.name.value: d for d in document.definitions if isinstance(d, FragmentDefinitionNode)}
+    operations = [d for d in document.definitions if isinstance(d, OperationDefinitionNode)]
+    operation = next((o for o in operations if o.name and o.name.value == operation_name), operations[0])
+    root = {
+        "query": schema.query_type, "mutation": schema.mutation_type, "subscription": schema.subscription_type,
+    }[operation.operation.value]
+    analyzer = _Analyzer(schema, fragments, variables, limit)
+    try:
+        return analyzer.selection_cost(root, operation.selection_set)
+    except _Exceeded as e:
+        return OperationCost(cost=e.cost)
+
+
+def budget_for(query: Optional[str]) -> int:
+    """
+    The budget of this exact document. Budgets are keyed by its persisted query
+    hash rather than its operation name, which any client can pick.
+    """
+    budgets = getattr(settings, "GRAPHQL_OPERATION_COST_BUDGETS", None) or {}
+    if not budgets or not query:
+        return settings.GRAPHQL_MAX_COST
+    return budgets.get(query_hash(query), settings.GRAPHQL_MAX_COST)
+
+
+def client_address(request) -> str:
+    """
+    The address the outermost of our GRAPHQL_TRUSTED_PROXY_COUNT proxies saw.
+    Entries left of it in X-Forwarded-For are whatever the client sent.
+    """
+    proxies = settings.GRAPHQL_TRUSTED_PROXY_COUNT
+    if proxies > 0:
+        hops = [hop.strip() for hop in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",") if hop.strip()]
+        if len(hops) >= proxies:
+            return hops[-proxies]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+async def _client_key(request) -> str:
+    user = await request.auser() if hasattr(request, "auser") else getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"{KEY_PREFIX}:user:{user.pk}"
+    return f"{KEY_PREFIX}:ip:{client_address(request) or 'unknown'}"
+
+
+async def _throttle_wait(request, cost: int) -> float:
+    rate = settings.GRAPHQL_COST_RATE
+    if request is None or rate <= 0 or cost <= 0:
+        return 0.0
+    burst = max(settings.GRAPHQL_COST_BURST, cost)
+    try:
+        return await sync_to_async(reserve_tokens, thread_sensitive=False)(
+            await _client_key(request), rate, burst, cost, 0
+        )
+    except Exception as e:
+        print(f"GraphQL cost throttle unavailable: {e}")
+        return 0.0
+
+
+class QueryCostExtension(SchemaExtension):
+    cost: Optional[OperationCost] = None
+    budget: int = 0
+
+    async def on_execute(self):
+        # After validation (so the document is known to be sound), before any resolver runs
+        self.cost = None
+        context = self.execution_context
+        operation_name = context.operation_name
+        self.budget = budget_for(context.query)
+        try:
+            self.cost = analyze(
+                context.schema._schema, context.graphql_document, operation_name, context.variables, self.budget,
+            )
+        except Exception as e:
+            # Malformed variables and the like are reported by execution itself
+            print(f"GraphQL cost analysis failed: {e}")
+            yield
+            return
+
+        error = None
+        if self.cost.depth > settings.GRAPHQL_MAX_DEPTH:
+            error = f"Query is nested {self.cost.depth} levels deep; the limit is {settings.GRAPHQL_MAX_DEPTH}."
+        elif self.cost.aliases > settings.GRAPHQL_MAX_ALIASES:
+            error = f"Query uses {self.cost.aliases} aliases; the limit is {settings.GRAPHQL_MAX_ALIASES}."
+        elif self.cost.cost > self.budget:
+            error = f"Query cost {self.cost.cost} exceeds the budget of {self.budget}."
+        else:
+            wait = await _throttle_wait(getattr(context.context, "request", None), self.cost.cost)
+            if wait > 0:
+                error = f"Too many expensive queries; retry in {wait:.0f}s."
+
+        if error:
+            # A result set here skips execution
+            context.result = GraphQLExecutionResult(
+                data=None, errors=[GraphQLError(error, extensions={"code": "QUERY_TOO_EXPENSIVE"})]
+            )
+        yield
+
+    def get_results(self) -> Dict[str, Any]:
+        if self.cost is None:
+            return {}
+        return {"cost": {
+            "requested": self.cost.cost, "budget": self.budget,
+            "depth": self.cost.depth, "aliases": self.cost.aliases,
+        }}
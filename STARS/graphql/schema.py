@@ -2,15 +2,22 @@ import strawberry
 import strawberry_django
 from strawberry_django.optimizer import DjangoOptimizerExtension
 from strawberry_django.relay import DjangoCursorConnection
-from typing import List, Dict, Optional
+from typing import Iterable, List, Dict, Optional
 
 from django.contrib.postgres.search import TrigramSimilarity, TrigramWordSimilarity
 from . import types, filters, mutations, subscriptions, orders
+from .viewer import annotate_viewer_state
+from .persisted_queries import PersistedQueryExtension
+from .operation_cache import OperationCacheExtension
+from .query_cost import QueryCostExtension
+from .instrumentation import InstrumentationExtension
+from .counts import CountedConnection
+from .pagination import KeysetConnection
 from django.db.models import OuterRef, Subquery, Exists, Q, Value, F
 from django.db.models.functions import Concat, Greatest
 from STARS import models
 from STARS.services.apple_music import AppleMusicService
-from STARS.services.youtube import YoutubeService
+from STARS.services.youtube import VIDEOS_BATCH_SIZE, YoutubeService, existing_video_ids
 from asgiref.sync import sync_to_async
 from django.core.cache import cache
 from STARS.utils.cache import make_cache_key
@@ -18,8 +25,10 @@ from strawberry import relay
 from datetime import datetime
 
 from STARS.services.itunes import iTunesService
+from STARS.services.jobs import get_job_for_user
 
 import re
+import uuid
 
 from STARS.utils.cache import cache_graphql_query, CacheKeys
 from .filters import ReportFilter
@@ -140,60 +149,88 @@ class iTunesPodcastLight:
 
 MARINA_AND_THE_DIAMONDS_ID = "306359292"
 MARINA_ID = "1451242169"
+# URLs accepted by getYoutubeVideosByUrls: one call to YouTube's videos endpoint
+MAX_YOUTUBE_URLS = VIDEOS_BATCH_SIZE
+
+def _youtube_video_detail(vid: dict) -> YoutubeVideoDetail:
+    return YoutubeVideoDetail(
+        id=vid.get("id"),
+        title=vid.get("title", ""),
+        thumbnail_url=vid.get("thumbnail", ""),
+        channel_name=vid.get("channel_title", ""),
+        published_at=vid.get("published_at", ""),
+        length_ms=vid.get("length_ms", 0),
+        view_count=vid.get("view_count", 0),
+        url=vid.get("url", ""),
+        primary_color=vid.get("primary_color", "#000000")
+    )
+
 
 #helper for getting apple music album detail
 def _swap_id(artist_id: str) -> str:
     return MARINA_ID if artist_id == MARINA_AND_THE_DIAMONDS_ID else artist_id
 
 
-async def _fetch_artist_by_id(artist_id: str, href: str) -> AppleMusicArtistDetail:
-    target_id = _swap_id(artist_id)
-    # If the ID was swapped, we should modify the href to match the new ID
-    # Usually hrefs look like /v1/catalog/us/artists/ID
-    target_href = href.replace(artist_id, target_id) if href else ""
+def _artist_detail(artist_id: str, attrs: dict) -> AppleMusicArtistDetail:
+    return AppleMusicArtistDetail(
+        id=artist_id,
+        name=attrs.get("name", ""),
+        image_url=attrs.get("artwork", {}).get("url", ""),
+        url=attrs.get("url", ""),
+        genre_names=attrs.get("genreNames", []),
+    )
 
-    name, image, url, genres = "", "", "", []
 
-    if target_href:
-        try:
-            artist_detail = await apple_music.get_artist(target_href)
-            attrs = artist_detail.get("attributes", {})
-            name = attrs.get("name", "")
-            image = attrs.get("artwork", {}).get("url", "")
-            url = attrs.get("url", "")
-            genres = attrs.get("genreNames", [])
-        except Exception:
-            pass
+async def _fetch_artists_by_ids(
+        artist_ids: List[str], embedded: Optional[Dict[str, dict]] = None
+) -> Dict[str, AppleMusicArtistDetail]:
+    """
+    Resolves every artist of an album at once, keyed by the (swapped) target ID.
+    `embedded` holds attributes that already came back inline (include=artists),
+    so only the remaining IDs are fetched, deduplicated and in bulk.
+    An artist that can't be fetched gets an empty detail, as before.
+    """
+    embedded = embedded or {}
+    target_ids = list(dict.fromkeys(_swap_id(artist_id) for artist_id in artist_ids if artist_id))
 
-    return AppleMusicArtistDetail(
-        id=target_id,
-        name=name,
-        image_url=image,
-        url=url,
-        genre_names=genres,
-    )
+    details = {
+        target_id: _artist_detail(target_id, embedded[target_id])
+        for target_id in target_ids if target_id in embedded
+    }
+
+    to_fetch = [target_id for target_id in target_ids if target_id not in details]
+    try:
+        fetched = await apple_music.get_artists_by_ids(to_fetch)
+    except Exception:
+        fetched = []
+
+    for artist in fetched:
+        details[artist["id"]] = _artist_detail(artist["id"], artist.get("attributes", {}))
+
+    for target_id in to_fetch:
+        details.setdefault(target_id, _artist_detail(target_id, {}))
 
+    return details
 
-async def _process_song(song_data: dict) -> Optional[AppleMusicSongDetail]:
-    """Processes a single song, determining if it's released and fetching artist details."""
+
+def _process_song(song_data: dict, full_song: Optional[dict],
+                  artists_by_id: Dict[str, AppleMusicArtistDetail]) -> Optional[AppleMusicSongDetail]:
+    """Builds a single song from its album track entry and its bulk-fetched catalog entry."""
     if song_data.get("type") != "songs":
         return None
 
     song_attrs = song_data.get("attributes", {})
-    song_href = song_data.get("href", "")
     is_released = song_attrs.get("playParams") is not None
 
     song_artists: List[AppleMusicArtistDetail] = []
 
-    if is_released and song_href:
-        try:
-            full_song = await apple_music.get_song(song_href)
-            artist_data = full_song.get("relationships", {}).get("artists", {}).get("data", [])
-            for s_artist in artist_data:
-                detail = await _fetch_artist_by_id(s_artist.get("id"), s_artist.get("href", ""))
-                song_artists.append(detail)
-        except Exception:
-            full_song = None
+    if is_released and full_song:
+        artist_data = full_song.get("relationships", {}).get("artists", {}).get("data", [])
+        song_artists = [
+            artists_by_id[_swap_id(s_artist.get("id"))]
+            for s_artist in artist_data
+            if _swap_id(s_artist.get("id")) in artists_by_id
+        ]
 
     # Fallback for unreleased songs or failed fetches
     if not song_artists:
@@ -223,6 +260,15 @@ async def _process_song(song_data: dict) -> Optional[AppleMusicSongDetail]:
 
 @strawberry.type
 class Query:
+    @strawberry.field
+    async def job(self, info: strawberry.Info, id: strawberry.ID) -> Optional[types.Job]:
+        """A background job enqueued by the current user (staff see every job)."""
+        try:
+            job_id = uuid.UUID(str(id))
+        except ValueError:
+            return None
+        return await get_job_for_user(job_id, info.context.request.user)
+
     @strawberry.field
     async def me(self, info: strawberry.Info) -> Optional[types.User]:
         def get_authenticated_user():
@@ -1327,70 +1373,36 @@ class Query:
         if not vid:
             return None
 
-        video_id = vid.get("id")
-
-        # 2. Check if it already exists in DB (to avoid duplicates or handle logic)
-        existing_exists = await sync_to_async(lambda:
-            models.MusicVideo.objects.filter(youtube_id=video_id).exists() or
-            models.PerformanceVideo.objects.filter(youtube_id=video_id).exists()
-        )()
-
-        # If it already exists, you might want to return None or handle as you see fit
-        # For now, following your pattern of filtering out existing ones:
-        if existing_exists:
+        # 2. Skip videos already saved as a music or performance video
+        existing_ids = await sync_to_async(existing_video_ids)([vid.get("id")])
+        if existing_ids:
             return None
 
         # 3. Map to GraphQL Type
-        return YoutubeVideoDetail(
-            id=video_id,
-            title=vid.get("title", ""),
-            thumbnail_url=vid.get("thumbnail", ""),
-            channel_name=vid.get("channel_title", ""),
-            published_at=vid.get("published_at", ""),
-            length_ms=vid.get("length_ms", 0),
-            view_count=vid.get("view_count", "0"),
-            url=vid.get("url", ""),
-            primary_color=vid.get("primary_color", "#000000")
-        )
+        return _youtube_video_detail(vid)
 
     @strawberry.field
-    async def search_youtube_videos(self, term: str) -> List[YoutubeVideoDetail]:
-        results = await youtube_service.search_videos(term)
-
-        result_ids = [video.get("id") for video in results if video.get("id")]
-
-        existing_ids = await sync_to_async(lambda: list(
-            models.MusicVideo.objects.filter(
-                youtube_id__in=result_ids
-            ).values_list('youtube_id', flat=True)
-        ) + list(
-            models.PerformanceVideo.objects.filter(
-                youtube_id__in=result_ids
-            ).values_list('youtube_id', flat=True)
-        ))()
-
-        existing_ids_set = set(existing_ids)
+    async def get_youtube_videos_by_urls(self, urls: List[str]) -> List[YoutubeVideoDetail]:
+        """
+        Bulk version of getYoutubeVideoByUrl for importers: one existence check
+        for up to MAX_YOUTUBE_URLS URLs, then the new videos are fetched in one API call.
+        Unparseable URLs and already saved videos are skipped.
+        """
+        if len(urls) > MAX_YOUTUBE_URLS:
+            raise Exception(f"At most {MAX_YOUTUBE_URLS} URLs can be looked up at once.")
+        video_ids = youtube_service.extract_video_ids(urls)
 
-        videos: List[YoutubeVideoDetail] = []
+        existing_ids = await sync_to_async(existing_video_ids)(video_ids)
+        new_ids = [video_id for video_id in video_ids if video_id not in existing_ids]
 
-        for vid in results:
-            if vid.get("id") in existing_ids_set:
-                continue
+        results = await youtube_service.get_videos_by_ids(new_ids)
+        return [_youtube_video_detail(vid) for vid in results]
 
-            videos.append(
-                YoutubeVideoDetail(
-                    id=vid.get("id"),
-                    title=vid.get("title", ""),
-                    thumbnail_url=vid.get("thumbnail", ""),
-                    channel_name=vid.get("channel_title", ""),
-                    published_at=vid.get("published_at", ""),
-                    length_ms=vid.get("length_ms", 0),
-                    view_count=vid.get("view_count", 0),
-                    url=vid.get("url", ""),
-                    primary_color=vid.get("primary_color", "#000000")
-                )
-            )
-        return videos
+    @strawberry.field
+    async def search_youtube_videos(self, term: str) -> List[YoutubeVideoDetail]:
+        # Already saved music and performance videos are filtered out by the service
+        results = await youtube_service.search_videos(term)
+        return [_youtube_video_detail(vid) for vid in results]
 
 
     @strawberry.field
@@ -1454,18 +1466,36 @@ class Query:
         album = await apple_music.get_album_with_songs(album_id)
         album_attrs = album.get("attributes", {})
 
-        # 2. Map Album Artists (using the swap logic)
+        # 2. Released tracks in bulk, artists included inline
+        tracks_data = album.get("relationships", {}).get("tracks", {}).get("data", [])
+        released_ids = [
+            track.get("id") for track in tracks_data
+            if track.get("type") == "songs" and track.get("attributes", {}).get("playParams") is not None
+        ]
+        try:
+            full_songs = {song["id"]: song for song in await apple_music.get_songs_by_ids(released_ids)}
+        except Exception:
+            full_songs = {}
+
+        # 3. Every artist on the album (album + all tracks), deduplicated and resolved at once
         album_artists_data = album.get("relationships", {}).get("artists", {}).get("data", [])
+        song_artists_data = [
+            s_artist
+            for song in full_songs.values()
+            for s_artist in song.get("relationships", {}).get("artists", {}).get("data", [])
+        ]
+        embedded = {a["id"]: a["attributes"] for a in song_artists_data if a.get("attributes")}
+        artists_by_id = await _fetch_artists_by_ids(
+            [a.get("id") for a in album_artists_data + song_artists_data], embedded
+        )
+
         album_artists = [
-            await _fetch_artist_by_id(a.get("id"), a.get("href", ""))
-            for a in album_artists_data
+            artists_by_id[_swap_id(a.get("id"))] for a in album_artists_data if _swap_id(a.get("id")) in artists_by_id
         ]
 
-        # 3. Process Songs
         songs: List[AppleMusicSongDetail] = []
-        tracks_data = album.get("relationships", {}).get("tracks", {}).get("data", [])
         for track in tracks_data:
-            processed_song = await _process_song(track)
+            processed_song = _process_song(track, full_songs.get(track.get("id")), artists_by_id)
             if processed_song:
                 songs.append(processed_song)
 
@@ -1556,48 +1586,28 @@ class Query:
     podcast_genres_ordered: DjangoCursorConnection[types.PodcastGenresOrdered] = strawberry_django.connection(filters=filters.PodcastGenresOrderedFilter, order=orders.PodcastGenresOrderedOrder)
 
     artists: DjangoCursorConnection[types.Artist] = strawberry_django.connection(filters=filters.ArtistFilter, order=orders.ArtistOrder)
-    projects: DjangoCursorConnection[types.Project] = strawberry_django.connection(filters=filters.ProjectFilter, order=orders.ProjectOrder)
-    songs: DjangoCursorConnection[types.Song] = strawberry_django.connection(filters=filters.SongFilter, order=orders.SongOrder)
+    projects: CountedConnection[types.Project] = strawberry_django.connection(filters=filters.ProjectFilter, order=orders.ProjectOrder)
+    songs: CountedConnection[types.Song] = strawberry_django.connection(filters=filters.SongFilter, order=orders.SongOrder)
     podcasts: DjangoCursorConnection[types.Podcast] = strawberry_django.connection(filters=filters.PodcastFilter, order=orders.PodcastOrder)
     outfits: DjangoCursorConnection[types.Outfit] = strawberry_django.connection(filters=filters.OutfitFilter, order=orders.OutfitOrder)
-    comments: DjangoCursorConnection[types.Comment] = strawberry_django.connection(filters=filters.CommentFilter, order=orders.CommentOrder)
-    reviews: DjangoCursorConnection[types.Review] = strawberry_django.connection(filters=filters.ReviewFilter, order=orders.ReviewOrder)
+    comments: KeysetConnection[types.Comment] = strawberry_django.connection(filters=filters.CommentFilter, order=orders.CommentOrder)
 
-    def resolve_reviews(self, info, **kwargs):
-        current_user = info.context.get("user")
-        if not current_user or not current_user.is_authenticated:
-            return models.Review.objects.none()
+    @strawberry_django.connection(KeysetConnection[types.Review], filters=filters.ReviewFilter, order=orders.ReviewOrder)
+    def reviews(self, info: strawberry.Info) -> Iterable[models.Review]:
+        # Viewer flags (liked, followed, re-review...) come back with the page
+        return annotate_viewer_state(models.Review.objects.all(), info)
 
-        followed_subquery = models.Profile.objects.filter(
-            user=OuterRef('user_id'),  # Review.user_id points to the User
-            followers=current_user
-        )
-
-        return models.Review.objects.annotate(
-            user_followed_by_current_user=Exists(followed_subquery)
-        )
-
-    messages: DjangoCursorConnection[types.Message] = strawberry_django.connection(filters=filters.MessageFilter, order=orders.MessageOrder)
-    conversations: DjangoCursorConnection[types.Conversation] = strawberry_django.connection(filters=filters.ConversationFilter, order=orders.ConversationOrder)
+    messages: KeysetConnection[types.Message] = strawberry_django.connection(filters=filters.MessageFilter, order=orders.MessageOrder)
+    conversations: KeysetConnection[types.Conversation] = strawberry_django.connection(filters=filters.ConversationFilter, order=orders.ConversationOrder)
     events: DjangoCursorConnection[types.Event] = strawberry_django.connection(filters=filters.EventFilter, order=orders.EventOrder)
     event_series: DjangoCursorConnection[types.EventSeries] = strawberry_django.connection(filters=filters.EventSeriesFilter, order=orders.EventSeriesOrder)
     music_videos: DjangoCursorConnection[types.MusicVideo] = strawberry_django.connection(filters=filters.MusicVideoFilter, order=orders.MusicVideoOrder)
     performance_videos: DjangoCursorConnection[types.PerformanceVideo] = strawberry_django.connection(filters=filters.PerformanceVideoFilter, order=orders.PerformanceVideoOrder)
-    users: DjangoCursorConnection[types.User] = strawberry_django.connection(filters=filters.UserFilter, order=orders.UserOrder)
-    search_history: DjangoCursorConnection[types.SearchHistory] = strawberry_django.connection(filters=filters.SearchHistoryFilter, order=orders.SearchHistoryOrder)
+    search_history: KeysetConnection[types.SearchHistory] = strawberry_django.connection(filters=filters.SearchHistoryFilter, order=orders.SearchHistoryOrder)
 
-    def resolve_users(self, info, **kwargs):
-        current_user = info.context["user"]
-        if not current_user or not current_user.is_authenticated:
-            return models.User.objects.none()
-
-        followed_subquery = models.Profile.objects.filter(
-            user=OuterRef('pk'),
-            followers=current_user
-        )
-        return models.User.objects.annotate(
-            followed_by_current_user=Exists(followed_subquery)
-        )
+    @strawberry_django.connection(CountedConnection[types.User], filters=filters.UserFilter, order=orders.UserOrder)
+    def users(self, info: strawberry.Info) -> Iterable[models.User]:
+        return annotate_viewer_state(models.User.objects.all(), info)
 
     project_songs: DjangoCursorConnection[types.ProjectSong] = strawberry_django.connection(filters=filters.ProjectSongFilter, order=orders.ProjectSongOrder)
     project_artists: DjangoCursorConnection[types.ProjectArtist] = strawberry_django.connection(filters=filters.ProjectArtistFilter, order=orders.ProjectArtistOrder)
@@ -1612,5 +1622,5 @@ schema = strawberry.Schema(
     query=Query,
     mutation=mutations.Mutation,
     subscription=subscriptions.Subscription,
-    extensions=[DjangoOptimizerExtension],
+    extensions=[InstrumentationExtension, PersistedQueryExtension, QueryCostExtension, OperationCacheExtension, DjangoOptimizerExtension],
 )
\ No newline at end of file
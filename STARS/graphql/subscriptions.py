@@ -1,5 +1,7 @@
 import strawberry
 import asyncio
+import time
+import uuid
 from typing import AsyncGenerator, Optional, Annotated, Union
 from asgiref.sync import async_to_sync
 from channels.db import database_sync_to_async
@@ -8,8 +10,23 @@ from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 
 from STARS import models
+from STARS.services.jobs import get_job_for_user, job_group_name
+from STARS.services.metrics import gauge, histogram
 from . import types
 
+ACTIVE_SUBSCRIPTIONS = gauge("stars_graphql_active_subscriptions", "Open GraphQL subscriptions", ["subscription"])
+BROADCAST_SECONDS = histogram(
+    "stars_channel_broadcast_latency_seconds", "Time from group_send to the subscriber receiving it", ["event"],
+)
+
+
+def _received(event: dict, kind: str) -> dict:
+    # Broadcasts carry their send time (see broadcast_message_event, notify_job...)
+    sent_at = event.get("sent_at")
+    if sent_at is not None:
+        BROADCAST_SECONDS.observe(max(0.0, time.time() - sent_at), event=kind)
+    return event
+
 
 # -----------------------------------------------------------------------------
 # Subscription Payload Types
@@ -62,10 +79,11 @@ class Subscription:
         group_name = f"conversation_{conversation_id}"
         channel_name = await channel_layer.new_channel()
         await channel_layer.group_add(group_name, channel_name)
+        ACTIVE_SUBSCRIPTIONS.inc(subscription="messageEvents")
 
         try:
             while True:
-                event = await channel_layer.receive(channel_name)
+                event = _received(await channel_layer.receive(channel_name), "message")
                 event_type = event["data"]["event_type"]
                 message_id = event["data"]["id"]
 
@@ -80,6 +98,7 @@ class Subscription:
                     yield MessageDeletedPayload(event_type=event_type, id=message_id)
 
         finally:
+            ACTIVE_SUBSCRIPTIONS.dec(subscription="messageEvents")
             await channel_layer.group_discard(group_name, channel_name)
 
     @strawberry.subscription
@@ -96,10 +115,11 @@ class Subscription:
         group_name = f"user_{user.id}_conversations"
         channel_name = await channel_layer.new_channel()
         await channel_layer.group_add(group_name, channel_name)
+        ACTIVE_SUBSCRIPTIONS.inc(subscription="conversationUpdates")
 
         try:
             while True:
-                event = await channel_layer.receive(channel_name)
+                event = _received(await channel_layer.receive(channel_name), "conversation")
                 conversation_id = event["data"]["id"]
 
                 # --- NEW SECURITY CHECK ---
@@ -125,6 +145,38 @@ class Subscription:
 
                 yield ConversationEventPayload(conversation=conversation_obj)
         finally:
+            ACTIVE_SUBSCRIPTIONS.dec(subscription="conversationUpdates")
+            await channel_layer.group_discard(group_name, channel_name)
+
+    @strawberry.subscription
+    async def job_updates(self, info: strawberry.Info, job_id: strawberry.ID) -> AsyncGenerator[types.Job, None]:
+        """The job now and after every change, until it succeeds or fails."""
+        user = info.context.get("user")
+        try:
+            job_id = uuid.UUID(str(job_id))
+        except ValueError:
+            raise ValueError("Job not found.")
+        job = await get_job_for_user(job_id, user)
+        if job is None:
+            raise ValueError("Job not found.")
+
+        channel_layer = get_channel_layer()
+        group_name = job_group_name(job_id)
+        channel_name = await channel_layer.new_channel()
+        await channel_layer.group_add(group_name, channel_name)
+        ACTIVE_SUBSCRIPTIONS.inc(subscription="jobUpdates")
+
+        try:
+            # Read again after joining the group so no update falls in between
+            job = await database_sync_to_async(models.Job.objects.get)(pk=job_id)
+            while True:
+                yield job
+                if job.status in (models.Job.JobStatus.SUCCEEDED, models.Job.JobStatus.FAILED):
+                    break
+                _received(await channel_layer.receive(channel_name), "job")
+                job = await database_sync_to_async(models.Job.objects.get)(pk=job_id)
+        finally:
+            ACTIVE_SUBSCRIPTIONS.dec(subscription="jobUpdates")
             await channel_layer.group_discard(group_name, channel_name)
 
 
@@ -141,7 +193,7 @@ async def broadcast_message_event(message_id: strawberry.ID, conversation_id: st
 
     await channel_layer.group_send(
         group_name,
-        {"type": "subscription.event", "data": await database_sync_to_async(create_payload)()},
+        {"type": "subscription.event", "data": await database_sync_to_async(create_payload)(), "sent_at": time.time()},
     )
 
 # In subscriptions.py
@@ -164,5 +216,5 @@ async def broadcast_conversation_update(conversation_id: int):
         group_name = f"user_{user_id}_conversations"
         await channel_layer.group_send(
             group_name,
-            {"type": "subscription.event", "data": {"id": conversation_id}},
+            {"type": "subscription.event", "data": {"id": conversation_id}, "sent_at": time.time()},
         )
\ No newline at end of file
@@ -6,7 +6,6 @@ from django.db.models import QuerySet, Count, Q
 from strawberry_django.relay import DjangoCursorConnection
 from STARS import models
 from django.contrib.auth.models import User as DjangoUser
-from asgiref.sync import sync_to_async
 from strawberry import relay
 from STARS import models
 from django.utils import timezone # Added
@@ -15,6 +14,7 @@ from django.contrib.contenttypes.models import ContentType # Added
 
 # Import your filters to use them in the fields
 from . import filters, orders
+from .loaders import get_loaders
 
 @strawberry.type
 class MusicSearchResponse:
@@ -114,23 +114,17 @@ class Comment(strawberry.relay.Node):
 
     @strawberry.field
     async def liked_by_current_user(self, info: Info) -> bool:
-        def check():
-            user = info.context.request.user
-            if user.is_anonymous:
-                return False
-            return self.liked_by.filter(pk=user.pk).exists()
-
-        return await sync_to_async(check)()
+        if hasattr(self, "liked_by_current_user"):  # annotated by the connection (see viewer.py)
+            return self.liked_by_current_user
+        liked, _ = await get_loaders(info).reactions(models.Comment).load(self.pk)
+        return liked
 
     @strawberry.field
     async def disliked_by_current_user(self, info: Info) -> bool:
-        def check():
-            user = info.context.request.user
-            if user.is_anonymous:
-                return False
-            return self.disliked_by.filter(pk=user.pk).exists()
-
-        return await sync_to_async(check)()
+        if hasattr(self, "disliked_by_current_user"):
+            return self.disliked_by_current_user
+        _, disliked = await get_loaders(info).reactions(models.Comment).load(self.pk)
+        return disliked
 
 
 @strawberry_django.type(models.RankedItem, fields="__all__")
@@ -160,38 +154,30 @@ class Review(strawberry.relay.Node):
 
     @strawberry.field
     async def liked_by_current_user(self, info: Info) -> bool:
-        def check():
-            user = info.context.request.user
-            if user.is_anonymous:
-                return False
-            return self.liked_by.filter(pk=user.pk).exists()
-
-        return await sync_to_async(check)()
+        if hasattr(self, "liked_by_current_user"):  # annotated by the connection (see viewer.py)
+            return self.liked_by_current_user
+        liked, _ = await get_loaders(info).reactions(models.Review).load(self.pk)
+        return liked
 
     @strawberry.field
     async def disliked_by_current_user(self, info: Info) -> bool:
-        def check():
-            user = info.context.request.user
-            if user.is_anonymous:
-                return False
-            return self.disliked_by.filter(pk=user.pk).exists()
-
-        return await sync_to_async(check)()
-
-    @strawberry.field
-    async def is_rereview(self) -> bool:
-        if self.content_type is None:
+        if hasattr(self, "disliked_by_current_user"):
+            return self.disliked_by_current_user
+        _, disliked = await get_loaders(info).reactions(models.Review).load(self.pk)
+        return disliked
+
+    # The optimizer only loads selected columns; these are read without a thread hop
+    @strawberry_django.field(only=["user_id", "content_type_id", "object_id", "date_created"])
+    async def is_rereview(self, info: Info) -> bool:
+        if hasattr(self, "is_rereview"):
+            return self.is_rereview
+        if self.content_type_id is None:
             return False
 
-        def check():
-            return models.Review.objects.filter(
-                user=self.user,
-                content_type=self.content_type,
-                object_id=self.object_id,
-                date_created__lt=self.date_created
-            ).exists()
-
-        return await sync_to_async(check)()
+        first_date = await get_loaders(info).first_review_date.load(
+            (self.user_id, self.content_type_id, self.object_id)
+        )
+        return first_date is not None and first_date < self.date_created
 
 
 SubReviewTopic = strawberry.enum(models.SubReview.Topic)
@@ -331,6 +317,17 @@ class Report(strawberry.relay.Node):
 class CreateReportPayload:
     created_successfully: bool
 
+
+@strawberry_django.type(
+    models.Job,
+    fields=[
+        "id", "kind", "status", "attempts", "max_attempts", "progress", "progress_message",
+        "result", "error", "date_created", "date_started", "date_finished",
+    ]
+)
+class Job:
+    pass
+
 Reviewable = Annotated[
     Union[Event, Project, Song, MusicVideo, PerformanceVideo, Podcast, Outfit, Cover],
     strawberry.union("Reviewable")
@@ -0,0 +1,99 @@
+"""
+Viewer-state annotations for the top-level connections.
+
+A connection resolver calls annotate_viewer_state(queryset, info), which adds
+an Exists() subquery for each viewer field the query selects (or orders by)
+and nothing else. The flags then come back with the page itself, in one SQL
+query. Resolvers read the annotation when it is there and fall back to the
+DataLoaders in loaders.py otherwise (nested connections, single objects).
+"""
+from typing import Callable, Dict, Iterable, Set, Tuple
+
+from django.db.models import BooleanField, Exists, OuterRef, Value
+from strawberry.types import Info
+from strawberry.types.nodes import FragmentSpread, InlineFragment
+
+from STARS import models
+from .loaders import current_user
+
+
+def _liked(model, relation: str):
+    def build(user):
+        through = getattr(model, relation).through
+        return Exists(through.objects.filter(**{f"{model._meta.model_name}_id": OuterRef("pk"), "user_id": user.pk}))
+    return build
+
+
+def _followed(user_ref: str):
+    def build(user):
+        # followers are profiles, not users
+        return Exists(models.Profile.objects.filter(user_id=OuterRef(user_ref), followers__user_id=user.pk))
+    return build
+
+
+def _rereview(user):
+    return Exists(models.Review.objects.filter(
+        user_id=OuterRef("user_id"),
+        content_type_id=OuterRef("content_type_id"),
+        object_id=OuterRef("object_id"),
+        date_created__lt=OuterRef("date_created"),
+    ))
+
+
+# GraphQL field or order name -> (annotation, builder taking the viewer).
+# The annotations are named after the fields, so resolvers and orders find them.
+VIEWER_ANNOTATIONS: Dict[type, Dict[str, Tuple[str, Callable]]] = {
+    models.Review: {
+        "likedByCurrentUser": ("liked_by_current_user", _liked(models.Review, "liked_by")),
+        "dislikedByCurrentUser": ("disliked_by_current_user", _liked(models.Review, "disliked_by")),
+        "isRereview": ("is_rereview", _rereview),
+        "userFollowedByCurrentUser": ("user_followed_by_current_user", _followed("user_id")),
+    },
+    models.User: {
+        "followedByCurrentUser": ("followed_by_current_user", _followed("pk")),
+    },
+}
+
+# Flags that do not depend on who is asking
+VIEWER_INDEPENDENT = {"is_rereview"}
+
+
+def _names_at(selections, path: Iterable[str]) -> Set[str]:
+    """Field names selected at `path` (e.g. edges > node), looking through fragments."""
+    path = list(path)
+    names: Set[str] = set()
+    for selection in selections:
+        if isinstance(selection, (FragmentSpread, InlineFragment)):
+            names |= _names_at(selection.selections, path)
+        elif not path:
+            names.add(selection.name)
+        elif selection.name == path[0]:
+            names |= _names_at(selection.selections, path[1:])
+    return names
+
+
+def _order_names(order) -> Set[str]:
+    if not isinstance(order, dict):
+        return set()
+    return set(order)
+
+
+def requested_viewer_fields(info: Info) -> Set[str]:
+    field = info.selected_fields[0]
+    selected = _names_at(field.selections, ["edges", "node"]) | _names_at(field.selections, ["nodes"])
+    return selected | _order_names(field.arguments.get("order"))
+
+
+def annotate_viewer_state(queryset, info: Info):
+    annotations = VIEWER_ANNOTATIONS.get(queryset.model, {})
+    wanted = [annotations[name] for name in requested_viewer_fields(info) if name in annotations]
+    if not wanted:
+        return queryset
+
+    user = current_user(info)
+    anonymous = user is None or not user.is_authenticated
+    return queryset.annotate(**{
+        attname: Value(False, output_field=BooleanField()) if anonymous and attname not in VIEWER_INDEPENDENT
+        else build(user)
+        for attname, build in wanted
+    })
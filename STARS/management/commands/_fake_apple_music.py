@@ -0,0 +1,156 @@
+"""
+A tiny local stand-in for the Apple Music catalog API, used by the benchmark
+commands. Every request sleeps for `latency` seconds to mimic a real round
+trip. Artwork URLs point back at the server and return a small PNG.
+"""
+import io
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from PIL import Image
+
+ARTWORK_SIZE = 256
+
+
+def artwork_png(seed: str) -> bytes:
+    value = sum(seed.encode())
+    color = (value * 37 % 256, value * 91 % 256, value * 53 % 256)
+    buf = io.BytesIO()
+    Image.new("RGB", (ARTWORK_SIZE, ARTWORK_SIZE), color).save(buf, "PNG")
+    return buf.getvalue()
+
+
+class FakeAppleMusicServer:
+    def __init__(self, latency: float = 0.1, tracks_per_album: int = 20):
+        self.latency = latency
+        self.tracks_per_album = tracks_per_album
+        self.requests = Counter()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.root = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def artist(self, artist_id: str) -> dict:
+        return {
+            "id": artist_id,
+            "type": "artists",
+            "attributes": {
+                "name": f"Artist {artist_id}",
+                "url": f"https://music.apple.com/artist/{artist_id}",
+                "genreNames": ["Pop", "Music"],
+                "artwork": {"url": f"{self.root}/artwork/{artist_id}/{{w}}x{{h}}bb.png"},
+            },
+        }
+
+    def song(self, song_id: str, include_artists: bool = False) -> dict:
+        """Each track is by the album artist, every other one featuring a guest."""
+        track = int(song_id.rsplit("-", 1)[-1])
+        artist_ids = ["album-artist"] + ([f"guest-{track % 4}"] if track % 2 else [])
+        artists = [
+            {**self.artist(a), "href": f"/v1/catalog/ca/artists/{a}"} if include_artists
+            else {"id": a, "type": "artists", "href": f"/v1/catalog/ca/artists/{a}"}
+            for a in artist_ids
+        ]
+        return {
+            "id": song_id,
+            "type": "songs",
+            "href": f"/v1/catalog/ca/songs/{song_id}",
+            "attributes": {
+                "name": f"Track {track}",
+                "artistName": "Album Artist",
+                "durationInMillis": 200000,
+                "discNumber": 1,
+                "trackNumber": track,
+                "releaseDate": "2024-01-01",
+                "genreNames": ["Pop", "Music"],
+                "playParams": {"id": song_id, "kind": "song"},
+                "previews": [{"url": f"{self.root}/preview/{song_id}.m4a"}],
+                "url": f"https://music.apple.com/song/{song_id}",
+            },
+            "relationships": {"artists": {"data": artists}},
+        }
+
+    def album(self, album_id: str) -> dict:
+        return {
+            "id": album_id,
+            "type": "albums",
+            "attributes": {
+                "name": f"Album {album_id}",
+                "releaseDate": "2024-01-01",
+                "artwork": {"url": f"{self.root}/artwork/{album_id}/{{w}}x{{h}}bb.png", "bgColor": "223344"},
+                "genreNames": ["Pop", "Music"],
+                "recordLabel": "Benchmark Records",
+                "playParams": {"id": album_id, "kind": "album"},
+                "contentRating": "explicit",
+            },
+            "relationships": {
+                "artists": {"data": [{"id": "album-artist", "type": "artists", "href": "/v1/catalog/ca/artists/album-artist"}]},
+                "tracks": {"data": [
+                    {key: value for key, value in self.song(f"{album_id}-{i}").items() if key != "relationships"}
+                    for i in range(1, self.tracks_per_album + 1)
+                ]},
+            },
+        }
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str = "application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                time.sleep(server.latency)
+                parsed = urlparse(self.path)
+                query = parse_qs(parsed.query)
+
+                if match := re.fullmatch(r"/artwork/([^/]+)/\d+x\d+bb\.png", parsed.path):
+                    server.requests["artwork"] += 1
+                    return self._send(200, artwork_png(match.group(1)), "image/png")
+
+                if re.fullmatch(r"/v1/catalog/\w+/artists", parsed.path) and "ids" in query:
+                    server.requests["artists_bulk"] += 1
+                    ids = query["ids"][0].split(",")
+                    return self._send(200, json.dumps({"data": [server.artist(i) for i in ids]}).encode())
+
+                if match := re.fullmatch(r"/v1/catalog/\w+/albums/([^/]+)", parsed.path):
+                    server.requests["album"] += 1
+                    return self._send(200, json.dumps({"data": [server.album(match.group(1))]}).encode())
+
+                if re.fullmatch(r"/v1/catalog/\w+/songs", parsed.path) and "ids" in query:
+                    server.requests["songs_bulk"] += 1
+                    include_artists = "artists" in query.get("include", [""])[0].split(",")
+                    songs = [server.song(i, include_artists) for i in query["ids"][0].split(",")]
+                    return self._send(200, json.dumps({"data": songs}).encode())
+
+                if match := re.fullmatch(r"/v1/catalog/\w+/songs/([^/]+)", parsed.path):
+                    server.requests["song"] += 1
+                    return self._send(200, json.dumps({"data": [server.song(match.group(1))]}).encode())
+
+                if match := re.fullmatch(r"/v1/catalog/\w+/artists/([^/]+)", parsed.path):
+                    server.requests["artist"] += 1
+                    return self._send(200, json.dumps({"data": [server.artist(match.group(1))]}).encode())
+
+                return self._send(404, b'{"errors": []}')
+
+        return Handler
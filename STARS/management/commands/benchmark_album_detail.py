@@ -0,0 +1,67 @@
+import asyncio
+import statistics
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+
+from STARS.graphql import schema as schema_module
+from STARS.services.apple_music import AppleMusicService
+from STARS.services.http import close_clients
+
+from ._fake_apple_music import FakeAppleMusicServer
+
+ALBUM_DETAIL_QUERY = """
+query AlbumDetail($albumId: String!) {
+  getAlbumDetail(albumId: $albumId) {
+    id
+    name
+    artists { id name }
+    songs { id name artists { id name imageUrl } }
+  }
+}
+"""
+
+
+class Command(BaseCommand):
+    help = 'Measures getAlbumDetail latency against a local fake Apple Music server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tracks', type=int, default=20, help='Tracks per album')
+        parser.add_argument('--runs', type=int, default=20)
+        parser.add_argument('--latency', type=float, default=0.05, help='Simulated seconds per upstream request')
+
+    def handle(self, *args, **options):
+        with FakeAppleMusicServer(latency=options['latency'], tracks_per_album=options['tracks']) as server, \
+                mock.patch("STARS.services.apple_music.get_apple_music_token", return_value="benchmark"):
+
+            async def _run():
+                service = AppleMusicService(api_root=server.root)
+                timings = []
+                try:
+                    with mock.patch.object(schema_module, "apple_music", service):
+                        for run in range(options['runs']):
+                            start = time.perf_counter()
+                            result = await schema_module.schema.execute(
+                                ALBUM_DETAIL_QUERY, variable_values={"albumId": f"bench-{run}"}
+                            )
+                            timings.append(time.perf_counter() - start)
+                            if result.errors:
+                                raise result.errors[0]
+                finally:
+                    await close_clients()
+                return timings, len(result.data["getAlbumDetail"]["songs"])
+
+            timings, songs = asyncio.run(_run())
+
+        runs = options['runs']
+        timings_ms = sorted(t * 1000 for t in timings)
+        p95 = timings_ms[min(len(timings_ms) - 1, int(round(0.95 * (len(timings_ms) - 1))))]
+        per_album = {name: count / runs for name, count in server.requests.items()}
+
+        self.stdout.write(
+            f"{runs} albums x {songs} tracks, {options['latency'] * 1000:.0f} ms per upstream request"
+        )
+        self.stdout.write(f" -> p50 {statistics.median(timings_ms):.0f} ms, p95 {p95:.0f} ms")
+        self.stdout.write(f" -> upstream requests per album: {per_album}")
+        self.stdout.write(self.style.SUCCESS("Album detail benchmark complete."))
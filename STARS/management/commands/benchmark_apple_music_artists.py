@@ -0,0 +1,77 @@
+import asyncio
+import time
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from STARS import models
+from STARS.graphql.mutations import _fetch_missing_artist_data
+from STARS.services import storage
+from STARS.services.apple_music import AppleMusicService
+from STARS.services.http import close_clients
+from STARS.services.images import process_image_from_url
+
+from ._fake_apple_music import FakeAppleMusicServer
+
+
+async def fetch_one_by_one(am_ids, am_service) -> dict:
+    """The previous loop: exists() + get_artist + process_image_from_url per artist, in sequence."""
+    artists_data = {}
+    for am_id in am_ids:
+        exists = await sync_to_async(models.Artist.objects.filter(apple_music_id=am_id).exists)()
+        if exists: continue
+        try:
+            artist_json = await am_service.get_artist(f"/v1/catalog/us/artists/{am_id}")
+            attrs = artist_json.get("attributes", {})
+            pic_url, primary, secondary = await sync_to_async(process_image_from_url)(attrs.get("artwork", {}).get("url", ""))
+            artists_data[am_id] = {"name": attrs.get("name", ""), "picture": pic_url or ""}
+        except Exception: pass
+    return artists_data
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks missing-artist fetching against a local fake Apple Music server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--artists', type=int, default=20, help='Number of new artists to fetch')
+        parser.add_argument('--latency', type=float, default=0.1, help='Simulated seconds per upstream request')
+
+    def handle(self, *args, **options):
+        am_ids = [f"bench-artist-{i}" for i in range(options['artists'])]
+
+        with FakeAppleMusicServer(latency=options['latency']) as server, \
+                override_settings(MEDIA_STORAGE_BACKEND="STARS.services.storage.MockStorage"), \
+                mock.patch("STARS.services.apple_music.get_apple_music_token", return_value="benchmark"):
+            storage.get_storage.cache_clear()
+
+            def _forget_pictures():
+                models.StoredImage.objects.filter(source_url__startswith=server.root).delete()
+
+            async def _run(fetch):
+                am_service = AppleMusicService(api_root=server.root)
+                server.requests.clear()
+                start = time.perf_counter()
+                try:
+                    data = await fetch(set(am_ids), am_service)
+                finally:
+                    await close_clients()
+                return data, time.perf_counter() - start, dict(server.requests)
+
+            try:
+                _forget_pictures()
+                old_data, old_time, old_requests = asyncio.run(_run(fetch_one_by_one))
+                _forget_pictures()
+                new_data, new_time, new_requests = asyncio.run(_run(_fetch_missing_artist_data))
+            finally:
+                _forget_pictures()
+                storage.get_storage.cache_clear()
+
+        self.stdout.write(f"{len(am_ids)} artists, {options['latency'] * 1000:.0f} ms per upstream request")
+        self.stdout.write(f" -> one by one: {len(old_data)} artists in {old_time:.2f}s, requests {old_requests}")
+        self.stdout.write(f" -> batched:    {len(new_data)} artists in {new_time:.2f}s, requests {new_requests}")
+        if new_time:
+            self.stdout.write(f" -> {old_time / new_time:.1f}x faster")
+
+        self.stdout.write(self.style.SUCCESS("Apple Music artist benchmark complete."))
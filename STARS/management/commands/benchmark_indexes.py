@@ -0,0 +1,206 @@
+import random
+import statistics
+import time
+from datetime import date
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+
+from STARS import models
+
+BENCHMARK_USERNAME_PREFIX = "bench-idx-"
+TITLE_WORDS = [
+    "Velvet", "Harbor", "Neon", "Midnight", "Paper", "Golden", "Echo", "Silver", "Static", "Honey",
+    "Crystal", "Wild", "Faded", "Electric", "Lonely", "Summer", "Broken", "Violet", "Ocean", "Ghost",
+    "Rebel", "Satellite", "Cherry", "Thunder", "Glass", "Desert", "Marble", "Sugar", "Northern", "Hollow",
+]
+
+# Indexes of migrations 0074-0076 the benchmarked queries rely on, by model
+INDEXES = [
+    (models.Review, ["review_user_object_idx", "review_object_created_idx", "review_object_latest_idx"]),
+    (models.Message, ["message_unread_idx"]),
+    (models.SearchHistory, ["search_user_time_id_idx"]),
+    (models.Song, ["song_title_trgm_idx"]),
+]
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates a dataset and compares the plans and timings of the review, message, search history '
+        'and title queries without and with their indexes. Everything, data and index changes alike, is '
+        'rolled back, but the tables stay locked meanwhile: run it against a development database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--songs', type=int, default=20000)
+        parser.add_argument('--reviews', type=int, default=300000)
+        parser.add_argument('--conversations', type=int, default=5000)
+        parser.add_argument('--messages', type=int, default=300000)
+        parser.add_argument('--searches', type=int, default=100000)
+        parser.add_argument('--runs', type=int, default=20, help='Timed runs per query')
+        parser.add_argument('--force', action='store_true', help='Run even when DEBUG is off')
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("The index benchmark needs PostgreSQL (partial and GIN trigram indexes).")
+        if not settings.DEBUG and not options['force']:
+            raise CommandError("This locks the review, message and song tables; pass --force outside DEBUG.")
+
+        self.rng = random.Random(42)
+        results = {}
+        try:
+            with transaction.atomic():
+                start = time.perf_counter()
+                targets = self._generate(options)
+                self.stdout.write(f"Generated the dataset in {time.perf_counter() - start:.1f}s")
+                queries = self._queries(targets)
+
+                self._set_indexes(present=False)
+                for name, qs in queries:
+                    results[name] = {"before": self._measure(qs, options['runs'])}
+                self._set_indexes(present=True)
+                for name, qs in queries:
+                    results[name]["after"] = self._measure(qs, options['runs'])
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        for name, phases in results.items():
+            self.stdout.write(f"\n{name}")
+            for phase in ("before", "after"):
+                ms, plan = phases[phase]
+                self.stdout.write(f"  {phase:<6} {ms:9.3f} ms  {self._summary(plan)}")
+                if options['verbosity'] >= 2:
+                    self.stdout.write("\n".join(f"           {line}" for line in plan.splitlines()))
+            before, after = phases["before"][0], phases["after"][0]
+            self.stdout.write(f"  -> {before / after if after else 0:.1f}x")
+        self.stdout.write(self.style.SUCCESS("\nIndex benchmark complete (all changes rolled back)."))
+
+    def _title(self, i: int) -> str:
+        words = self.rng.sample(TITLE_WORDS, 2)
+        return f"{words[0]} {words[1]} {i}"
+
+    def _generate(self, options):
+        rng = self.rng
+        users = models.User.objects.bulk_create([
+            models.User(username=f"{BENCHMARK_USERNAME_PREFIX}{i}") for i in range(options['users'])
+        ])
+        songs = models.Song.objects.bulk_create([
+            models.Song(title=self._title(i), length=180, release_date=date(2020, 1, 1))
+            for i in range(options['songs'])
+        ], batch_size=5000)
+        song_type = ContentType.objects.get_for_model(models.Song)
+
+        # Popular songs get most of the reviews, like real traffic
+        weights = [1 / (rank + 1) for rank in range(len(songs))]
+        reviewed = rng.choices(songs, weights=weights, k=options['reviews'])
+        created = {}
+        created[models.Review] = models.Review.objects.bulk_create([
+            models.Review(
+                user=rng.choice(users), content_type=song_type, object_id=song.pk, title="Benchmark",
+                stars=rng.randint(1, 10) / 2, is_latest=rng.random() > 0.15,
+            )
+            for song in reviewed
+        ], batch_size=5000)
+
+        conversations = models.Conversation.objects.bulk_create(
+            [models.Conversation() for _ in range(options['conversations'])], batch_size=5000,
+        )
+        created[models.Message] = models.Message.objects.bulk_create([
+            models.Message(
+                conversation=rng.choice(conversations), sender=rng.choice(users), text="Benchmark",
+                is_read=rng.random() > 0.1,
+            )
+            for _ in range(options['messages'])
+        ], batch_size=5000)
+
+        created[models.SearchHistory] = models.SearchHistory.objects.bulk_create([
+            models.SearchHistory(user=rng.choice(users), query="benchmark", category="MUSIC")
+            for _ in range(options['searches'])
+        ], batch_size=5000)
+
+        # auto_now_add stamped every row with the same time; spread them over two years
+        with connection.cursor() as cursor:
+            for model, column in ((models.Review, "date_created"), (models.Message, "time"),
+                                  (models.SearchHistory, "timestamp")):
+                if created[model]:
+                    cursor.execute(
+                        f'UPDATE "{model._meta.db_table}" SET "{column}" = now() - random() * interval \'730 days\' '
+                        f'WHERE "id" >= %s',
+                        [created[model][0].pk],
+                    )
+
+        popular = songs[0]
+        reviewer = models.Review.objects.filter(content_type=song_type, object_id=popular.pk).values_list(
+            "user_id", flat=True
+        ).first()
+        conversation = models.Message.objects.filter(is_read=False).values_list("conversation_id", flat=True).first()
+        return {
+            "song_type": song_type, "popular": popular, "reviewer": reviewer, "top_songs": songs[:50],
+            "conversation": conversation, "user": users[0], "title": popular.title.rsplit(" ", 1)[0],
+        }
+
+    def _queries(self, targets):
+        song_type, popular = targets["song_type"], targets["popular"]
+        reviews = models.Review.objects.order_by()
+        return [
+            ("Review: the viewer's current review of an object", reviews.filter(
+                user_id=targets["reviewer"], content_type=song_type, object_id=popular.pk, is_latest=True,
+            )),
+            ("Review: an object's reviews, newest first (page of 20)", reviews.filter(
+                content_type=song_type, object_id=popular.pk,
+            ).order_by("-date_created")[:20]),
+            ("Review: an object's latest reviews, newest first (page of 20)", reviews.filter(
+                content_type=song_type, object_id=popular.pk, is_latest=True,
+            ).order_by("-date_created")[:20]),
+            ("Review: counts for 50 objects", reviews.filter(
+                content_type=song_type, object_id__in=[song.pk for song in targets["top_songs"]],
+            ).values("object_id").annotate(count=Count("id"))),
+            ("Message: unread messages of a conversation", models.Message.objects.order_by().filter(
+                conversation_id=targets["conversation"], is_read=False,
+            ).exclude(sender=targets["user"])),
+            ("SearchHistory: a user's recent searches (page of 20)", models.SearchHistory.objects.filter(
+                user=targets["user"],
+            ).order_by("-timestamp")[:20]),
+            (f"Song: title icontains {targets['title']!r}", models.Song.objects.order_by().filter(
+                title__icontains=targets["title"],
+            )),
+        ]
+
+    def _set_indexes(self, present: bool):
+        with connection.schema_editor(atomic=False) as editor:
+            for model, names in INDEXES:
+                by_name = {index.name: index for index in model._meta.indexes}
+                with connection.cursor() as cursor:
+                    existing = connection.introspection.get_constraints(cursor, model._meta.db_table)
+                for name in names:
+                    if present and name not in existing:
+                        editor.add_index(model, by_name[name])
+                    elif not present and name in existing:
+                        editor.remove_index(model, by_name[name])
+        with connection.cursor() as cursor:
+            for model, _ in INDEXES:
+                cursor.execute(f'ANALYZE "{model._meta.db_table}"')
+
+    def _measure(self, qs, runs: int):
+        """Median milliseconds over `runs` evaluations, and the EXPLAIN ANALYZE plan."""
+        list(qs.all())  # warm the buffer cache
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            list(qs.all())
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings), qs.explain(analyze=True, buffers=True)
+
+    @staticmethod
+    def _summary(plan: str) -> str:
+        scans = [line.strip().lstrip("-> ").split("  (")[0] for line in plan.splitlines() if "Scan" in line]
+        return " / ".join(scans)
@@ -0,0 +1,90 @@
+import asyncio
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.core.management.base import BaseCommand
+from strawberry.django.context import StrawberryDjangoContext
+
+from STARS.graphql.persisted_queries import documents, query_hash, store_query
+from STARS.graphql.schema import schema
+
+# A feed page the way the mobile app asks for it: fragments, variables, nesting
+FEED_QUERY = """
+fragment UserBits on User { id username firstName }
+fragment ReactionBits on Review { likesCount dislikesCount likedByCurrentUser dislikedByCurrentUser }
+fragment CommentBits on Comment {
+  id text likesCount dislikesCount likedByCurrentUser dislikedByCurrentUser
+  user { ...UserBits }
+}
+query Feed($first: Int!, $comments: Int!) {
+  reviews(first: $first, order: {dateCreated: DESC}) {
+    pageInfo { hasNextPage endCursor }
+    edges {
+      cursor
+      node {
+        id title text stars isLatest isRereview commentsCount dateCreated
+        ...ReactionBits
+        user { ...UserBits }
+        comments(first: $comments) { edges { node { ...CommentBits } } }
+        subreviews(first: 10) { edges { node { id stars text topic } } }
+      }
+    }
+  }
+}
+"""
+
+
+class Command(BaseCommand):
+    help = 'Measures CPU per /graphql/ request with and without persisted queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=300)
+        parser.add_argument('--page-size', type=int, default=0,
+                            help='Reviews per page; 0 isolates parse/validate from resolver work')
+
+    def _context(self):
+        request = RequestFactory().post('/graphql/')
+        request.user = AnonymousUser()
+        return StrawberryDjangoContext(request=request, response=HttpResponse())
+
+    async def _measure(self, runs: int, variables: dict, persisted: bool):
+        sha256 = query_hash(FEED_QUERY)
+        cpu = []
+        for _ in range(runs):
+            start = time.process_time()
+            result = await schema.execute(
+                None if persisted else FEED_QUERY,
+                variable_values=variables,
+                context_value=self._context(),
+                operation_extensions={"persistedQuery": {"version": 1, "sha256Hash": sha256}} if persisted else None,
+            )
+            cpu.append(time.process_time() - start)
+            if result.errors:
+                raise result.errors[0]
+        return cpu
+
+    def handle(self, *args, **options):
+        runs = options['runs']
+        variables = {"first": options['page_size'], "comments": 5}
+        store_query(FEED_QUERY)
+
+        with override_settings(GRAPHQL_PERSISTED_QUERIES="off"):
+            baseline = asyncio.run(self._measure(runs, variables, persisted=False))
+        documents.clear()
+        with override_settings(GRAPHQL_PERSISTED_QUERIES="auto"):
+            persisted = asyncio.run(self._measure(runs, variables, persisted=True))
+
+        def _report(label, timings):
+            timings_ms = sorted(t * 1000 for t in timings[1:])  # the first run warms the caches
+            p95 = timings_ms[min(len(timings_ms) - 1, int(round(0.95 * (len(timings_ms) - 1))))]
+            self.stdout.write(f" -> {label}: CPU p50 {statistics.median(timings_ms):.2f} ms, p95 {p95:.2f} ms")
+            return statistics.median(timings_ms)
+
+        self.stdout.write(f"{runs} Feed requests, page size {options['page_size']}")
+        full = _report("full query text", baseline)
+        cached = _report("persisted hash", persisted)
+        self.stdout.write(f" -> {full / cached:.1f}x less CPU per request")
+        self.stdout.write(self.style.SUCCESS("Persisted query benchmark complete."))
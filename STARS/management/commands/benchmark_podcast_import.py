@@ -0,0 +1,110 @@
+import time
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from STARS import models
+from STARS.signals import invalidate_podcast_cache
+from STARS.services.podcast_import import bulk_import_podcasts, podcast_genre_names
+
+BENCHMARK_ID_PREFIX = "bench-"
+BENCHMARK_GENRES = [
+    "Arts", "Comedy", "Education", "Kids & Family", "TV & Film", "Music", "News", "Science",
+    "Sports", "Technology", "Business", "Health", "History", "True Crime", "Fiction",
+]
+
+
+def synthetic_itunes_items(count: int, offset: int = 0):
+    """iTunes-shaped podcast payloads with 2-4 genres each (plus the generic label)."""
+    for i in range(offset, offset + count):
+        genres = [BENCHMARK_GENRES[(i + k) % len(BENCHMARK_GENRES)] for k in range(2 + i % 3)]
+        yield {
+            "collectionId": f"{BENCHMARK_ID_PREFIX}{i}",
+            "collectionName": f"Benchmark Podcast {i}",
+            "artistName": f"Benchmark Host {i % 500}",
+            "collectionViewUrl": f"https://podcasts.example.com/podcast/{i}",
+            "artworkUrl600": f"https://artwork.example.com/{i}/600x600bb.jpg",
+            "genres": genres + ["Podcasts"],
+        }
+
+
+@contextmanager
+def podcast_cache_signal_muted(signal):
+    """
+    Benchmark rows are never cached, and one cache invalidation per row would
+    dominate the timings, so the podcast cache receiver is detached meanwhile.
+    """
+    signal.disconnect(invalidate_podcast_cache, sender=models.Podcast)
+    try:
+        yield
+    finally:
+        signal.connect(invalidate_podcast_cache, sender=models.Podcast)
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the bulk podcast import engine against a synthetic iTunes payload'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=10000, help='Number of synthetic podcasts')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--compare', action='store_true',
+                            help='Also time the old row-by-row path on a smaller sample')
+        parser.add_argument('--keep', action='store_true', help="Don't delete the benchmark rows afterwards")
+
+    def _row_by_row(self, items):
+        """The previous import loop: exists() + create() + get_or_create() per row."""
+        rows = 0
+        with podcast_cache_signal_muted(post_save), transaction.atomic():
+            for item in items:
+                collection_id = str(item["collectionId"])
+                if models.Podcast.objects.filter(apple_podcasts_id=collection_id).exists():
+                    continue
+                podcast = models.Podcast.objects.create(
+                    apple_podcasts_id=collection_id,
+                    title=item["collectionName"],
+                    host=item["artistName"],
+                    apple_podcasts=item["collectionViewUrl"],
+                )
+                rows += 1
+                for position, name in enumerate(podcast_genre_names(item), start=1):
+                    genre, _ = models.PodcastGenre.objects.get_or_create(title=name)
+                    models.PodcastGenresOrdered.objects.create(podcast=podcast, genre=genre, position=position)
+                    rows += 1
+        return rows
+
+    def _cleanup(self):
+        with podcast_cache_signal_muted(post_delete):
+            deleted, _ = models.Podcast.objects.filter(apple_podcasts_id__startswith=BENCHMARK_ID_PREFIX).delete()
+        return deleted
+
+    def handle(self, *args, **options):
+        count = options['count']
+        self._cleanup()
+
+        self.stdout.write(f"Bulk importing {count} synthetic podcasts...")
+        result = bulk_import_podcasts(synthetic_itunes_items(count), chunk_size=options['chunk_size'])
+        self.stdout.write(
+            f" -> {result.created} podcasts + {result.genre_links} genre links in {result.elapsed:.2f}s "
+            f"({result.rows_per_second:.0f} rows/s)"
+        )
+
+        # Running it again should only cost the existence check
+        rerun = bulk_import_podcasts(synthetic_itunes_items(count), chunk_size=options['chunk_size'])
+        self.stdout.write(f" -> re-run skipped {rerun.skipped} existing podcasts in {rerun.elapsed:.2f}s")
+
+        if options['compare']:
+            sample = min(count, 1000)
+            start = time.perf_counter()
+            rows = self._row_by_row(synthetic_itunes_items(sample, offset=count))
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f" -> row-by-row: {rows} rows for {sample} podcasts in {elapsed:.2f}s "
+                f"({rows / elapsed if elapsed else 0:.0f} rows/s)"
+            )
+
+        if not options['keep']:
+            self.stdout.write(f"Cleaned up {self._cleanup()} benchmark rows.")
+
+        self.stdout.write(self.style.SUCCESS("Podcast import benchmark complete."))
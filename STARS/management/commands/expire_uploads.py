@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from STARS.services.media_uploads import expire_stale_uploads
+
+
+class Command(BaseCommand):
+    help = 'Fails upload sessions abandoned for UPLOAD_PENDING_TTL and deletes their leftover spool files'
+
+    def handle(self, *args, **options):
+        expired, removed = expire_stale_uploads()
+        self.stdout.write(self.style.SUCCESS(f"Expired {expired} uploads, removed {removed} spool files."))
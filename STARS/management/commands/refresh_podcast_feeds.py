@@ -0,0 +1,40 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from STARS.services.http import close_clients
+from STARS.services.podcast_feeds import FEED_CONCURRENCY, refresh_podcast_descriptions
+from STARS.utils.cache import CacheKeys, invalidate_pattern
+
+
+class Command(BaseCommand):
+    help = 'Refreshes podcast descriptions from their RSS feeds (conditional, streaming GETs)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=FEED_CONCURRENCY, help='Feeds fetched at once')
+        parser.add_argument('--missing-only', action='store_true', help='Only podcasts without a description')
+
+    def handle(self, *args, **options):
+        self.stdout.write("Starting podcast feed refresh...")
+
+        def _progress(stats):
+            self.stdout.write(f" -> {stats.summary()}")
+
+        async def _run():
+            try:
+                stats = await refresh_podcast_descriptions(
+                    only_missing=options['missing_only'],
+                    concurrency=options['concurrency'],
+                    on_progress=_progress,
+                )
+                if stats.updated:
+                    try:
+                        await invalidate_pattern(f"{CacheKeys.PODCAST_SEARCH}*")
+                    except Exception as e:
+                        self.stderr.write(f"Could not invalidate the podcast search cache: {e}")
+                return stats
+            finally:
+                await close_clients()
+
+        stats = asyncio.run(_run())
+        self.stdout.write(self.style.SUCCESS(f"Podcast feed refresh complete: {stats.summary()}"))
@@ -0,0 +1,55 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from graphql import GraphQLError, parse, validate
+
+from STARS.graphql.persisted_queries import documents, query_hash, store_query
+from STARS.graphql.schema import schema
+
+
+class Command(BaseCommand):
+    help = 'Adds client operations to the persisted query allowlist'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='+',
+            help='.graphql files, directories of them, or a JSON manifest ({hash: query} or a list of queries)',
+        )
+
+    def _queries(self, path: Path):
+        if path.is_dir():
+            for file in sorted(path.rglob('*.graphql')):
+                yield str(file), file.read_text()
+        elif path.suffix == '.json':
+            manifest = json.loads(path.read_text())
+            if isinstance(manifest, dict):
+                for sha256, query in manifest.items():
+                    if query_hash(query) != sha256:
+                        raise CommandError(f"{path}: hash {sha256} does not match its query")
+                    yield f"{path}:{sha256[:12]}", query
+            else:
+                for i, query in enumerate(manifest):
+                    yield f"{path}[{i}]", query
+        elif path.exists():
+            yield str(path), path.read_text()
+        else:
+            raise CommandError(f"{path} does not exist")
+
+    def handle(self, *args, **options):
+        registered = 0
+        for raw_path in options['paths']:
+            for name, query in self._queries(Path(raw_path)):
+                try:
+                    errors = validate(schema._schema, parse(query))
+                except GraphQLError as e:
+                    errors = [e]
+                if errors:
+                    raise CommandError(f"{name} is not valid against the schema: {errors[0].message}")
+                sha256 = store_query(query, allowed=True)
+                self.stdout.write(f" -> {sha256}  {name}")
+                registered += 1
+
+        # Entries cached in this process may predate the allowlist
+        documents.clear()
+        self.stdout.write(self.style.SUCCESS(f"Registered {registered} persisted queries."))
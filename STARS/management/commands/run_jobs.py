@@ -0,0 +1,35 @@
+import asyncio
+import signal
+
+from django.core.management.base import BaseCommand
+
+# Job handlers register themselves when the mutations module is imported
+import STARS.graphql.mutations  # noqa: F401
+from STARS.services.http import close_clients
+from STARS.services.jobs import HANDLERS, JobWorker
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs (slow imports, project and video creation, feed refreshes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='Jobs run at once by this worker')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between queue polls when idle')
+        parser.add_argument('--drain', action='store_true', help='Exit once no job is due instead of waiting for more')
+
+    def handle(self, *args, **options):
+        worker = JobWorker(concurrency=options['concurrency'], poll_interval=options['poll_interval'])
+        self.stdout.write(f"Job worker {worker.worker_id} started, handling: {', '.join(sorted(HANDLERS))}")
+
+        async def _run():
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                # Stop claiming new jobs and let the running ones finish
+                loop.add_signal_handler(sig, worker.stop)
+            try:
+                await worker.run(drain=options['drain'])
+            finally:
+                await close_clients()
+
+        asyncio.run(_run())
+        self.stdout.write(self.style.SUCCESS("Job worker stopped."))
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:16
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def backfill_participants_key(apps, schema_editor):
+    Conversation = apps.get_model('STARS', 'Conversation')
+    Through = Conversation.participants.through
+
+    participants = {}
+    for conversation_id, user_id in Through.objects.values_list('conversation_id', 'user_id').iterator():
+        participants.setdefault(conversation_id, set()).add(user_id)
+
+    seen_keys = set()
+    batch = []
+    # Oldest conversation wins if duplicates already exist; the others keep a NULL key
+    for conversation in Conversation.objects.order_by('pk').only('pk').iterator():
+        user_ids = participants.get(conversation.pk)
+        if not user_ids:
+            continue
+        canonical = ",".join(str(pk) for pk in sorted(user_ids))
+        key = hashlib.sha256(canonical.encode()).hexdigest()
+        if key in seen_keys:
+            continue
+        seen_keys.add(key)
+        conversation.participants_key = key
+        batch.append(conversation)
+
+    Conversation.objects.bulk_update(batch, ['participants_key'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('STARS', '0068_event_picture_is_confirmed_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='participants_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_participants_key, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:20
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('STARS', '0069_conversation_participants_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('IMAGE', 'Image'), ('VIDEO', 'Video')], default='IMAGE', max_length=10)),
+                ('status', models.CharField(choices=[('PENDING', 'Receiving Chunks'), ('COMPLETE', 'Stored'), ('FAILED', 'Failed')], db_index=True, default='PENDING', max_length=10)),
+                ('total_size', models.BigIntegerField()),
+                ('received_size', models.BigIntegerField(default=0)),
+                ('sha256', models.CharField(blank=True, db_index=True, max_length=64)),
+                ('spool_path', models.CharField(blank=True, max_length=500)),
+                ('url', models.URLField(blank=True, max_length=500, null=True)),
+                ('primary_color', models.CharField(blank=True, max_length=7)),
+                ('secondary_color', models.CharField(blank=True, max_length=7)),
+                ('date_created', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='media_uploads', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('STARS', '0070_mediaupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_url', models.URLField(blank=True, max_length=1000, null=True, unique=True)),
+                ('content_hash', models.CharField(db_index=True, max_length=64)),
+                ('url', models.URLField(max_length=500)),
+                ('primary_color', models.CharField(blank=True, max_length=7, null=True)),
+                ('secondary_color', models.CharField(blank=True, max_length=7, null=True)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='cover',
+            name='image',
+            field=models.URLField(db_index=True, max_length=500),
+        ),
+    ]
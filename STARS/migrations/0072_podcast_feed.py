@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('STARS', '0071_storedimage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='podcast',
+            name='feed_checked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='podcast',
+            name='feed_etag',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='podcast',
+            name='feed_last_modified',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='podcast',
+            name='feed_url',
+            field=models.URLField(blank=True, max_length=1000, null=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('STARS', '0073_job'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['review', 'date_created', 'id'], name='comment_review_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['latest_message_time', 'id'], name='conversation_latest_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'time', 'id'], name='message_conv_time_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['date_created', 'id'], name='review_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchhistory',
+            index=models.Index(fields=['user', 'timestamp', 'id'], name='search_user_time_id_idx'),
+        ),
+    ]
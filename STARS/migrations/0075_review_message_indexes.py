@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:05
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY keeps the tables writable, and cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('STARS', '0074_keyset_indexes'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='review',
+            index=models.Index(fields=['user', 'content_type', 'object_id', '-date_created'], name='review_user_object_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='review',
+            index=models.Index(fields=['content_type', 'object_id', '-date_created'], name='review_object_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='review',
+            index=models.Index(condition=models.Q(('is_latest', True)), fields=['content_type', 'object_id', '-date_created'], name='review_object_latest_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='message',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['conversation', 'sender'], name='message_unread_idx'),
+        ),
+    ]
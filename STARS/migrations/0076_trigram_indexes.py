@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:05
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # gin_trgm_ops comes from pg_trgm (0046_enable_trigram)
+    atomic = False
+
+    dependencies = [
+        ('STARS', '0075_review_message_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='artist',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='artist_name_trgm_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='event',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='event_name_trgm_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='musicvideo',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('title'), name='gin_trgm_ops'), name='musicvideo_title_trgm_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='performancevideo',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('title'), name='gin_trgm_ops'), name='perfvideo_title_trgm_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='podcast',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('title'), name='gin_trgm_ops'), name='podcast_title_trgm_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='project',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('title'), name='gin_trgm_ops'), name='project_title_trgm_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='song',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('title'), name='gin_trgm_ops'), name='song_title_trgm_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:41
+
+import django.utils.timezone
+from django.db import migrations
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_latest_message_time(apps, schema_editor):
+    Conversation = apps.get_model('STARS', 'Conversation')
+    Message = apps.get_model('STARS', 'Message')
+
+    # Conversations have no creation time: use their first message, or now when they have none
+    first_message = Message.objects.filter(conversation=OuterRef('pk')).order_by('time').values('time')[:1]
+    Conversation.objects.filter(latest_message_time__isnull=True).update(
+        latest_message_time=Coalesce(Subquery(first_message), Value(django.utils.timezone.now()))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('STARS', '0076_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_latest_message_time, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:41
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # A separate migration from the backfill: PostgreSQL refuses to ALTER a
+    # table with pending trigger events from an UPDATE in the same transaction
+    dependencies = [
+        ('STARS', '0077_backfill_conversation_latest_message_time'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='conversation',
+            name='latest_message_time',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
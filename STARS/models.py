@@ -1,10 +1,17 @@
 # STARS/models.py
+import hashlib
+import uuid
+
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
-from django.db.models import JSONField
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db.models import JSONField, Q
+from django.db.models.functions import Upper
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 
 
 class Artist(models.Model):
@@ -41,6 +48,12 @@ class Artist(models.Model):
     primary_color = models.CharField(max_length=7, blank=True)  # e.g., "#FF5733"
     secondary_color = models.CharField(max_length=7, blank=True)  # e.g., "#33A1FF"
 
+    class Meta:
+        indexes = [
+            # Case-insensitive filters (icontains, istartswith) compare UPPER(name); see migration 0076
+            GinIndex(OpClass(Upper("name"), name="gin_trgm_ops"), name="artist_name_trgm_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -117,6 +130,11 @@ class Event(models.Model):
     primary_color = models.CharField(max_length=7, blank=True)  # e.g., "#FF5733"
     secondary_color = models.CharField(max_length=7, blank=True)  # e.g., "#33A1FF"
 
+    class Meta:
+        indexes = [
+            GinIndex(OpClass(Upper("name"), name="gin_trgm_ops"), name="event_name_trgm_idx"),
+        ]
+
     def clean(self):
         if not self.name:
             raise ValidationError({'name': 'Events must have a name.'})
@@ -144,6 +162,12 @@ class Comment (models.Model):
     liked_by = models.ManyToManyField(User, blank=True, related_name='liked_comments')
     disliked_by = models.ManyToManyField(User, blank=True, related_name='disliked_comments')
 
+    class Meta:
+        indexes = [
+            # A review's comments, paged by date (keyset, see STARS/graphql/pagination.py)
+            models.Index(fields=["review", "date_created", "id"], name="comment_review_created_id_idx"),
+        ]
+
     def __str__(self):
         return f"Comment from {self.user.username} saying {self.text}"
 
@@ -198,6 +222,18 @@ class Review(models.Model):
 
     class Meta:
         ordering = ['-date_created']
+        indexes = [
+            # Keyset pagination: ordering plus its pk tie-breaker (STARS/graphql/pagination.py)
+            models.Index(fields=["date_created", "id"], name="review_created_id_idx"),
+            # A user's reviews of one object: the current one, re-reviews, the first review date
+            models.Index(fields=["user", "content_type", "object_id", "-date_created"], name="review_user_object_idx"),
+            # An object's reviews, newest first, and their count
+            models.Index(fields=["content_type", "object_id", "-date_created"], name="review_object_created_idx"),
+            models.Index(
+                fields=["content_type", "object_id", "-date_created"], condition=Q(is_latest=True),
+                name="review_object_latest_idx",
+            ),
+        ]
 
     def clean(self):
         super().clean()
@@ -274,7 +310,8 @@ class SubReview(models.Model):
 
 
 class Cover(models.Model):
-    image = models.URLField(max_length=500, unique=True)
+    # Not unique: identical artwork is stored once and shared (see StoredImage)
+    image = models.URLField(max_length=500, db_index=True)
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField()
     content_object = GenericForeignKey('content_type', 'object_id')
@@ -340,6 +377,11 @@ class MusicVideo(models.Model):
     primary_color = models.CharField(max_length=7, blank=True)  # e.g., "#FF5733"
     secondary_color = models.CharField(max_length=7, blank=True)  # e.g., "#33A1FF"
 
+    class Meta:
+        indexes = [
+            GinIndex(OpClass(Upper("title"), name="gin_trgm_ops"), name="musicvideo_title_trgm_idx"),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -378,6 +420,11 @@ class PerformanceVideo(models.Model):
     primary_color = models.CharField(max_length=7, blank=True)  # e.g., "#FF5733"
     secondary_color = models.CharField(max_length=7, blank=True)  # e.g., "#33A1FF"
 
+    class Meta:
+        indexes = [
+            GinIndex(OpClass(Upper("title"), name="gin_trgm_ops"), name="perfvideo_title_trgm_idx"),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -417,6 +464,11 @@ class Song(models.Model):
     is_featured = models.BooleanField(default=False, db_index=True)
     featured_message = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            GinIndex(OpClass(Upper("title"), name="gin_trgm_ops"), name="song_title_trgm_idx"),
+        ]
+
     def __str__(self):
         release_info = self.release_date if self.is_out else "Unreleased"
         return f"{self.title} - {release_info}"
@@ -481,6 +533,11 @@ class Project(models.Model):
     is_featured = models.BooleanField(default=False, db_index=True)
     featured_message = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            GinIndex(OpClass(Upper("title"), name="gin_trgm_ops"), name="project_title_trgm_idx"),
+        ]
+
     def __str__(self):
         return f"{self.title} - {self.release_date}"
 
@@ -527,6 +584,11 @@ class Podcast(models.Model):
     website = models.URLField(max_length=500, blank=True, null=True)
     spotify = models.URLField(max_length=500, blank=True, null=True)
     apple_podcasts = models.URLField(max_length=500, blank=True, null=True)
+    # RSS feed, with the validators of its last fetch for conditional GETs
+    feed_url = models.URLField(max_length=1000, blank=True, null=True)
+    feed_etag = models.CharField(max_length=255, blank=True, default="")
+    feed_last_modified = models.CharField(max_length=64, blank=True, default="")
+    feed_checked_at = models.DateTimeField(blank=True, null=True)
     youtube = models.URLField(max_length=500, blank=True, null=True)
     youtube_music = models.URLField(max_length=500, blank=True, null=True)
     reviews_count = models.IntegerField(default=0)
@@ -549,6 +611,11 @@ class Podcast(models.Model):
     is_featured = models.BooleanField(default=False, db_index=True)
     featured_message = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            GinIndex(OpClass(Upper("title"), name="gin_trgm_ops"), name="podcast_title_trgm_idx"),
+        ]
+
     def __str__(self):
         return f"{self.title} - {self.host}"
 
@@ -596,14 +663,27 @@ class Conversation(models.Model):
     participants = models.ManyToManyField(User, related_name='conversations')
     latest_message = models.ForeignKey('Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
     latest_message_text = models.TextField(blank=True)
-    latest_message_time = models.DateTimeField(null=True, blank=True)
+    # Creation time until the first message, so the inbox ordering has no NULLs and pages can seek
+    latest_message_time = models.DateTimeField(default=timezone.now)
     latest_message_sender = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='latest_sent_conversations')
     seen_by = models.ManyToManyField(User, blank=True, related_name='seen_conversations')
 
     color = models.CharField(max_length=7, blank=True)  # e.g., "#FF5733"
 
+    # Canonical hash of the sorted participant IDs, kept in sync by a m2m_changed
+    # signal so an exact-participant lookup is a single unique-index probe.
+    participants_key = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+
     class Meta:
         ordering = ['-latest_message_time']
+        indexes = [
+            models.Index(fields=["latest_message_time", "id"], name="conversation_latest_id_idx"),
+        ]
+
+    @staticmethod
+    def build_participants_key(user_ids) -> str:
+        canonical = ",".join(str(pk) for pk in sorted({int(pk) for pk in user_ids}))
+        return hashlib.sha256(canonical.encode()).hexdigest()
 
     def __str__(self):
         users = ', '.join(user.username for user in self.participants.all())
@@ -637,11 +717,111 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['time']
+        indexes = [
+            # A conversation's messages in keyset order
+            models.Index(fields=["conversation", "time", "id"], name="message_conv_time_id_idx"),
+            # Unread messages of a conversation from the other participants
+            models.Index(fields=["conversation", "sender"], condition=Q(is_read=False), name="message_unread_idx"),
+        ]
 
     def __str__(self):
         return f"Message #{self.pk} from {self.sender.username} at {self.time}"
 
 
+class MediaUpload(models.Model):
+    class MediaKind(models.TextChoices):
+        IMAGE = "IMAGE", "Image"
+        VIDEO = "VIDEO", "Video"
+
+    class UploadStatus(models.TextChoices):
+        PENDING = "PENDING", "Receiving Chunks"
+        COMPLETE = "COMPLETE", "Stored"
+        FAILED = "FAILED", "Failed"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='media_uploads')
+    kind = models.CharField(max_length=10, choices=MediaKind.choices, default=MediaKind.IMAGE)
+    status = models.CharField(max_length=10, choices=UploadStatus.choices, default=UploadStatus.PENDING, db_index=True)
+
+    total_size = models.BigIntegerField()
+    received_size = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+
+    # Local spool file while chunks are still arriving
+    spool_path = models.CharField(max_length=500, blank=True)
+
+    url = models.URLField(max_length=500, blank=True, null=True)
+    primary_color = models.CharField(max_length=7, blank=True)  # e.g., "#FF5733"
+    secondary_color = models.CharField(max_length=7, blank=True)  # e.g., "#33A1FF"
+
+    date_created = models.DateTimeField(auto_now_add=True, db_index=True)
+    date_updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} upload {self.pk} by {self.user.username} - {self.get_status_display()}"
+
+
+class StoredImage(models.Model):
+    """
+    Index of images we already host, keyed by where they came from and by
+    what they contain, so re-imports skip the download and/or the upload.
+    """
+    source_url = models.URLField(max_length=1000, unique=True, null=True, blank=True)
+    content_hash = models.CharField(max_length=64, db_index=True)
+    url = models.URLField(max_length=500)
+    primary_color = models.CharField(max_length=7, blank=True, null=True)
+    secondary_color = models.CharField(max_length=7, blank=True, null=True)
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} - {self.url}"
+
+
+class Job(models.Model):
+    """
+    A unit of slow work (imports, image ingestion, feed refreshes) run by the
+    `run_jobs` worker instead of inside a GraphQL request. See services/jobs.py.
+    """
+    class JobStatus(models.TextChoices):
+        QUEUED = "QUEUED", "Queued"
+        RUNNING = "RUNNING", "Running"
+        SUCCEEDED = "SUCCEEDED", "Succeeded"
+        FAILED = "FAILED", "Failed"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=100, db_index=True)
+    payload = JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='jobs', blank=True, null=True)
+    # Enqueueing twice with the same key returns the first job
+    idempotency_key = models.CharField(max_length=255, unique=True, blank=True, null=True)
+
+    status = models.CharField(max_length=10, choices=JobStatus.choices, default=JobStatus.QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now)
+
+    locked_by = models.CharField(max_length=255, blank=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+
+    progress = models.FloatField(default=0)
+    progress_message = models.CharField(max_length=500, blank=True)
+    result = JSONField(blank=True, null=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+
+    date_created = models.DateTimeField(auto_now_add=True, db_index=True)
+    date_started = models.DateTimeField(blank=True, null=True)
+    date_finished = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # The worker's claim query: next due queued jobs
+            models.Index(fields=["status", "run_at"], name="job_status_run_at_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} job {self.pk} - {self.get_status_display()}"
+
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     has_premium = models.BooleanField(default=False)
@@ -787,6 +967,11 @@ class SearchHistory(models.Model):
     )
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "timestamp", "id"], name="search_user_time_id_idx"),
+        ]
+
     def __str__(self):
         return f"{self.user.username} searched '{self.query}' in {self.category}"
 
@@ -1,8 +1,17 @@
-import httpx
-from typing import Dict, Any, List
+import asyncio
+from decouple import config
+from typing import Dict, Any, List, Optional
 from .apple_music_token import get_apple_music_token
+from .http import get_client
+from .response_cache import cached_get
+from .upstream_guard import UpstreamUnavailable
 
-APPLE_MUSIC_API_URL = "https://api.music.apple.com/v1"
+# Overridable so benchmarks can point the service at a local fake server
+APPLE_MUSIC_API_ROOT = config('APPLE_MUSIC_API_ROOT', default="https://api.music.apple.com")
+
+# Most catalog endpoints accept at most 25 ids per request
+CATALOG_IDS_BATCH_SIZE = 25
+MAX_CONCURRENT_BATCHES = 4
 
 # We default to "ca" (Canada) because the US storefront often returns
 # censored metadata (e.g. "S********") even for explicit tracks.
@@ -10,8 +19,14 @@ DEFAULT_COUNTRY = "ca"
 
 
 class AppleMusicService:
-    def __init__(self):
-        self.client = httpx.AsyncClient()
+    def __init__(self, api_root: Optional[str] = None):
+        self.api_root = api_root or APPLE_MUSIC_API_ROOT
+        self.api_url = f"{self.api_root}/v1"
+
+    @property
+    def client(self):
+        # Shared, pooled client for the current event loop
+        return get_client("apple_music")
 
     async def get_albums_by_ids(self, album_ids: List[str], country: str = DEFAULT_COUNTRY) -> List[Dict[str, Any]]:
         """
@@ -23,11 +38,11 @@ class AppleMusicService:
 
         # Join IDs with comma
         ids_str = ",".join(album_ids)
-        url = f"{APPLE_MUSIC_API_URL}/catalog/{country}/albums"
+        url = f"{self.api_url}/catalog/{country}/albums"
         params = {"ids": ids_str, "include": "other-versions"}
         headers = {"Authorization": f"Bearer {get_apple_music_token()}"}
 
-        response = await self.client.get(url, headers=headers, params=params)
+        response = await cached_get(self.client, "apple_music.albums", url, headers=headers, params=params)
 
         if response.status_code != 200:
             return []
@@ -83,11 +98,16 @@ class AppleMusicService:
 
     async def search_albums(self, term: str, limit: int = 20, country: str = DEFAULT_COUNTRY) -> List[Dict[str, Any]]:
         # 1. Search (gets IDs)
-        url = f"{APPLE_MUSIC_API_URL}/catalog/{country}/search"
+        url = f"{self.api_url}/catalog/{country}/search"
         params = {"term": term, "types": "albums", "limit": limit}
         headers = {"Authorization": f"Bearer {get_apple_music_token()}"}
 
-        response = await self.client.get(url, headers=headers, params=params)
+        try:
+            response = await cached_get(self.client, "apple_music.search", url, headers=headers, params=params)
+        except UpstreamUnavailable as e:
+            # Degrade to no results rather than failing the whole search
+            print(f"Apple Music album search skipped: {e}")
+            return []
         response.raise_for_status()
         search_data = response.json()
 
@@ -105,20 +125,24 @@ class AppleMusicService:
         return self._process_albums(detailed_albums)
 
     async def search_artists(self, term: str, limit: int = 20, country: str = DEFAULT_COUNTRY) -> List[Dict[str, Any]]:
-        url = f"{APPLE_MUSIC_API_URL}/catalog/{country}/search"
+        url = f"{self.api_url}/catalog/{country}/search"
         params = {"term": term, "types": "artists", "limit": limit}
         headers = {"Authorization": f"Bearer {get_apple_music_token()}"}
-        response = await self.client.get(url, headers=headers, params=params)
+        try:
+            response = await cached_get(self.client, "apple_music.search", url, headers=headers, params=params)
+        except UpstreamUnavailable as e:
+            print(f"Apple Music artist search skipped: {e}")
+            return []
         response.raise_for_status()
         data = response.json()
         return data.get("results", {}).get("artists", {}).get("data", [])
 
     async def get_album_with_songs(self, album_id: str, country: str = DEFAULT_COUNTRY) -> Dict[str, Any]:
-        url = f"{APPLE_MUSIC_API_URL}/catalog/{country}/albums/{album_id}"
+        url = f"{self.api_url}/catalog/{country}/albums/{album_id}"
         params = {"include": "other-versions"}
         headers = {"Authorization": f"Bearer {get_apple_music_token()}"}
 
-        response = await self.client.get(url, headers=headers, params=params)
+        response = await cached_get(self.client, "apple_music.albums", url, headers=headers, params=params)
         response.raise_for_status()
         data = response.json().get("data", [])
 
@@ -139,16 +163,54 @@ class AppleMusicService:
         return album
 
     async def get_artist(self, href: str) -> Dict[str, Any]:
-        url = f"https://api.music.apple.com{href}"
+        url = f"{self.api_root}{href}"
         headers = {"Authorization": f"Bearer {get_apple_music_token()}"}
-        response = await self.client.get(url, headers=headers)
+        response = await cached_get(self.client, "apple_music.artists", url, headers=headers)
         response.raise_for_status()
         return response.json()["data"][0]
 
+    async def _get_catalog_by_ids(
+            self, resource: str, ids: List[str], country: str, params: Optional[Dict[str, str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Bulk fetches catalog resources, CATALOG_IDS_BATCH_SIZE ids per request, at most
+        MAX_CONCURRENT_BATCHES requests in flight. A failed batch is skipped, like get_albums_by_ids.
+        """
+        unique_ids = list(dict.fromkeys(i for i in ids if i))
+        if not unique_ids:
+            return []
+
+        url = f"{self.api_url}/catalog/{country}/{resource}"
+        headers = {"Authorization": f"Bearer {get_apple_music_token()}"}
+        slots = asyncio.Semaphore(MAX_CONCURRENT_BATCHES)
+
+        async def _fetch_batch(batch: List[str]) -> List[Dict[str, Any]]:
+            async with slots:
+                response = await cached_get(
+                    self.client, f"apple_music.{resource}", url,
+                    headers=headers, params={**(params or {}), "ids": ",".join(batch)},
+                )
+            if response.status_code != 200:
+                return []
+            return response.json().get("data", [])
+
+        batches = await asyncio.gather(*(
+            _fetch_batch(unique_ids[i:i + CATALOG_IDS_BATCH_SIZE])
+            for i in range(0, len(unique_ids), CATALOG_IDS_BATCH_SIZE)
+        ))
+        return [item for batch in batches for item in batch]
+
+    async def get_artists_by_ids(self, artist_ids: List[str], country: str = DEFAULT_COUNTRY) -> List[Dict[str, Any]]:
+        return await self._get_catalog_by_ids("artists", artist_ids, country)
+
+    async def get_songs_by_ids(self, song_ids: List[str], country: str = DEFAULT_COUNTRY) -> List[Dict[str, Any]]:
+        """Bulk fetches songs with their artists included, so artist attributes come back inline."""
+        return await self._get_catalog_by_ids("songs", song_ids, country, params={"include": "artists"})
+
     async def get_artist_by_id(self, artist_id: str, country: str = DEFAULT_COUNTRY) -> Dict[str, Any]:
-        url = f"{APPLE_MUSIC_API_URL}/catalog/{country}/artists/{artist_id}"
+        url = f"{self.api_url}/catalog/{country}/artists/{artist_id}"
         headers = {"Authorization": f"Bearer {get_apple_music_token()}"}
-        response = await self.client.get(url, headers=headers)
+        response = await cached_get(self.client, "apple_music.artists", url, headers=headers)
         response.raise_for_status()
         data = response.json()
         return data.get("data", [])[0]
@@ -156,22 +218,23 @@ class AppleMusicService:
     async def get_song(self, href: str) -> Dict[str, Any]:
         if not href:
             return {}
-        url = f"https://api.music.apple.com{href}"
+        url = f"{self.api_root}{href}"
         headers = {"Authorization": f"Bearer {get_apple_music_token()}"}
-        response = await self.client.get(url, headers=headers)
+        response = await cached_get(self.client, "apple_music.songs", url, headers=headers)
         response.raise_for_status()
         data = response.json()
         return data.get("data", [])[0] if data.get("data") else {}
 
     async def get_artist_top_songs(self, artist_id: str, limit: int = 10, country: str = DEFAULT_COUNTRY) -> List[
         Dict[str, Any]]:
-        url = f"{APPLE_MUSIC_API_URL}/catalog/{country}/artists/{artist_id}/view/top-songs"
+        url = f"{self.api_url}/catalog/{country}/artists/{artist_id}/view/top-songs"
         params = {"limit": limit}
         headers = {"Authorization": f"Bearer {get_apple_music_token()}"}
-        response = await self.client.get(url, headers=headers, params=params)
+        try:
+            response = await cached_get(self.client, "apple_music.top_songs", url, headers=headers, params=params)
+        except UpstreamUnavailable as e:
+            print(f"Apple Music top songs skipped: {e}")
+            return []
         response.raise_for_status()
         data = response.json()
         return data.get("data", [])
-
-    async def close(self):
-        await self.client.aclose()
\ No newline at end of file
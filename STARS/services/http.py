@@ -0,0 +1,185 @@
+"""
+Shared outbound HTTP clients.
+
+Every service talks to its upstream through one long-lived httpx client per
+upstream, so connections (and their TLS sessions) are kept alive and reused
+across requests, with HTTP/2 where the server supports it. Each upstream has
+its own connection limits and timeouts.
+
+Async clients belong to the event loop they were created on, so they are
+kept per loop; the ASGI app closes them on lifespan shutdown (see
+HTTPClientLifespan) and management commands with close_clients().
+Sync code (thread pool work) shares thread-safe httpx.Client instances.
+
+Every request's latency (to response headers) and failures are recorded per
+upstream in STARS/services/metrics.py.
+"""
+import asyncio
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import httpx
+
+from .metrics import counter, histogram
+
+UPSTREAM_SECONDS = histogram(
+    "stars_upstream_request_duration_seconds", "Latency of outbound HTTP requests, to response headers", ["service"],
+)
+UPSTREAM_ERRORS = counter(
+    "stars_upstream_errors_total", "Outbound HTTP requests that failed or got a 429/5xx", ["service", "reason"],
+)
+
+
+@dataclass(frozen=True)
+class Upstream:
+    timeout: httpx.Timeout
+    limits: httpx.Limits = field(default_factory=lambda: httpx.Limits(max_connections=20, max_keepalive_connections=10))
+    http2: bool = True
+
+
+UPSTREAMS: Dict[str, Upstream] = {
+    "apple_music": Upstream(timeout=httpx.Timeout(10.0, connect=5.0)),
+    # Bulk genre fetches and RSS feeds can be slow
+    "itunes": Upstream(
+        timeout=httpx.Timeout(30.0, connect=5.0),
+        limits=httpx.Limits(max_connections=30, max_keepalive_connections=10),
+    ),
+    "youtube": Upstream(timeout=httpx.Timeout(10.0, connect=5.0)),
+    # Artwork and thumbnails come from many CDN hosts
+    "images": Upstream(
+        timeout=httpx.Timeout(20.0, connect=5.0),
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+    ),
+    # Podcast RSS feeds, hosted all over the place and sometimes slow
+    "feeds": Upstream(
+        timeout=httpx.Timeout(30.0, connect=10.0),
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=8),
+    ),
+    "default": Upstream(timeout=httpx.Timeout(10.0, connect=5.0)),
+}
+
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]" = \
+    weakref.WeakKeyDictionary()
+_sync_clients: Dict[str, httpx.Client] = {}
+_sync_lock = threading.Lock()
+
+
+def _record(upstream: str, started: float, response: Optional[httpx.Response] = None,
+            error: Optional[Exception] = None) -> None:
+    UPSTREAM_SECONDS.observe(time.perf_counter() - started, service=upstream)
+    if error is not None:
+        UPSTREAM_ERRORS.inc(service=upstream, reason=type(error).__name__)
+    elif response.status_code == 429 or response.status_code >= 500:
+        UPSTREAM_ERRORS.inc(service=upstream, reason=str(response.status_code))
+
+
+class _MeteredTransport(httpx.BaseTransport):
+    def __init__(self, upstream: str, transport: httpx.BaseTransport):
+        self.upstream = upstream
+        self.transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        try:
+            response = self.transport.handle_request(request)
+        except Exception as e:
+            _record(self.upstream, started, error=e)
+            raise
+        _record(self.upstream, started, response)
+        return response
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class _MeteredAsyncTransport(httpx.AsyncBaseTransport):
+    def __init__(self, upstream: str, transport: httpx.AsyncBaseTransport):
+        self.upstream = upstream
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except Exception as e:
+            _record(self.upstream, started, error=e)
+            raise
+        _record(self.upstream, started, response)
+        return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+def _client_options(upstream: str, asynchronous: bool) -> dict:
+    config = UPSTREAMS.get(upstream, UPSTREAMS["default"])
+    if asynchronous:
+        transport = _MeteredAsyncTransport(upstream, httpx.AsyncHTTPTransport(limits=config.limits, http2=config.http2))
+    else:
+        transport = _MeteredTransport(upstream, httpx.HTTPTransport(limits=config.limits, http2=config.http2))
+    return {
+        "timeout": config.timeout,
+        "transport": transport,
+        "follow_redirects": True,
+    }
+
+
+def get_client(upstream: str = "default") -> httpx.AsyncClient:
+    """Returns the shared async client for `upstream` on the running event loop."""
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    client = clients.get(upstream)
+    if client is None or client.is_closed:
+        client = clients[upstream] = httpx.AsyncClient(**_client_options(upstream, asynchronous=True))
+    return client
+
+
+def get_sync_client(upstream: str = "default") -> httpx.Client:
+    """Returns the shared blocking client for `upstream` (safe to use from any thread)."""
+    client = _sync_clients.get(upstream)
+    if client is None or client.is_closed:
+        with _sync_lock:
+            client = _sync_clients.get(upstream)
+            if client is None or client.is_closed:
+                client = _sync_clients[upstream] = httpx.Client(**_client_options(upstream, asynchronous=False))
+    return client
+
+
+async def close_clients() -> None:
+    """Closes the async clients of the running event loop."""
+    clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    await asyncio.gather(*(client.aclose() for client in clients.values()))
+
+
+def close_sync_clients() -> None:
+    with _sync_lock:
+        for client in _sync_clients.values():
+            client.close()
+        _sync_clients.clear()
+
+
+class HTTPClientLifespan:
+    """
+    ASGI wrapper answering lifespan events so the shared clients are closed
+    cleanly on shutdown. Every other scope goes straight to `app`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "lifespan":
+            return await self.app(scope, receive, send)
+
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await close_clients()
+                close_sync_clients()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
@@ -0,0 +1,199 @@
+"""
+Bounded-concurrency image ingestion for bulk imports.
+
+Downloads run on the shared "images" client behind a semaphore, with retries
+and exponential backoff for transient failures. Palette extraction and the
+storage upload run in worker threads behind their own (smaller) semaphore.
+Nothing here holds a DB transaction: each finished job is handed to an
+`on_result` callback that does its own short write.
+"""
+import asyncio
+import hashlib
+import os
+import random
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+import httpx
+from asgiref.sync import sync_to_async
+
+from STARS.services import images
+from STARS.services.http import get_client
+
+ImageResult = Tuple[Optional[str], Optional[str], Optional[str]]
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class RetryableDownloadError(Exception):
+    pass
+
+
+@dataclass
+class IngestionStats:
+    total: int = 0
+    completed: int = 0
+    failed: int = 0
+    # Answered from StoredImage without uploading anything
+    reused: int = 0
+    bytes_downloaded: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def rate(self) -> float:
+        """Finished images (including failures) per second."""
+        return (self.completed + self.failed) / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.completed + self.failed}/{self.total} images "
+            f"({self.failed} failed, {self.reused} reused, "
+            f"{self.bytes_downloaded / 1_000_000:.1f} MB) in {self.elapsed:.1f}s, {self.rate:.1f}/s"
+        )
+
+
+class ImageIngestionPool:
+    def __init__(
+            self,
+            concurrency: int = 16,
+            upload_concurrency: int = 4,
+            retries: int = 3,
+            backoff: float = 0.5,
+            progress_every: int = 100,
+            on_progress: Optional[Callable[[IngestionStats], None]] = None,
+    ):
+        self.client = get_client("images")
+        self.download_slots = asyncio.Semaphore(concurrency)
+        self.upload_slots = asyncio.Semaphore(upload_concurrency)
+        self.retries = retries
+        self.backoff = backoff
+        self.progress_every = progress_every
+        self.on_progress = on_progress or (lambda stats: print(f"Image ingestion: {stats.summary()}"))
+        self.stats = IngestionStats()
+        # Same URL / same bytes requested twice while the first is still running
+        self._inflight_urls: Dict[str, asyncio.Future] = {}
+        self._inflight_hashes: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    async def _coalesce(inflight: Dict[str, asyncio.Future], key: str, factory):
+        if key in inflight:
+            return await asyncio.shield(inflight[key]), True
+
+        future = asyncio.ensure_future(factory())
+        inflight[key] = future
+        try:
+            return await future, False
+        finally:
+            inflight.pop(key, None)
+
+    async def _download(self, url: str) -> Optional[Tuple[str, str]]:
+        """Streams `url` to a temp file. Returns (temp_path, sha256), or None for a permanent failure."""
+        for attempt in range(self.retries + 1):
+            temp_path = None
+            try:
+                async with self.download_slots:
+                    async with self.client.stream("GET", url) as response:
+                        if response.status_code in RETRY_STATUS_CODES:
+                            raise RetryableDownloadError(f"HTTP {response.status_code}")
+                        if response.status_code != 200:
+                            return None
+
+                        digest = hashlib.sha256()
+                        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as temp_file:
+                            temp_path = temp_file.name
+                            async for chunk in response.aiter_bytes(images.DOWNLOAD_CHUNK_SIZE):
+                                temp_file.write(chunk)
+                                digest.update(chunk)
+                                self.stats.bytes_downloaded += len(chunk)
+
+                return temp_path, digest.hexdigest()
+
+            except (httpx.TransportError, RetryableDownloadError):
+                if temp_path and os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                if attempt == self.retries:
+                    raise
+                # Exponential backoff with jitter so retries don't arrive in lockstep
+                await asyncio.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+
+        return None
+
+    async def ingest(self, image_url: str) -> ImageResult:
+        """Async counterpart of images.process_image_from_url."""
+        if not image_url:
+            return None, None, None
+
+        final_url = images.normalize_image_url(image_url)
+        result, shared = await self._coalesce(self._inflight_urls, final_url, lambda: self._ingest_url(final_url))
+        if shared and result[0]:
+            self.stats.reused += 1
+        return result
+
+    async def _ingest_url(self, final_url: str) -> ImageResult:
+        known = await sync_to_async(images.find_by_source)(final_url)
+        if known:
+            self.stats.reused += 1
+            return known.url, known.primary_color, known.secondary_color
+
+        downloaded = await self._download(final_url)
+        if not downloaded:
+            return None, None, None
+
+        temp_path, content_hash = downloaded
+        try:
+            result, shared = await self._coalesce(
+                self._inflight_hashes, content_hash, lambda: self._host(temp_path, content_hash)
+            )
+        finally:
+            os.unlink(temp_path)
+
+        if shared:
+            self.stats.reused += 1
+        await sync_to_async(images.record_stored_image)(content_hash, *result, source_url=final_url)
+        return result
+
+    async def _host(self, temp_path: str, content_hash: str) -> ImageResult:
+        existing = await sync_to_async(images.find_by_hash)(content_hash)
+        if existing:
+            self.stats.reused += 1
+            return existing.url, existing.primary_color, existing.secondary_color
+
+        async with self.upload_slots:
+            return await sync_to_async(images.host_image_file, thread_sensitive=False)(temp_path)
+
+    async def run(
+            self,
+            jobs: Iterable[Tuple[Hashable, str]],
+            on_result: Callable[[Hashable, ImageResult], Awaitable[None]],
+    ) -> IngestionStats:
+        """
+        Ingests every (key, image_url) job and awaits on_result(key, result) as each
+        one finishes, in completion order. A failed job is counted and skipped.
+        """
+        jobs = list(jobs)
+        self.stats = IngestionStats(total=len(jobs))
+
+        async def _one(key, image_url):
+            try:
+                result = await self.ingest(image_url)
+                if result[0]:
+                    await on_result(key, result)
+                    self.stats.completed += 1
+                else:
+                    self.stats.failed += 1
+            except Exception as e:
+                self.stats.failed += 1
+                print(f"Error ingesting image {image_url}: {e}")
+
+            finished = self.stats.completed + self.stats.failed
+            if finished % self.progress_every == 0 or finished == self.stats.total:
+                self.on_progress(self.stats)
+
+        await asyncio.gather(*(_one(key, url) for key, url in jobs))
+        return self.stats
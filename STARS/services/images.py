@@ -0,0 +1,117 @@
+"""
+Content-addressed ingestion for the remote images we re-host (artwork,
+artist pictures, video thumbnails).
+
+StoredImage remembers source URL -> hosted URL and the hash of the bytes:
+- a source URL we have seen before costs one DB lookup, no download;
+- new URL with bytes we already host costs a download but no upload;
+- otherwise the image is uploaded once, without asking Cloudinary for colors.
+Colours are always extracted locally (see utils.colors.extract_palette).
+"""
+import hashlib
+import os
+import tempfile
+from typing import Optional, Tuple
+
+from STARS import models
+from STARS.services.http import get_sync_client
+from STARS.services.storage import get_storage
+from STARS.utils.colors import extract_palette, muted_palette
+
+ARTWORK_SIZE = 1024
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def normalize_image_url(image_url: str) -> str:
+    # Apple Music URLs often come as '.../100x100bb.jpg' or with placeholders '{w}x{h}'
+    if "{w}" in image_url and "{h}" in image_url:
+        return image_url.replace("{w}", str(ARTWORK_SIZE)).replace("{h}", str(ARTWORK_SIZE))
+    return image_url
+
+
+def _as_result(stored: models.StoredImage) -> Tuple[str, Optional[str], Optional[str]]:
+    return stored.url, stored.primary_color, stored.secondary_color
+
+
+def download_image(image_url: str) -> Optional[Tuple[str, str]]:
+    """
+    Streams an image to a temp file, hashing it on the way.
+    Returns (temp_path, sha256) or None if the server did not answer 200.
+    """
+    with get_sync_client("images").stream("GET", image_url) as response:
+        if response.status_code != 200:
+            return None
+
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as temp_file:
+            for chunk in response.iter_bytes(DOWNLOAD_CHUNK_SIZE):
+                temp_file.write(chunk)
+                digest.update(chunk)
+
+    return temp_file.name, digest.hexdigest()
+
+
+def host_image_file(file_path: str) -> Tuple[str, Optional[str], Optional[str]]:
+    """Uploads a local image and extracts its muted colours. No DB access."""
+    primary, secondary = muted_palette(extract_palette(file_path))
+    url = get_storage().upload_sync(file_path, resource_type="image").url
+    return url, primary, secondary
+
+
+def find_by_hash(content_hash: str) -> Optional[models.StoredImage]:
+    return models.StoredImage.objects.filter(content_hash=content_hash).first()
+
+
+def find_by_source(source_url: str) -> Optional[models.StoredImage]:
+    return models.StoredImage.objects.filter(source_url=source_url).first()
+
+
+def record_stored_image(content_hash: str, url: str, primary: Optional[str], secondary: Optional[str],
+                        source_url: Optional[str] = None) -> models.StoredImage:
+    fields = {"content_hash": content_hash, "url": url, "primary_color": primary, "secondary_color": secondary}
+    if source_url is None:
+        return models.StoredImage.objects.create(**fields)
+
+    stored, _ = models.StoredImage.objects.get_or_create(source_url=source_url, defaults=fields)
+    return stored
+
+
+def store_image_file(file_path: str, content_hash: str, source_url: Optional[str] = None) -> models.StoredImage:
+    """Hosts a local image file unless identical bytes are already hosted."""
+    existing = find_by_hash(content_hash)
+    if existing and source_url is None:
+        return existing
+
+    url, primary, secondary = _as_result(existing) if existing else host_image_file(file_path)
+    return record_stored_image(content_hash, url, primary, secondary, source_url=source_url)
+
+
+def process_image_from_url(image_url: str):
+    """
+    Downloads image from a URL, hosts it and extracts muted colors, reusing
+    earlier results for the same URL or the same bytes.
+    Returns: (secure_url, primary_color, secondary_color)
+    """
+    if not image_url:
+        return None, None, None
+
+    final_url = normalize_image_url(image_url)
+
+    try:
+        known = find_by_source(final_url)
+        if known:
+            return _as_result(known)
+
+        downloaded = download_image(final_url)
+        if not downloaded:
+            return None, None, None
+
+        temp_path, content_hash = downloaded
+        try:
+            return _as_result(store_image_file(temp_path, content_hash, source_url=final_url))
+        finally:
+            os.unlink(temp_path)
+
+    except Exception as e:
+        print(f"Error processing image: {e}")
+        return None, None, None
@@ -1,15 +1,83 @@
-import httpx
 import asyncio
-from typing import List, Dict, Any
+from dataclasses import dataclass
+from typing import List, Dict, Any, Iterable, Optional
 import xml.etree.ElementTree as ET
+from .http import get_client
+from .response_cache import cached_get
 
 ITUNES_API_URL = "https://itunes.apple.com/search"
 ITUNES_LOOKUP_URL = "https://itunes.apple.com/lookup"
 
-class iTunesService:
+# The lookup endpoint takes a comma separated list of ids
+LOOKUP_BATCH_SIZE = 150
+
+ITUNES_NAMESPACE = "{http://www.itunes.com/dtds/podcast-1.0.dtd}"
+# Channel-level tags holding the podcast description, best first
+CHANNEL_SUMMARY_TAG = f"{ITUNES_NAMESPACE}summary"
+CHANNEL_DESCRIPTION_TAG = "description"
+
+# Give up on feeds that have not shown a channel description by then
+MAX_FEED_BYTES = 5 * 1024 * 1024
+
+
+@dataclass
+class FeedDescription:
+    description: str = ""
+    etag: str = ""
+    last_modified: str = ""
+    # The feed answered 304 to our validators; description is empty
+    not_modified: bool = False
+
+
+class ChannelDescriptionParser:
+    """
+    Incremental RSS parser that only looks at the <channel> element's own
+    children. It is done as soon as it sees <itunes:summary>, the first <item>
+    (channel metadata comes before the episodes) or the end of the channel.
+    """
+
     def __init__(self):
-        # 30s timeout because bulk fetching can be slow
-        self.client = httpx.AsyncClient(timeout=30.0)
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._depth = 0
+        self._channel_depth = None
+        self._found: Dict[str, str] = {}
+        self.done = False
+
+    def feed(self, chunk: bytes) -> bool:
+        self._parser.feed(chunk)
+        for event, elem in self._parser.read_events():
+            if event == "start":
+                self._depth += 1
+                if elem.tag == "channel" and self._channel_depth is None:
+                    self._channel_depth = self._depth
+                elif elem.tag == "item" and self._channel_depth is not None:
+                    self.done = True
+                continue
+
+            if self._channel_depth is not None and self._depth == self._channel_depth + 1:
+                text = (elem.text or "").strip()
+                if elem.tag in (CHANNEL_SUMMARY_TAG, CHANNEL_DESCRIPTION_TAG) and text:
+                    self._found.setdefault(elem.tag, text)
+                    if elem.tag == CHANNEL_SUMMARY_TAG:
+                        self.done = True
+            elif elem.tag == "channel":
+                self.done = True
+            self._depth -= 1
+
+            if self.done:
+                break
+        return self.done
+
+    @property
+    def description(self) -> str:
+        # Apple specific tag usually has the best description
+        return self._found.get(CHANNEL_SUMMARY_TAG) or self._found.get(CHANNEL_DESCRIPTION_TAG, "")
+
+class iTunesService:
+    @property
+    def client(self):
+        # Shared, pooled client (30s timeout because bulk fetching can be slow)
+        return get_client("itunes")
 
     async def search_podcasts(self, term: str, limit: int = 50) -> List[Dict[str, Any]]:
         """Standard search for user queries."""
@@ -20,7 +88,7 @@ class iTunesService:
             "limit": limit
         }
         try:
-            response = await self.client.get(ITUNES_API_URL, params=params)
+            response = await cached_get(self.client, "itunes.search", ITUNES_API_URL, params=params)
             response.raise_for_status()
             return response.json().get("results", [])
         except Exception as e:
@@ -37,51 +105,89 @@ class iTunesService:
             "limit": limit
         }
         try:
-            response = await self.client.get(ITUNES_API_URL, params=params)
+            # Bulk imports fetch every genre at once, so these may queue for a token
+            response = await cached_get(self.client, "itunes.genre_top", ITUNES_API_URL, params=params, max_wait=120)
             response.raise_for_status()
             return response.json().get("results", [])
         except Exception:
             return []
 
+    async def lookup_podcasts(self, apple_podcasts_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetches many podcasts' details, LOOKUP_BATCH_SIZE ids per call, keyed by collectionId."""
+        ids = list(dict.fromkeys(str(i) for i in apple_podcasts_ids if i))
+        podcasts: Dict[str, Dict[str, Any]] = {}
+        for start in range(0, len(ids), LOOKUP_BATCH_SIZE):
+            params = {"id": ",".join(ids[start:start + LOOKUP_BATCH_SIZE]), "entity": "podcast"}
+            try:
+                response = await cached_get(self.client, "itunes.lookup", ITUNES_LOOKUP_URL, params=params, max_wait=120)
+                response.raise_for_status()
+            except Exception as e:
+                print(f"Error looking up podcasts: {e}")
+                continue
+            for item in response.json().get("results", []):
+                if item.get("collectionId"):
+                    podcasts[str(item["collectionId"])] = item
+        return podcasts
+
     async def lookup_podcast(self, apple_podcasts_id: str) -> Dict[str, Any]:
         """Fetches a single podcast's details by ID."""
         params = {"id": apple_podcasts_id}
         try:
-            response = await self.client.get(ITUNES_LOOKUP_URL, params=params)
+            response = await cached_get(self.client, "itunes.lookup", ITUNES_LOOKUP_URL, params=params)
             response.raise_for_status()
             results = response.json().get("results", [])
             return results[0] if results else {}
         except Exception:
             return {}
 
-    async def fetch_description_from_rss(self, feed_url: str) -> str:
-        """Fetches the RSS feed and extracts the podcast description."""
+    async def fetch_feed_description(
+            self, feed_url: str, etag: str = "", last_modified: str = ""
+    ) -> Optional[FeedDescription]:
+        """
+        Streams the RSS feed and stops reading as soon as the channel description
+        is known, so only the head of (often huge) feeds is downloaded.
+        Sends If-None-Match / If-Modified-Since when validators are given.
+        Returns None if the feed could not be fetched or parsed.
+        """
         if not feed_url:
-            return ""
-        try:
-            response = await self.client.get(feed_url)
-            response.raise_for_status()
+            return None
 
-            root = ET.fromstring(response.text)
-            channel = root.find("channel")
-            if channel is None:
-                return ""
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
 
-            # Apple specific tag usually has the best description
-            namespaces = {'itunes': 'http://www.itunes.com/dtds/podcast-1.0.dtd'}
-            summary = channel.find("itunes:summary", namespaces)
-            if summary is not None and summary.text:
-                return summary.text.strip()
+        parser = ChannelDescriptionParser()
+        try:
+            async with get_client("feeds").stream("GET", feed_url, headers=headers) as response:
+                if response.status_code == 304:
+                    return FeedDescription(etag=etag, last_modified=last_modified, not_modified=True)
+                if response.status_code != 200:
+                    return None
 
-            # Fallback to standard RSS description
-            description = channel.find("description")
-            if description is not None and description.text:
-                return description.text.strip()
+                received = 0
+                async for chunk in response.aiter_bytes():
+                    received += len(chunk)
+                    if parser.feed(chunk) or received > MAX_FEED_BYTES:
+                        break
 
-            return ""
-        except Exception as e:
+                return FeedDescription(
+                    description=parser.description,
+                    etag=response.headers.get("etag", ""),
+                    last_modified=response.headers.get("last-modified", ""),
+                )
+        except ET.ParseError as e:
+            # Keep whatever was read before the broken markup
+            if parser.description:
+                return FeedDescription(description=parser.description)
             print(f"Error parsing RSS description: {e}")
-            return ""
+            return None
+        except Exception as e:
+            print(f"Error fetching RSS feed: {e}")
+            return None
 
-    async def close(self):
-        await self.client.aclose()
\ No newline at end of file
+    async def fetch_description_from_rss(self, feed_url: str) -> str:
+        """Fetches the RSS feed and extracts the podcast description."""
+        feed = await self.fetch_feed_description(feed_url)
+        return feed.description if feed else ""
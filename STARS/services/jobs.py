@@ -0,0 +1,317 @@
+"""
+Background jobs stored in the Job table and run by `manage.py run_jobs`.
+
+Slow mutations enqueue a job and return it right away; clients follow it with
+the `job` query or the `jobUpdates` subscription.
+
+- Handlers are async functions registered with @job_handler("kind"). They take
+  (JobContext, payload) and return a JSON-able result. Raising
+  PermanentJobError fails the job at once; any other exception retries it with
+  exponential backoff until max_attempts is reached.
+- Workers claim due jobs with SELECT ... FOR UPDATE SKIP LOCKED, so any number
+  of worker processes can share the table. A running job's lock is refreshed
+  every HEARTBEAT_INTERVAL; workers sweep for jobs not heard from in
+  STALE_AFTER (their worker died) every SWEEP_INTERVAL, putting them back in
+  the queue, or failing them when they have no attempts left.
+- Every state change and progress update is broadcast to the `job_<id>`
+  channel layer group.
+"""
+import asyncio
+import os
+import random
+import socket
+import time
+import traceback
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from STARS import models
+
+JobStatus = models.Job.JobStatus
+
+DEFAULT_MAX_ATTEMPTS = 3
+BACKOFF_BASE = 10  # seconds before the first retry, doubled for each further one
+BACKOFF_MAX = 600
+# A running job not heard from for this long is assumed lost with its worker
+STALE_AFTER = timedelta(minutes=30)
+# How often a worker refreshes the lock of each job it runs
+HEARTBEAT_INTERVAL = timedelta(minutes=1)
+# How often a worker looks for stale jobs
+SWEEP_INTERVAL = timedelta(minutes=5)
+
+HANDLERS: Dict[str, Callable[["JobContext", dict], Awaitable[Any]]] = {}
+
+
+class PermanentJobError(Exception):
+    """Raised by handlers for failures a retry cannot fix (bad input, missing rows)."""
+
+
+def job_handler(kind: str):
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def job_group_name(job_id) -> str:
+    return f"job_{job_id}"
+
+
+async def notify_job(job_id) -> None:
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        await channel_layer.group_send(job_group_name(job_id), {
+            "type": "job.update", "data": {"id": str(job_id)}, "sent_at": time.time(),
+        })
+    except Exception as e:
+        # Subscribers miss a live update; the job row is still right
+        print(f"Job {job_id}: could not broadcast update: {e}")
+
+
+def enqueue(kind: str, payload: Optional[dict] = None, user=None, idempotency_key: Optional[str] = None,
+            max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> models.Job:
+    """
+    Queues a job (sync; call through database_sync_to_async from resolvers).
+    With an idempotency_key, enqueueing again returns the existing job instead.
+    """
+    if kind not in HANDLERS:
+        raise Exception(f"Unknown job kind '{kind}'.")
+
+    if idempotency_key:
+        existing = models.Job.objects.filter(idempotency_key=idempotency_key).first()
+        if existing:
+            return existing
+
+    try:
+        with transaction.atomic():
+            return models.Job.objects.create(
+                kind=kind,
+                payload=payload or {},
+                user=user if user is not None and user.is_authenticated else None,
+                idempotency_key=idempotency_key or None,
+                max_attempts=max_attempts,
+            )
+    except IntegrityError:
+        # Lost a race with an identical request
+        return models.Job.objects.get(idempotency_key=idempotency_key)
+
+
+def claim_jobs(worker_id: str, limit: int) -> List[models.Job]:
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            models.Job.objects.select_for_update(skip_locked=True)
+            .filter(status=JobStatus.QUEUED, run_at__lte=now)
+            .order_by("run_at")[:limit]
+        )
+        if not jobs:
+            return []
+        models.Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=JobStatus.RUNNING,
+            locked_by=worker_id,
+            locked_at=now,
+            attempts=F("attempts") + 1,
+            date_started=now,
+        )
+    for job in jobs:
+        job.status, job.locked_by, job.locked_at, job.date_started = JobStatus.RUNNING, worker_id, now, now
+        job.attempts += 1
+    return jobs
+
+
+def requeue_stale_jobs() -> List:
+    """
+    Puts running jobs whose worker stopped heartbeating back in the queue, or
+    fails them when their last attempt was used up. Returns their ids.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        stale = list(
+            models.Job.objects.select_for_update(skip_locked=True)
+            .filter(status=JobStatus.RUNNING, locked_at__lt=now - STALE_AFTER)
+            .values_list("pk", "attempts", "max_attempts")
+        )
+        exhausted = [pk for pk, attempts, max_attempts in stale if attempts >= max_attempts]
+        retried = [pk for pk, attempts, max_attempts in stale if attempts < max_attempts]
+        if exhausted:
+            models.Job.objects.filter(pk__in=exhausted).update(
+                status=JobStatus.FAILED, error="Worker lost while running the last attempt.",
+                locked_by="", locked_at=None, date_finished=now,
+            )
+        if retried:
+            models.Job.objects.filter(pk__in=retried).update(
+                status=JobStatus.QUEUED, locked_by="", locked_at=None, run_at=now,
+            )
+    if stale:
+        print(f"Stale jobs: {len(retried)} requeued, {len(exhausted)} failed")
+    return exhausted + retried
+
+
+def retry_delay(attempts: int) -> float:
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1))
+    # Jitter so jobs that failed together do not retry in lockstep
+    return delay * random.uniform(0.8, 1.2)
+
+
+class JobContext:
+    def __init__(self, job: models.Job):
+        self.job = job
+        self._reported: Optional[Tuple[float, str]] = None
+        self._reporter: Optional[asyncio.Task] = None
+
+    @property
+    def user(self):
+        return self.job.user
+
+    async def progress(self, fraction: float, message: str = "") -> None:
+        """Records progress (0..1) and tells subscribers. Also keeps the job's lock fresh."""
+        fraction = max(0.0, min(1.0, fraction))
+        updated = await database_sync_to_async(_owned(self.job).update)(
+            progress=fraction, progress_message=message[:500], locked_at=timezone.now()
+        )
+        if not updated:
+            return
+        self.job.progress, self.job.progress_message = fraction, message[:500]
+        await notify_job(self.job.pk)
+
+    def report(self, fraction: float, message: str = "") -> None:
+        """
+        progress() for sync callbacks. Writes happen one at a time in the
+        background, skipping to the latest report; run_job waits for them
+        before it records the outcome.
+        """
+        self._reported = (fraction, message)
+        if self._reporter is None or self._reporter.done():
+            self._reporter = asyncio.ensure_future(self._write_reports())
+
+    async def _write_reports(self) -> None:
+        while self._reported is not None:
+            fraction, message = self._reported
+            self._reported = None
+            await self.progress(fraction, message)
+
+    async def flush(self) -> None:
+        if self._reporter is None:
+            return
+        try:
+            await self._reporter
+        except Exception as e:
+            print(f"Job {self.job.pk}: could not record progress: {e}")
+
+
+def _owned(job: models.Job):
+    # A job swept as stale may be running elsewhere by now; leave it alone then
+    return models.Job.objects.filter(pk=job.pk, status=JobStatus.RUNNING, locked_by=job.locked_by)
+
+
+async def _heartbeat(job: models.Job) -> None:
+    """Keeps the job's lock fresh while its handler runs, so it is not swept as stale."""
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL.total_seconds())
+        try:
+            await database_sync_to_async(_owned(job).update)(locked_at=timezone.now())
+        except Exception as e:
+            print(f"Job {job.pk}: heartbeat failed: {e}")
+
+
+async def run_job(job: models.Job) -> None:
+    handler = HANDLERS.get(job.kind)
+    updates: Dict[str, Any]
+    heartbeat = asyncio.create_task(_heartbeat(job))
+    ctx = JobContext(job)
+    try:
+        if handler is None:
+            raise PermanentJobError(f"No handler for job kind '{job.kind}'.")
+        # The user row is needed by most handlers; load it off the event loop
+        await database_sync_to_async(lambda: job.user)()
+        result = await handler(ctx, job.payload)
+        updates = {
+            "status": JobStatus.SUCCEEDED, "result": result, "error": "",
+            "progress": 1.0, "date_finished": timezone.now(),
+        }
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        if isinstance(e, PermanentJobError) or job.attempts >= job.max_attempts:
+            print(f"Job {job.pk} ({job.kind}) failed: {error}")
+            traceback.print_exc()
+            updates = {"status": JobStatus.FAILED, "error": error, "date_finished": timezone.now()}
+        else:
+            delay = retry_delay(job.attempts)
+            print(f"Job {job.pk} ({job.kind}) attempt {job.attempts} failed, retrying in {delay:.0f}s: {error}")
+            updates = {
+                "status": JobStatus.QUEUED, "error": error,
+                "run_at": timezone.now() + timedelta(seconds=delay),
+            }
+    finally:
+        heartbeat.cancel()
+        await ctx.flush()
+
+    updates.update(locked_by="", locked_at=None)
+    await database_sync_to_async(_owned(job).update)(**updates)
+    await notify_job(job.pk)
+
+
+class JobWorker:
+    def __init__(self, concurrency: int = 4, poll_interval: float = 1.0, worker_id: Optional[str] = None):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.running: set = set()
+        self.stopping = asyncio.Event()
+
+    def stop(self) -> None:
+        self.stopping.set()
+
+    async def run(self, drain: bool = False) -> None:
+        """
+        Runs jobs until stop() is called (then lets running jobs finish).
+        With drain=True, returns as soon as the queue has nothing due.
+        """
+        next_sweep = 0.0
+        while not self.stopping.is_set():
+            if time.monotonic() >= next_sweep:
+                for job_id in await database_sync_to_async(requeue_stale_jobs)():
+                    await notify_job(job_id)
+                next_sweep = time.monotonic() + SWEEP_INTERVAL.total_seconds()
+
+            free = self.concurrency - len(self.running)
+            jobs = await database_sync_to_async(claim_jobs)(self.worker_id, free) if free else []
+            for job in jobs:
+                task = asyncio.create_task(run_job(job))
+                self.running.add(task)
+                task.add_done_callback(self.running.discard)
+
+            if jobs:
+                for job in jobs:
+                    await notify_job(job.pk)
+                continue
+            if drain and not self.running:
+                break
+            # Wake up early when a job finishes and frees a slot
+            waiters = [asyncio.create_task(self.stopping.wait())] + list(self.running)
+            await asyncio.wait(waiters, timeout=self.poll_interval, return_when=asyncio.FIRST_COMPLETED)
+            waiters[0].cancel()
+
+        if self.running:
+            await asyncio.gather(*self.running, return_exceptions=True)
+
+
+async def get_job_for_user(job_id, user) -> Optional[models.Job]:
+    """The job if `user` enqueued it (staff see every job)."""
+    def _get():
+        jobs = models.Job.objects.filter(pk=job_id)
+        if not (user.is_staff or user.is_superuser):
+            jobs = jobs.filter(user=user)
+        return jobs.first()
+
+    if not user or not user.is_authenticated:
+        return None
+    return await database_sync_to_async(_get)()
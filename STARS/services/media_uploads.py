@@ -0,0 +1,326 @@
+"""
+Spooled, resumable media uploads.
+
+Clients either POST a multipart file or open an upload session and PUT the
+bytes in chunks. Bytes go straight to a spool file on disk and are hashed as
+they stream through, so memory per upload stays at one read buffer however
+large the file is. Once complete the file is handed to the storage backend
+and the mutations only reference the resulting MediaUpload by ID.
+
+Sessions left PENDING for UPLOAD_PENDING_TTL are failed and their spool
+files removed by `manage.py expire_uploads`.
+"""
+import base64
+import hashlib
+import os
+import time
+import uuid
+from datetime import timedelta
+from typing import Callable, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from STARS import models
+from STARS.services.storage import get_storage
+from STARS.utils.colors import muted_palette
+
+READ_BUFFER_SIZE = 64 * 1024
+
+# base64 decodes in groups of 4 characters, so slices must stay 4-aligned
+BASE64_SLICE_SIZE = 4 * 16 * 1024
+
+MEDIA_SUFFIXES = {
+    models.MediaUpload.MediaKind.IMAGE: ".png",
+    models.MediaUpload.MediaKind.VIDEO: ".mp4",
+}
+
+
+class UploadError(Exception):
+    pass
+
+
+# Suffix of a chunk received but not yet appended to its upload
+CHUNK_SUFFIX = ".part"
+
+
+def _new_spool_path(kind: str) -> str:
+    spool_dir = settings.UPLOAD_SPOOL_DIR
+    os.makedirs(spool_dir, exist_ok=True)
+    return os.path.join(spool_dir, f"{uuid.uuid4().hex}{MEDIA_SUFFIXES.get(kind, '')}")
+
+
+def _remove_spool(path: str) -> None:
+    if path and os.path.exists(path):
+        os.unlink(path)
+
+
+def _validate_kind(kind: str) -> str:
+    kind = (kind or models.MediaUpload.MediaKind.IMAGE).upper()
+    if kind not in models.MediaUpload.MediaKind.values:
+        raise UploadError(f"Unsupported media kind: {kind}")
+    return kind
+
+
+def _validate_size(total_size: int) -> None:
+    if total_size <= 0:
+        raise UploadError("Upload size must be positive.")
+    if total_size > settings.UPLOAD_MAX_SIZE:
+        raise UploadError(f"Uploads are limited to {settings.UPLOAD_MAX_SIZE} bytes.")
+
+
+def copy_stream(read: Callable[[int], bytes], out, length: Optional[int] = None, hasher=None) -> int:
+    """
+    Copies from a file-like `read` callable into `out` one buffer at a time.
+    Stops after `length` bytes when given, otherwise at EOF.
+    """
+    written = 0
+    while length is None or written < length:
+        size = READ_BUFFER_SIZE if length is None else min(READ_BUFFER_SIZE, length - written)
+        chunk = read(size)
+        if not chunk:
+            break
+        out.write(chunk)
+        if hasher is not None:
+            hasher.update(chunk)
+        written += len(chunk)
+    return written
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(READ_BUFFER_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def spool_base64(media_data: str, kind: str) -> Tuple[str, str, int]:
+    """
+    Decodes a (possibly data-URL prefixed) base64 string to a spool file slice
+    by slice instead of materialising the whole decoded payload.
+    Returns (spool_path, sha256, size).
+    """
+    _, encoded = media_data.split(",", 1) if "," in media_data else (None, media_data)
+    path = _new_spool_path(kind)
+    digest = hashlib.sha256()
+    size = 0
+
+    with open(path, "wb") as out:
+        for start in range(0, len(encoded), BASE64_SLICE_SIZE):
+            chunk = base64.b64decode(encoded[start:start + BASE64_SLICE_SIZE])
+            out.write(chunk)
+            digest.update(chunk)
+            size += len(chunk)
+
+    return path, digest.hexdigest(), size
+
+
+async def store_spooled_file(path: str, kind: str, fallback_color: Optional[str] = None):
+    """
+    Sends a spooled file to the storage backend.
+    Returns: (url, primary_color, secondary_color); colours are only extracted for images.
+    """
+    is_video = kind == models.MediaUpload.MediaKind.VIDEO
+    stored = await get_storage().upload(
+        path,
+        resource_type="video" if is_video else "image",
+        colors=not is_video,
+    )
+    if is_video:
+        return stored.url, None, None
+
+    primary, secondary = muted_palette(stored.colors, fallback=fallback_color)
+    return stored.url, primary, secondary
+
+
+async def store_base64_media(media_data: str, kind: str, fallback_color: Optional[str] = None):
+    """Legacy path for base64 payloads sent inside the GraphQL body."""
+    kind = _validate_kind(kind)
+    path, _, _ = await sync_to_async(spool_base64, thread_sensitive=False)(media_data, kind)
+    try:
+        return await store_spooled_file(path, kind, fallback_color)
+    finally:
+        await sync_to_async(_remove_spool, thread_sensitive=False)(path)
+
+
+def start_upload(user, kind: str, total_size: int) -> models.MediaUpload:
+    """Opens a resumable upload session; chunks are then appended with append_chunk."""
+    kind = _validate_kind(kind)
+    _validate_size(total_size)
+
+    path = _new_spool_path(kind)
+    open(path, "wb").close()
+
+    return models.MediaUpload.objects.create(
+        user=user, kind=kind, total_size=total_size, spool_path=path
+    )
+
+
+def _check_chunk(upload: Optional[models.MediaUpload], offset: int, length: int) -> None:
+    if not upload:
+        raise UploadError("Upload not found.")
+    if upload.status != models.MediaUpload.UploadStatus.PENDING:
+        raise UploadError("Upload is no longer accepting chunks.")
+    if offset != upload.received_size:
+        raise UploadError(f"Expected offset {upload.received_size}, got {offset}.")
+    if upload.received_size + length > upload.total_size:
+        raise UploadError("Chunk goes past the declared upload size.")
+
+
+def append_chunk(upload_id, user, offset: int, length: int, read: Callable[[int], bytes]) -> models.MediaUpload:
+    """
+    Appends one chunk to the spool file. `offset` must equal the number of bytes
+    already received, so a client that lost a response can ask for the upload
+    status and resume from `received_size`.
+
+    The body is read from the client into a chunk file first; the upload row is
+    only locked to check the offset again and append that file, so a slow
+    client does not hold a database transaction open.
+    """
+    if length <= 0:
+        raise UploadError("Chunk is empty.")
+    if length > settings.UPLOAD_MAX_CHUNK_SIZE:
+        raise UploadError(f"Chunks are limited to {settings.UPLOAD_MAX_CHUNK_SIZE} bytes.")
+
+    # Refuse bad offsets before reading anything
+    _check_chunk(models.MediaUpload.objects.filter(pk=upload_id, user=user).first(), offset, length)
+
+    chunk_path = _new_spool_path("") + CHUNK_SUFFIX
+    try:
+        with open(chunk_path, "wb") as out:
+            written = copy_stream(read, out, length=length)
+        if written != length:
+            raise UploadError("Chunk ended before Content-Length bytes were received.")
+
+        with transaction.atomic():
+            upload = models.MediaUpload.objects.select_for_update().filter(pk=upload_id, user=user).first()
+            # Another request may have appended the same chunk meanwhile
+            _check_chunk(upload, offset, length)
+
+            with open(upload.spool_path, "r+b") as out, open(chunk_path, "rb") as chunk:
+                out.seek(offset)
+                copy_stream(chunk.read, out)
+                out.truncate()
+
+            upload.received_size += written
+            upload.save(update_fields=["received_size", "date_updated"])
+    finally:
+        _remove_spool(chunk_path)
+
+    return upload
+
+
+async def finalize_upload(upload: models.MediaUpload, sha256: Optional[str] = None) -> models.MediaUpload:
+    """Hashes the spooled file, stores it (or reuses an identical stored file) and marks it complete."""
+    if upload.received_size != upload.total_size:
+        raise UploadError("Upload is not complete yet.")
+
+    try:
+        if sha256 is None:
+            sha256 = await sync_to_async(sha256_file, thread_sensitive=False)(upload.spool_path)
+
+        # Identical bytes were already stored once: reuse instead of uploading again
+        duplicate = await sync_to_async(
+            models.MediaUpload.objects.filter(
+                sha256=sha256, kind=upload.kind, status=models.MediaUpload.UploadStatus.COMPLETE
+            ).exclude(pk=upload.pk).first
+        )()
+
+        if duplicate:
+            url, primary, secondary = duplicate.url, duplicate.primary_color, duplicate.secondary_color
+        else:
+            url, primary, secondary = await store_spooled_file(upload.spool_path, upload.kind)
+
+        if not url:
+            raise UploadError("Storage backend did not return a URL.")
+
+        upload.sha256 = sha256
+        upload.url = url
+        upload.primary_color = primary or ""
+        upload.secondary_color = secondary or ""
+        upload.status = models.MediaUpload.UploadStatus.COMPLETE
+    except Exception:
+        upload.status = models.MediaUpload.UploadStatus.FAILED
+        raise
+    finally:
+        await sync_to_async(_remove_spool, thread_sensitive=False)(upload.spool_path)
+        upload.spool_path = ""
+        await sync_to_async(upload.save)()
+
+    return upload
+
+
+async def upload_from_file(user, kind: str, uploaded_file) -> models.MediaUpload:
+    """Single-request path for multipart uploads; Django has already streamed the part to disk."""
+    kind = _validate_kind(kind)
+    _validate_size(uploaded_file.size)
+
+    def _spool():
+        path = _new_spool_path(kind)
+        digest = hashlib.sha256()
+        with open(path, "wb") as out:
+            for chunk in uploaded_file.chunks(READ_BUFFER_SIZE):
+                out.write(chunk)
+                digest.update(chunk)
+
+        upload = models.MediaUpload.objects.create(
+            user=user, kind=kind, total_size=uploaded_file.size,
+            received_size=uploaded_file.size, spool_path=path,
+        )
+        return upload, digest.hexdigest()
+
+    upload, sha256 = await sync_to_async(_spool, thread_sensitive=False)()
+    return await finalize_upload(upload, sha256=sha256)
+
+
+def expire_stale_uploads() -> Tuple[int, int]:
+    """
+    Fails uploads that received nothing for UPLOAD_PENDING_TTL and removes their
+    spool files, plus any file in the spool directory that old and no longer
+    tied to a pending upload (chunks and base64 spools of crashed requests).
+    Returns (uploads expired, files removed).
+    """
+    ttl = settings.UPLOAD_PENDING_TTL
+    cutoff = timezone.now() - timedelta(seconds=ttl)
+    stale = models.MediaUpload.objects.filter(status=models.MediaUpload.UploadStatus.PENDING, date_updated__lt=cutoff)
+
+    expired = 0
+    removed = 0
+    for upload in stale.only("pk", "spool_path"):
+        # Re-checks the cutoff, so an upload that got a chunk since the query is left alone
+        if not stale.filter(pk=upload.pk).update(status=models.MediaUpload.UploadStatus.FAILED, spool_path=""):
+            continue
+        expired += 1
+        if upload.spool_path and os.path.exists(upload.spool_path):
+            _remove_spool(upload.spool_path)
+            removed += 1
+
+    spool_dir = settings.UPLOAD_SPOOL_DIR
+    if os.path.isdir(spool_dir):
+        pending = set(models.MediaUpload.objects.filter(
+            status=models.MediaUpload.UploadStatus.PENDING
+        ).exclude(spool_path="").values_list("spool_path", flat=True))
+        file_cutoff = time.time() - ttl
+        for entry in os.scandir(spool_dir):
+            if entry.is_file() and entry.path not in pending and entry.stat().st_mtime < file_cutoff:
+                _remove_spool(entry.path)
+                removed += 1
+
+    return expired, removed
+
+
+async def get_completed_upload(upload_id, user, kind: Optional[str] = None) -> models.MediaUpload:
+    """Used by mutations to attach a finished upload owned by the current user."""
+    upload = await sync_to_async(
+        models.MediaUpload.objects.filter(pk=upload_id, user=user).first
+    )()
+    if not upload:
+        raise Exception("Upload not found.")
+    if upload.status != models.MediaUpload.UploadStatus.COMPLETE:
+        raise Exception("Upload has not finished yet.")
+    if kind and upload.kind != kind:
+        raise Exception(f"Expected a {kind.lower()} upload.")
+    return upload
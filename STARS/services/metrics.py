@@ -0,0 +1,334 @@
+"""
+In-process metric registry: counters and histograms with labels, named and
+bucketed the Prometheus way so they can be exported as they are.
+
+    REQUESTS = counter("stars_requests_total", "Requests served", ["kind"])
+    REQUESTS.inc(kind="graphql")
+
+    LATENCY = histogram("stars_latency_seconds", "Latency", ["kind"])
+    LATENCY.observe(0.012, kind="graphql")
+
+Declaring the same name twice returns the existing metric, so modules can
+declare what they record at import time.
+
+Every worker process records locally and pushes its increments to Redis
+every METRICS_PUSH_INTERVAL seconds (a daemon thread, started on first use
+and again after a fork). Counters and histograms are summed there; gauges
+are stored per process with an expiry, so a dead worker's values fade out.
+render() produces the Prometheus text format from the Redis totals, and
+from this process alone when Redis is unavailable.
+"""
+import bisect
+import json
+import os
+import socket
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+# Seconds, from a cache hit to a slow upstream call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Counts, e.g. SQL queries per operation
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+REDIS_PREFIX = "stars:metrics"
+
+_lock = threading.Lock()
+REGISTRY: Dict[str, "_Metric"] = {}
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise Exception(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        _ensure_pusher()
+        return tuple(str(labels[name]) for name in self.labels)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        # Increments not pushed to Redis yet
+        self.pending: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+            self.pending[key] = self.pending.get(key, 0) + amount
+
+    def samples(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self.values)
+
+    def take_pending(self) -> Dict[str, float]:
+        with self._lock:
+            pending, self.pending = self.pending, {}
+        return {_field(key): amount for key, amount in pending.items()}
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self.values)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last is +Inf), sum]
+        self.values: Dict[Tuple[str, ...], List] = {}
+        self.pending: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            for values in (self.values, self.pending):
+                entry = values.get(key)
+                if entry is None:
+                    entry = values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+                entry[0][index] += 1
+                entry[1] += value
+
+    def samples(self) -> Dict[Tuple[str, ...], List]:
+        with self._lock:
+            return {key: [list(counts), total] for key, (counts, total) in self.values.items()}
+
+    def take_pending(self) -> Dict[str, float]:
+        with self._lock:
+            pending, self.pending = self.pending, {}
+        fields = {}
+        for key, (counts, total) in pending.items():
+            for index, count in enumerate(counts):
+                if count:
+                    fields[f"{_field(key)}|{index}"] = count
+            fields[f"{_field(key)}|sum"] = total
+        return fields
+
+
+def _register(cls, name: str, *args, **kwargs):
+    with _lock:
+        metric = REGISTRY.get(name)
+        if metric is None:
+            metric = REGISTRY[name] = cls(name, *args, **kwargs)
+        elif not isinstance(metric, cls):
+            raise Exception(f"Metric {name} is already registered as a {metric.kind}")
+        return metric
+
+
+def counter(name: str, help_text: str, labels: Iterable[str] = ()) -> Counter:
+    return _register(Counter, name, help_text, labels)
+
+
+def gauge(name: str, help_text: str, labels: Iterable[str] = ()) -> Gauge:
+    return _register(Gauge, name, help_text, labels)
+
+
+def histogram(name: str, help_text: str, labels: Iterable[str] = (),
+              buckets: Optional[Iterable[float]] = None) -> Histogram:
+    return _register(Histogram, name, help_text, labels, buckets or DEFAULT_BUCKETS)
+
+
+# --- Sharing between worker processes ---
+
+_PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}"
+_pusher: Optional[threading.Thread] = None
+
+
+def _field(key: Tuple[str, ...]) -> str:
+    return json.dumps(key, separators=(",", ":"))
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection("default")
+
+
+def push() -> None:
+    """Sends this process's increments and gauge values to Redis (sync)."""
+    with _lock:
+        metrics = list(REGISTRY.values())
+    gauge_ttl = max(30, settings.METRICS_PUSH_INTERVAL * 3)
+    taken = []
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        for metric in metrics:
+            key = f"{REDIS_PREFIX}:{metric.name}"
+            if isinstance(metric, Gauge):
+                values = metric.samples()
+                if values:
+                    process_key = f"{key}:proc:{_PROCESS_ID}"
+                    pipe.hset(process_key, mapping={_field(k): v for k, v in values.items()})
+                    pipe.expire(process_key, gauge_ttl)
+                continue
+            fields = metric.take_pending()
+            taken.append((metric, fields))
+            for field, amount in fields.items():
+                pipe.hincrbyfloat(key, field, amount)
+        pipe.execute()
+    except Exception:
+        # Keep the increments for the next push
+        for metric, fields in taken:
+            _restore_pending(metric, fields)
+        raise
+
+
+def _restore_pending(metric, fields: Dict[str, float]) -> None:
+    with metric._lock:
+        for field, amount in fields.items():
+            if isinstance(metric, Counter):
+                key = tuple(json.loads(field))
+                metric.pending[key] = metric.pending.get(key, 0) + amount
+                continue
+            labels, slot = field.rsplit("|", 1)
+            key = tuple(json.loads(labels))
+            entry = metric.pending.setdefault(key, [[0] * (len(metric.buckets) + 1), 0.0])
+            if slot == "sum":
+                entry[1] += amount
+            else:
+                entry[0][int(slot)] += amount
+
+
+def _push_forever() -> None:
+    failing = False
+    while True:
+        time.sleep(settings.METRICS_PUSH_INTERVAL)
+        try:
+            push()
+            failing = False
+        except Exception as e:
+            if not failing:
+                print(f"Metrics push to Redis failed: {e}")
+            failing = True
+
+
+def _ensure_pusher() -> None:
+    global _pusher
+    if _pusher is None and settings.METRICS_PUSH_INTERVAL > 0:
+        with _lock:
+            if _pusher is None:
+                _pusher = threading.Thread(target=_push_forever, name="metrics-push", daemon=True)
+                _pusher.start()
+
+
+def _after_fork() -> None:
+    # The parent pushes what it recorded before the fork; the child starts clean
+    global _pusher, _PROCESS_ID
+    _pusher = None
+    _PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}"
+    for metric in REGISTRY.values():
+        metric.values = {}
+        if hasattr(metric, "pending"):
+            metric.pending = {}
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def _shared_samples() -> Dict[str, Dict[Tuple[str, ...], object]]:
+    """Totals of every process, read back from Redis (sync)."""
+    push()
+    connection = _redis()
+    with _lock:
+        metrics = list(REGISTRY.values())
+    samples = {}
+    for metric in metrics:
+        key = f"{REDIS_PREFIX}:{metric.name}"
+        if isinstance(metric, Gauge):
+            totals: Dict[Tuple[str, ...], float] = {}
+            for process_key in connection.scan_iter(match=f"{key}:proc:*"):
+                for field, value in connection.hgetall(process_key).items():
+                    labels = tuple(json.loads(field))
+                    totals[labels] = totals.get(labels, 0) + float(value)
+            samples[metric.name] = totals
+            continue
+        raw = connection.hgetall(key)
+        if isinstance(metric, Counter):
+            samples[metric.name] = {tuple(json.loads(field)): float(value) for field, value in raw.items()}
+            continue
+        histograms: Dict[Tuple[str, ...], List] = {}
+        for field, value in raw.items():
+            labels, slot = field.decode().rsplit("|", 1) if isinstance(field, bytes) else field.rsplit("|", 1)
+            entry = histograms.setdefault(tuple(json.loads(labels)), [[0] * (len(metric.buckets) + 1), 0.0])
+            if slot == "sum":
+                entry[1] = float(value)
+            else:
+                entry[0][int(slot)] = float(value)
+        samples[metric.name] = histograms
+    return samples
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (sync)."""
+    try:
+        shared = _shared_samples()
+    except Exception as e:
+        print(f"Metrics: Redis unavailable, exporting this process only: {e}")
+        shared = None
+
+    with _lock:
+        metrics = sorted(REGISTRY.values(), key=lambda m: m.name)
+    lines = []
+    for metric in metrics:
+        samples = shared[metric.name] if shared is not None else metric.samples()
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for labels, value in sorted(samples.items()):
+            if not isinstance(metric, Histogram):
+                lines.append(f"{metric.name}{_labels(metric.labels, labels)} {_number(value)}")
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip(list(metric.buckets) + ["+Inf"], counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == "+Inf" else f'le="{bound}"'
+                lines.append(f"{metric.name}_bucket{_labels(metric.labels, labels, le)} {_number(cumulative)}")
+            lines.append(f"{metric.name}_sum{_labels(metric.labels, labels)} {_number(total)}")
+            lines.append(f"{metric.name}_count{_labels(metric.labels, labels)} {_number(cumulative)}")
+    return "\n".join(lines) + "\n"
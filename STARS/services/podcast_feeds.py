@@ -0,0 +1,141 @@
+"""
+Batch refresh of podcast descriptions from their RSS feeds.
+
+Podcasts are processed a page at a time, in pk order:
+- Rows without a feed_url get it from a bulk iTunes lookup. Rows the lookup
+  finds no feed for are stamped with feed_checked_at and not looked up again
+  for LOOKUP_RETRY_AFTER.
+- Feeds are fetched with bounded concurrency. Each is a streaming,
+  conditional GET (see iTunesService.fetch_feed_description), so unchanged
+  feeds cost a 304 and changed ones only their first few kilobytes.
+- The results are written back with one bulk_update per page.
+
+bulk_update skips post_save, so callers should invalidate the podcast caches
+once when the refresh finishes.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable, Optional
+
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from django.utils import timezone
+
+from STARS import models
+from .itunes import iTunesService
+
+FEED_CONCURRENCY = 16
+PAGE_SIZE = 500
+# How long a podcast iTunes had no feed URL for waits before it is looked up again
+LOOKUP_RETRY_AFTER = timedelta(days=7)
+
+REFRESH_FIELDS = ["description", "feed_url", "feed_etag", "feed_last_modified", "feed_checked_at"]
+
+
+@dataclass
+class FeedRefreshStats:
+    checked: int = 0
+    updated: int = 0
+    not_modified: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    # Looked up on iTunes this run without a feed URL coming back
+    lookup_missed: int = 0
+    # Without a feed and not looked up (no iTunes ID, or looked up recently)
+    no_feed: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def processed(self) -> int:
+        return self.checked + self.lookup_missed + self.no_feed
+
+    def summary(self) -> str:
+        return (
+            f"{self.checked} checked: {self.updated} updated, {self.not_modified} not modified, "
+            f"{self.unchanged} unchanged, {self.failed} failed; {self.lookup_missed} not found on iTunes, "
+            f"{self.no_feed} without feed in {self.elapsed:.1f}s"
+        )
+
+
+def _page(after_pk: int, only_missing: bool):
+    rows = models.Podcast.objects.filter(pk__gt=after_pk)
+    if only_missing:
+        rows = rows.filter(Q(description__isnull=True) | Q(description=""))
+    return list(
+        rows.order_by("pk").only(
+            "pk", "apple_podcasts_id", "description", "feed_url", "feed_etag", "feed_last_modified", "feed_checked_at"
+        )[:PAGE_SIZE]
+    )
+
+
+async def refresh_podcast_descriptions(
+        only_missing: bool = False,
+        concurrency: int = FEED_CONCURRENCY,
+        on_progress: Optional[Callable[[FeedRefreshStats], None]] = None,
+) -> FeedRefreshStats:
+    """Refreshes every podcast's description (or only the empty ones) from its feed."""
+    started = time.perf_counter()
+    stats = FeedRefreshStats()
+    itunes_service = iTunesService()
+    slots = asyncio.Semaphore(concurrency)
+
+    async def _refresh(podcast: models.Podcast) -> None:
+        """Updates `podcast` in place, saved with the rest of its page."""
+        async with slots:
+            feed = await itunes_service.fetch_feed_description(
+                podcast.feed_url, podcast.feed_etag, podcast.feed_last_modified
+            )
+        podcast.feed_checked_at = timezone.now()
+        if feed is None:
+            stats.failed += 1
+            return
+        if feed.not_modified:
+            stats.not_modified += 1
+            return
+
+        podcast.feed_etag = feed.etag[:255]
+        podcast.feed_last_modified = feed.last_modified[:64]
+        if feed.description and feed.description != podcast.description:
+            podcast.description = feed.description
+            stats.updated += 1
+        else:
+            stats.unchanged += 1
+
+    after_pk = 0
+    while True:
+        page = await sync_to_async(_page)(after_pk, only_missing)
+        if not page:
+            break
+        after_pk = page[-1].pk
+
+        # Older rows were imported before feed URLs were stored
+        lookup_before = timezone.now() - LOOKUP_RETRY_AFTER
+        missing_feed = [
+            p for p in page
+            if not p.feed_url and p.apple_podcasts_id and not (p.feed_checked_at and p.feed_checked_at > lookup_before)
+        ]
+        missed = []
+        if missing_feed:
+            found = await itunes_service.lookup_podcasts(p.apple_podcasts_id for p in missing_feed)
+            for podcast in missing_feed:
+                podcast.feed_url = (found.get(podcast.apple_podcasts_id) or {}).get("feedUrl") or None
+                if not podcast.feed_url:
+                    podcast.feed_checked_at = timezone.now()
+                    missed.append(podcast)
+
+        with_feed = [p for p in page if p.feed_url]
+        stats.lookup_missed += len(missed)
+        stats.no_feed += len(page) - len(with_feed) - len(missed)
+        stats.checked += len(with_feed)
+        await asyncio.gather(*(_refresh(p) for p in with_feed))
+
+        await sync_to_async(models.Podcast.objects.bulk_update)(with_feed + missed, REFRESH_FIELDS)
+
+        stats.elapsed = time.perf_counter() - started
+        if on_progress:
+            on_progress(stats)
+
+    stats.elapsed = time.perf_counter() - started
+    return stats
@@ -0,0 +1,141 @@
+"""
+Bulk import engine for podcasts coming from the iTunes search/lookup API.
+
+Per chunk of items this costs a fixed handful of queries instead of several
+per podcast:
+- one query for the apple_podcasts_ids we already have,
+- one upsert for the whole genre dictionary,
+- one INSERT ... ON CONFLICT DO NOTHING RETURNING for the podcasts, so rows
+  a concurrent import inserted first are neither counted nor linked,
+- bulk_create for the ordered genre links.
+
+bulk_create skips post_save, so callers should invalidate the podcast
+caches once when the import finishes.
+"""
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models.constants import OnConflict
+
+from STARS import models
+
+CHUNK_SIZE = 1000
+
+# iTunes tags every podcast with this; it is not a real genre
+GENERIC_GENRE = "Podcasts"
+
+
+@dataclass
+class PodcastImportResult:
+    created: int = 0
+    skipped: int = 0
+    genre_links: int = 0
+    # (podcast_id, artwork_url) for covers still to be ingested
+    cover_jobs: List[Tuple[int, str]] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        rows = self.created + self.genre_links
+        return rows / self.elapsed if self.elapsed else 0.0
+
+
+def podcast_genre_names(item: dict) -> List[str]:
+    """Genre names in iTunes order, deduplicated and without the generic label."""
+    return [name for name in dict.fromkeys(item.get("genres", [])) if name != GENERIC_GENRE]
+
+
+def resolve_podcast_genres(names: Iterable[str]) -> Dict[str, models.PodcastGenre]:
+    """Creates any missing genres in one statement and returns them all by title."""
+    names = set(names)
+    if not names:
+        return {}
+
+    models.PodcastGenre.objects.bulk_create(
+        [models.PodcastGenre(title=name) for name in names], ignore_conflicts=True
+    )
+    return {genre.title: genre for genre in models.PodcastGenre.objects.filter(title__in=names)}
+
+
+def podcast_from_itunes(item: dict, user=None) -> models.Podcast:
+    return models.Podcast(
+        apple_podcasts_id=str(item.get("collectionId")),
+        title=item.get("collectionName", "Unknown")[:500],
+        host=item.get("artistName", "Unknown")[:500],
+        apple_podcasts=item.get("collectionViewUrl"),
+        feed_url=item.get("feedUrl") or None,
+        user=user,
+    )
+
+
+def insert_new_podcasts(podcasts: List[models.Podcast]) -> Dict[str, int]:
+    """
+    Inserts the podcasts whose apple_podcasts_id is free and returns the ids of
+    those rows only, by apple_podcasts_id. bulk_create(ignore_conflicts=True)
+    cannot tell them apart from rows that were already there.
+    """
+    if not podcasts:
+        return {}
+    opts = models.Podcast._meta
+    fields = [f for f in opts.concrete_fields if f is not opts.auto_field and not f.generated]
+    rows = models.Podcast.objects._insert(
+        podcasts, fields=fields, on_conflict=OnConflict.IGNORE,
+        returning_fields=[opts.pk, opts.get_field("apple_podcasts_id")],
+    )
+    # A single skipped row comes back as None rather than as no row
+    return {row[1]: row[0] for row in rows if row is not None}
+
+
+def bulk_import_podcasts(
+        items: Iterable[dict],
+        user=None,
+        chunk_size: int = CHUNK_SIZE,
+        cover_url_for: Optional[Callable[[dict], str]] = None,
+) -> PodcastImportResult:
+    """
+    Inserts every item whose collectionId we don't have yet, with its genres.
+    Each chunk is its own transaction, so a failure only loses that chunk.
+    """
+    started = time.perf_counter()
+    result = PodcastImportResult()
+    cover_url_for = cover_url_for or (lambda item: item.get("artworkUrl600", ""))
+
+    # Deduplicate by ID before hitting DB
+    unique_items = {str(item.get("collectionId")): item for item in items if item.get("collectionId")}
+
+    existing_ids = set(
+        models.Podcast.objects.filter(apple_podcasts_id__in=list(unique_items))
+        .values_list("apple_podcasts_id", flat=True)
+    )
+    new_items = [(apple_id, item) for apple_id, item in unique_items.items() if apple_id not in existing_ids]
+    result.skipped = len(unique_items) - len(new_items)
+
+    genres = resolve_podcast_genres(name for _, item in new_items for name in podcast_genre_names(item))
+
+    for start in range(0, len(new_items), chunk_size):
+        chunk = new_items[start:start + chunk_size]
+
+        with transaction.atomic():
+            # Rows another import inserted since existing_ids was read are left out
+            podcast_ids = insert_new_podcasts([podcast_from_itunes(item, user) for _, item in chunk])
+
+            links = [
+                models.PodcastGenresOrdered(podcast_id=podcast_ids[apple_id], genre=genres[name], position=position)
+                for apple_id, item in chunk
+                if apple_id in podcast_ids
+                for position, name in enumerate(podcast_genre_names(item), start=1)
+            ]
+            models.PodcastGenresOrdered.objects.bulk_create(links, ignore_conflicts=True)
+
+        result.created += len(podcast_ids)
+        result.skipped += len(chunk) - len(podcast_ids)
+        result.genre_links += len(links)
+        for apple_id, item in chunk:
+            cover_url = cover_url_for(item)
+            if cover_url and apple_id in podcast_ids:
+                result.cover_jobs.append((podcast_ids[apple_id], cover_url))
+
+    result.elapsed = time.perf_counter() - started
+    return result
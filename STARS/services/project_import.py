@@ -0,0 +1,216 @@
+"""
+Set-based import engine for create_project.
+
+Every Apple Music artist ID and genre name in the payload is resolved with
+one query each (plus one bulk insert for whatever is missing), and songs,
+song artists, song genres, project songs and project artists are written
+with one bulk_create each. The number of queries no longer grows with the
+number of tracks or features.
+"""
+from typing import Dict, Iterable, List, Optional
+
+from STARS import models
+
+# Apple Music tags everything with this; it is not a real genre
+GENERIC_GENRE = "Music"
+
+
+def music_genre_names(genre_names: Optional[Iterable[str]]) -> List[str]:
+    """Deduplicate while preserving order and filter out generic labels."""
+    return [name for name in dict.fromkeys(genre_names or []) if name != GENERIC_GENRE]
+
+
+def resolve_music_genres(names: Iterable[str]) -> Dict[str, models.MusicGenre]:
+    """Creates any missing genres in one statement and returns them all by title."""
+    names = set(names)
+    if not names:
+        return {}
+
+    models.MusicGenre.objects.bulk_create([models.MusicGenre(title=name) for name in names], ignore_conflicts=True)
+    return {genre.title: genre for genre in models.MusicGenre.objects.filter(title__in=names)}
+
+
+def resolve_artists(am_ids: Iterable[str], artists_data: dict) -> Dict[str, models.Artist]:
+    """
+    Maps Apple Music IDs to Artists: existing ones in one query, the rest created
+    in bulk from `artists_data` (see _fetch_missing_artist_data). IDs that are
+    neither stored nor fetched are left out.
+    """
+    am_ids = set(am_ids)
+    if not am_ids:
+        return {}
+
+    artists = {}
+    # Oldest row wins when an ID was stored twice, like .first() did
+    for artist in models.Artist.objects.filter(apple_music_id__in=am_ids).order_by("-pk"):
+        artists[artist.apple_music_id] = artist
+
+    missing = [am_id for am_id in am_ids if am_id not in artists and am_id in artists_data]
+    if not missing:
+        return artists
+
+    created = models.Artist.objects.bulk_create([
+        models.Artist(
+            apple_music_id=am_id, name=artists_data[am_id]["name"], picture=artists_data[am_id]["picture"],
+            primary_color=artists_data[am_id]["primary_color"] or "",
+            secondary_color=artists_data[am_id]["secondary_color"] or "",
+            apple_music=artists_data[am_id]["apple_music_url"],
+        )
+        for am_id in missing
+    ])
+    artists.update({artist.apple_music_id: artist for artist in created})
+
+    genres = resolve_music_genres(
+        name for artist in created for name in music_genre_names(artists_data[artist.apple_music_id]["genres"])
+    )
+    models.ArtistGenresOrdered.objects.bulk_create([
+        models.ArtistGenresOrdered(artist=artist, genre=genres[name], position=position)
+        for artist in created
+        for position, name in enumerate(music_genre_names(artists_data[artist.apple_music_id]["genres"]), start=1)
+    ])
+    return artists
+
+
+def determine_project_type(is_single: bool, song_count: int, songs: List) -> str:
+    """
+    Determine project type following Apple Music's classification rules:
+    SINGLE:
+    - 1-3 tracks, each under 10 minutes
+    EP:
+    - 4-6 tracks with total duration under 30 minutes
+    - OR 1-3 tracks where at least one track is 10+ minutes (under 30 min total)
+    ALBUM:
+    - 7+ tracks (regardless of duration)
+    - OR any project over 30 minutes total duration
+    """
+
+    # Calculate total length in minutes
+
+    total_length_ms = sum(s.length or 0 for s in songs)
+    total_length_minutes = total_length_ms / 60000
+
+    # ALBUM: 7+ tracks or total duration over 30 minutes
+    if song_count >= 7 or total_length_minutes > 30:
+        return models.Project.ProjectType.ALBUM
+
+    # For 1-3 tracks
+    if song_count <= 3:
+        # Check if any track is 10+ minutes (600,000 ms)
+        has_long_track = any((s.length or 0) >= 600000 for s in songs)
+        if has_long_track:
+            # 1-3 tracks with at least one 10+ min track = EP (if under 30 min total)
+            if total_length_minutes <= 30:
+                return models.Project.ProjectType.EP
+            else:
+                return models.Project.ProjectType.ALBUM
+        else:
+            # 1-3 tracks, all under 10 minutes = SINGLE
+            return models.Project.ProjectType.SINGLE
+
+    # EP: 4-6 tracks with under 30 minutes total
+    if 4 <= song_count <= 6:
+        if total_length_minutes <= 30:
+            return models.Project.ProjectType.EP
+        else:
+            # Over 30 minutes = ALBUM
+            return models.Project.ProjectType.ALBUM
+
+    # Default fallback (shouldn't reach here with valid data)
+    return models.Project.ProjectType.ALBUM
+
+
+def import_project(data, cover_data, artists_data: dict, user) -> models.Project:
+    """
+    Creates the project described by a ProjectCreateInput. Must run inside a
+    transaction. `cover_data` is (url, primary, secondary) from process_image_from_url.
+    """
+    song_inputs = data.songs or []
+    new_song_inputs = [song_in for song_in in song_inputs if not song_in.song_id]
+
+    # 1. Dictionaries: every genre and artist in the payload, one query each
+    genres = resolve_music_genres(
+        music_genre_names(data.genres) + [name for s in new_song_inputs for name in music_genre_names(s.genres)]
+    )
+    artists = resolve_artists(
+        list(data.artists_apple_music_ids or []) + [
+            am_id for s in new_song_inputs for am_id in (s.artists_apple_music_ids or [])
+        ],
+        artists_data,
+    )
+
+    # 2. Project and its own metadata; a single create() so post_save still
+    #    clears the music search cache for everything imported here
+    project = models.Project.objects.create(
+        apple_music_id=data.apple_music_id, title=data.title,
+        number_of_songs=data.number_of_songs, release_date=data.release_date,
+        project_type=determine_project_type(data.is_single, data.number_of_songs, song_inputs),
+        apple_music=data.apple_music_url, record_label=data.record_label,
+        user=user
+    )
+
+    models.ProjectGenresOrdered.objects.bulk_create([
+        models.ProjectGenresOrdered(project=project, genre=genres[name], position=position)
+        for position, name in enumerate(music_genre_names(data.genres), start=1)
+    ])
+
+    cover_url, primary, secondary = cover_data
+    if cover_url:
+        models.Cover.objects.create(
+            image=cover_url, content_object=project, position=1, primary_color=primary,
+            secondary_color=secondary, is_confirmed=True, user=user
+        )
+
+    models.ProjectArtist.objects.bulk_create([
+        models.ProjectArtist(project=project, artist=artists[am_id], position=i + 1)
+        for i, am_id in enumerate(data.artists_apple_music_ids or [])
+        if am_id in artists
+    ])
+
+    # 3. Songs: existing ones in one query, new ones in one insert
+    existing_songs = models.Song.objects.in_bulk([s.song_id for s in song_inputs if s.song_id])
+
+    new_songs = models.Song.objects.bulk_create([
+        models.Song(
+            apple_music_id=s.apple_music_id, title=s.title,
+            length=s.length or 0, preview=s.preview_url,
+            apple_music=s.apple_music_url, release_date=s.release_date,
+            is_out=s.is_out, user=user
+        )
+        for s in new_song_inputs
+    ])
+    new_songs_by_input = dict(zip(map(id, new_song_inputs), new_songs))
+
+    song_genres = []
+    song_artists = []
+    for song_in, song in zip(new_song_inputs, new_songs):
+        song_genres += [
+            models.SongGenresOrdered(song=song, genre=genres[name], position=position)
+            for position, name in enumerate(music_genre_names(song_in.genres), start=1)
+        ]
+        song_artists += [
+            models.SongArtist(song=song, artist=artists[am_id], position=j + 1)
+            for j, am_id in enumerate(dict.fromkeys(song_in.artists_apple_music_ids or []))
+            if am_id in artists
+        ]
+    models.SongGenresOrdered.objects.bulk_create(song_genres)
+    models.SongArtist.objects.bulk_create(song_artists)
+
+    # 4. Tracklist
+    project_songs = []
+    total_length = 0
+    for song_in in song_inputs:
+        song = existing_songs.get(int(song_in.song_id)) if song_in.song_id else new_songs_by_input[id(song_in)]
+        if song:
+            project_songs.append(models.ProjectSong(
+                project=project, song=song, position=song_in.position, disc_number=song_in.disc_number
+            ))
+            total_length += song.length
+    models.ProjectSong.objects.bulk_create(project_songs)
+
+    project.length = total_length
+    project.save(update_fields=["length"])
+
+    if data.alternative_versions:
+        project.alternative_versions.set(models.Project.objects.filter(pk__in=data.alternative_versions))
+
+    return project
@@ -0,0 +1,203 @@
+"""
+Response cache for the upstream catalog APIs (Apple Music, iTunes, YouTube).
+
+GET responses are kept in the Django cache, keyed by endpoint name, URL
+(which carries the storefront) and query params. Every endpoint has its own
+TTL (DEFAULT_TTLS, overridable with settings.UPSTREAM_CACHE_TTLS).
+
+If the upstream sent an ETag or Last-Modified header, an expired entry is
+kept for another UPSTREAM_CACHE_REVALIDATE_FOR seconds. The next call then
+revalidates it with a conditional request, so an unchanged resource costs a
+304 instead of a full body. That stale copy is also served instead of an
+error when the upstream fails or is refused by the rate limiter or circuit
+breaker (see upstream_guard.py).
+
+Identical calls in flight at the same time share one upstream request.
+Hit/miss counters per endpoint are kept in `stats`.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import weakref
+from collections import Counter, defaultdict
+from typing import Any, Dict, Optional
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .upstream_guard import UpstreamUnavailable, guarded_get
+
+CACHE_KEY_PREFIX = "upstream"
+
+# Seconds a response is served without asking the upstream again
+DEFAULT_TTLS = {
+    "apple_music.search": 600,
+    "apple_music.albums": 3600,
+    "apple_music.artists": 86400,
+    "apple_music.songs": 3600,
+    "apple_music.top_songs": 3600,
+    "itunes.search": 900,
+    "itunes.genre_top": 21600,
+    "itunes.lookup": 3600,
+    "youtube.search": 900,
+    "youtube.videos": 3600,
+}
+
+# Credentials sent as query params are never part of the cache key
+SECRET_PARAMS = {"key"}
+
+
+class ResponseCacheStats:
+    """Per-endpoint counters: hit, miss, revalidated (304), coalesced, stale, bypass."""
+
+    SERVED_FROM_CACHE = ("hit", "revalidated", "coalesced", "stale")
+
+    def __init__(self):
+        self._counts: Dict[str, Counter] = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, event: str) -> None:
+        with self._lock:
+            self._counts[endpoint][event] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            counts = {endpoint: dict(events) for endpoint, events in self._counts.items()}
+        for events in counts.values():
+            total = sum(events.values())
+            cached = sum(events.get(event, 0) for event in self.SERVED_FROM_CACHE)
+            events["hit_ratio"] = round(cached / total, 3) if total else 0.0
+        return counts
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+
+stats = ResponseCacheStats()
+
+# In-flight fetches are asyncio tasks, so they are kept per event loop
+_in_flight: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Task]]" = \
+    weakref.WeakKeyDictionary()
+
+
+def endpoint_ttl(endpoint: str) -> int:
+    overrides = getattr(settings, "UPSTREAM_CACHE_TTLS", None) or {}
+    return overrides.get(endpoint, DEFAULT_TTLS.get(endpoint, 0))
+
+
+def response_cache_key(endpoint: str, url: str, params: Optional[Dict[str, Any]] = None) -> str:
+    query = sorted((str(k), str(v)) for k, v in (params or {}).items() if k not in SECRET_PARAMS)
+    digest = hashlib.sha256(json.dumps([url, query]).encode()).hexdigest()[:32]
+    return f"{CACHE_KEY_PREFIX}:{endpoint}:{digest}"
+
+
+async def _cache_get(key: str) -> Optional[dict]:
+    # A cache outage must not take the catalog search down with it
+    try:
+        return await sync_to_async(cache.get)(key)
+    except Exception as e:
+        print(f"Upstream cache read failed: {e}")
+        return None
+
+
+async def _cache_set(key: str, entry: dict, timeout: int) -> None:
+    try:
+        await sync_to_async(cache.set)(key, entry, timeout)
+    except Exception as e:
+        print(f"Upstream cache write failed: {e}")
+
+
+def _entry_timeout(entry: dict, ttl: int) -> int:
+    if entry.get("etag") or entry.get("last_modified"):
+        return ttl + settings.UPSTREAM_CACHE_REVALIDATE_FOR
+    return ttl
+
+
+def _response_from_entry(entry: dict, url: str) -> httpx.Response:
+    headers = {"content-type": entry.get("content_type") or "application/json"}
+    if entry.get("etag"):
+        headers["etag"] = entry["etag"]
+    return httpx.Response(
+        200, headers=headers, content=entry["body"].encode(), request=httpx.Request("GET", url)
+    )
+
+
+async def _fetch(client: httpx.AsyncClient, endpoint: str, key: str, ttl: int, url: str,
+                 params: Optional[Dict[str, Any]], headers: Optional[Dict[str, str]],
+                 max_wait: Optional[float]) -> httpx.Response:
+    entry = await _cache_get(key)
+    if entry and entry["expires_at"] > time.time():
+        stats.record(endpoint, "hit")
+        return _response_from_entry(entry, url)
+
+    request_headers = dict(headers or {})
+    if entry:
+        if entry.get("etag"):
+            request_headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            request_headers["If-Modified-Since"] = entry["last_modified"]
+
+    try:
+        response = await guarded_get(client, endpoint, url, params=params, headers=request_headers, max_wait=max_wait)
+    except (httpx.TransportError, UpstreamUnavailable):
+        if entry:
+            stats.record(endpoint, "stale")
+            return _response_from_entry(entry, url)
+        raise
+
+    if entry and response.status_code == 304:
+        stats.record(endpoint, "revalidated")
+        entry["expires_at"] = time.time() + ttl
+        await _cache_set(key, entry, _entry_timeout(entry, ttl))
+        return _response_from_entry(entry, url)
+
+    if entry and (response.status_code >= 500 or response.status_code == 429):
+        stats.record(endpoint, "stale")
+        return _response_from_entry(entry, url)
+
+    stats.record(endpoint, "miss")
+    if response.status_code == 200:
+        entry = {
+            "body": response.text,
+            "content_type": response.headers.get("content-type"),
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "expires_at": time.time() + ttl,
+        }
+        await _cache_set(key, entry, _entry_timeout(entry, ttl))
+    return response
+
+
+async def cached_get(client: httpx.AsyncClient, endpoint: str, url: str, *,
+                     params: Optional[Dict[str, Any]] = None,
+                     headers: Optional[Dict[str, str]] = None,
+                     max_wait: Optional[float] = None) -> httpx.Response:
+    """
+    Drop-in for `client.get(url, params=..., headers=...)` that goes through the
+    response cache. `endpoint` picks the TTL (see DEFAULT_TTLS); endpoints
+    without one go straight to the upstream. Only 200s are cached.
+    Upstream calls are rate limited (`max_wait` overrides how long to wait
+    for a token) and raise UpstreamUnavailable when refused with nothing cached.
+    """
+    ttl = endpoint_ttl(endpoint)
+    if ttl <= 0:
+        stats.record(endpoint, "bypass")
+        return await guarded_get(client, endpoint, url, params=params, headers=headers, max_wait=max_wait)
+
+    key = response_cache_key(endpoint, url, params)
+    in_flight = _in_flight.setdefault(asyncio.get_running_loop(), {})
+    task = in_flight.get(key)
+    if task is not None:
+        stats.record(endpoint, "coalesced")
+    else:
+        task = asyncio.ensure_future(_fetch(client, endpoint, key, ttl, url, params, headers, max_wait))
+        in_flight[key] = task
+        task.add_done_callback(lambda _: in_flight.pop(key, None))
+
+    # Shielded so one caller giving up does not cancel the fetch for the others
+    return await asyncio.shield(task)
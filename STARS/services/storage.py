@@ -0,0 +1,78 @@
+"""
+Storage backends for media we host (covers, pictures, chat attachments).
+
+The backend is picked with the MEDIA_STORAGE_BACKEND setting so tests can
+swap Cloudinary for the in-memory MockStorage.
+"""
+import asyncio
+import hashlib
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List
+
+import cloudinary.uploader
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Size of each request upload_large sends to Cloudinary
+LARGE_UPLOAD_CHUNK_SIZE = 6 * 1024 * 1024
+
+
+@dataclass
+class StoredMedia:
+    url: str
+    # Raw hex palette, most dominant first (only filled when colors were requested)
+    colors: List[str] = field(default_factory=list)
+
+
+class CloudinaryStorage:
+    async def upload(self, file_path: str, resource_type: str = "image", colors: bool = False) -> StoredMedia:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.upload_sync, file_path, resource_type, colors)
+
+    def upload_sync(self, file_path: str, resource_type: str = "image", colors: bool = False) -> StoredMedia:
+        if resource_type == "video":
+            # upload_large sends the file from disk in fixed-size chunks
+            result = cloudinary.uploader.upload_large(
+                file_path, resource_type="video", chunk_size=LARGE_UPLOAD_CHUNK_SIZE
+            )
+        else:
+            result = cloudinary.uploader.upload(file_path, resource_type=resource_type, colors=colors)
+
+        raw_colors = result.get("colors", []) if colors else []
+        return StoredMedia(
+            url=result.get("secure_url"),
+            colors=[c[0] for c in raw_colors],
+        )
+
+
+class MockStorage:
+    """
+    Keeps uploads in memory instead of talking to Cloudinary.
+    Select it with MEDIA_STORAGE_BACKEND = "STARS.services.storage.MockStorage".
+    """
+    base_url = "https://media.mock.local"
+    palette = ["#336699", "#cc9966"]
+
+    def __init__(self):
+        self.uploads: List[dict] = []
+
+    async def upload(self, file_path: str, resource_type: str = "image", colors: bool = False) -> StoredMedia:
+        return self.upload_sync(file_path, resource_type, colors)
+
+    def upload_sync(self, file_path: str, resource_type: str = "image", colors: bool = False) -> StoredMedia:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b""):
+                digest.update(chunk)
+
+        url = f"{self.base_url}/{resource_type}/{digest.hexdigest()}"
+        self.uploads.append({"file_path": file_path, "resource_type": resource_type, "url": url})
+        return StoredMedia(url=url, colors=list(self.palette) if colors else [])
+
+
+@lru_cache(maxsize=None)
+def get_storage():
+    """Returns the process-wide storage backend configured in settings."""
+    backend_path = getattr(settings, "MEDIA_STORAGE_BACKEND", "STARS.services.storage.CloudinaryStorage")
+    return import_string(backend_path)()
@@ -0,0 +1,320 @@
+"""
+Client-side protection for the external catalog APIs.
+
+Every upstream call goes through guarded_get(), which applies three checks:
+
+- A token bucket per upstream, kept in Redis so all workers share it. A
+  caller waits for a token, but for at most `max_wait` seconds; past that
+  the call is refused instead of queueing.
+- A daily quota ledger in Redis for upstreams billed in units (the YouTube
+  Data API charges 100 units per search). Once the day's budget is spent,
+  calls are refused until it resets.
+- A circuit breaker per worker. After `failure_threshold` consecutive
+  failures (transport errors, 429s, 5xx) the upstream is skipped for
+  `cooldown` seconds, or for the Retry-After of a 429, and a single trial
+  call then decides whether it closes again.
+
+A refused call raises UpstreamUnavailable straight away, so callers can
+serve a cached or degraded result instead of waiting on a failing upstream.
+If Redis is unreachable, the bucket and ledger fall back to this process.
+"""
+import asyncio
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional
+from zoneinfo import ZoneInfo
+
+import httpx
+from asgiref.sync import sync_to_async
+from decouple import config
+
+# Atomically refills the bucket and reserves `cost` tokens. Returns how long
+# the caller has to wait for them; if that is more than max_wait nothing is
+# reserved, so refused callers do not push everyone else back.
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local max_wait = tonumber(ARGV[5])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens < cost then
+    wait = (cost - tokens) / rate
+end
+if wait <= max_wait then
+    tokens = tokens - cost
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+end
+return tostring(wait)
+"""
+
+# Adds `cost` to today's usage unless that would go over the limit (-1).
+QUOTA_LEDGER_LUA = """
+local cost = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local used = tonumber(redis.call('GET', KEYS[1]) or '0')
+if used + cost > limit then
+    return -1
+end
+used = redis.call('INCRBY', KEYS[1], cost)
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[3]))
+return used
+"""
+
+KEY_PREFIX = "stars:upstream"
+
+
+class UpstreamUnavailable(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class UpstreamPolicy:
+    name: str
+    rate: float  # tokens per second
+    burst: int
+    max_wait: float = 2.0
+    daily_quota: Optional[int] = None
+    # Quota days follow the upstream's billing clock
+    quota_timezone: str = "UTC"
+    failure_threshold: int = 5
+    cooldown: float = 30.0
+
+
+POLICIES: Dict[str, UpstreamPolicy] = {
+    "apple_music": UpstreamPolicy("Apple Music", rate=20, burst=40),
+    # The Search API allows roughly 20 calls a minute per IP before throttling
+    "itunes": UpstreamPolicy("iTunes", rate=1, burst=20),
+    "youtube": UpstreamPolicy(
+        "YouTube", rate=10, burst=20,
+        daily_quota=config('YOUTUBE_DAILY_QUOTA', default=10000, cast=int),
+        quota_timezone="America/Los_Angeles",
+    ),
+}
+
+# Quota units per call; endpoints not listed cost 1
+QUOTA_COSTS = {
+    "youtube.search": 100,
+}
+
+
+def policy_for(endpoint: str) -> Optional[UpstreamPolicy]:
+    return POLICIES.get(endpoint.split(".", 1)[0])
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() >= self.retry_at:
+                # Let exactly one trial call through
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def abandon_trial(self) -> None:
+        # The trial call never reached the upstream; let the next caller try
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+                self.retry_at = time.monotonic()
+
+    def record_failure(self, retry_after: Optional[float] = None) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold or retry_after:
+                self.state = self.OPEN
+                self.retry_at = time.monotonic() + max(self.cooldown, retry_after or 0)
+
+
+class _LocalLimits:
+    """Per-process stand-in for the Redis bucket and ledger."""
+
+    def __init__(self):
+        self.buckets: Dict[str, tuple] = {}
+        self.ledgers: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, key: str, rate: float, burst: float, cost: float, max_wait: float) -> float:
+        with self._lock:
+            now = time.time()
+            tokens, ts = self.buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + max(0.0, now - ts) * rate)
+            wait = (cost - tokens) / rate if tokens < cost else 0.0
+            if wait <= max_wait:
+                tokens -= cost
+            self.buckets[key] = (tokens, now)
+            return wait
+
+    def spend(self, key: str, cost: int, limit: int) -> bool:
+        with self._lock:
+            used = self.ledgers.get(key, 0)
+            if used + cost > limit:
+                return False
+            self.ledgers[key] = used + cost
+            return True
+
+
+_local = _LocalLimits()
+_breakers: Dict[str, CircuitBreaker] = {}
+_events: Dict[str, Counter] = defaultdict(Counter)
+_scripts: Dict[str, Any] = {}
+_redis_warned = False
+
+
+def breaker_for(upstream: str) -> CircuitBreaker:
+    breaker = _breakers.get(upstream)
+    if breaker is None:
+        policy = POLICIES[upstream]
+        breaker = _breakers.setdefault(upstream, CircuitBreaker(policy.failure_threshold, policy.cooldown))
+    return breaker
+
+
+def _redis_script(name: str, source: str):
+    script = _scripts.get(name)
+    if script is None:
+        from django_redis import get_redis_connection
+        script = _scripts[name] = get_redis_connection("default").register_script(source)
+    return script
+
+
+def _run_script(name: str, source: str, key: str, args: list):
+    """Returns the script result, or None when Redis cannot be used."""
+    global _redis_warned
+    try:
+        return _redis_script(name, source)(keys=[key], args=args)
+    except Exception as e:
+        if not _redis_warned:
+            print(f"Upstream limits falling back to per-process state: {e}")
+            _redis_warned = True
+        return None
+
+
+def reserve_tokens(key: str, rate: float, burst: float, cost: float, max_wait: float) -> float:
+    """
+    Takes `cost` tokens from the shared bucket `key` (sync). Returns the wait
+    in seconds; if that is over max_wait nothing was taken.
+    """
+    result = _run_script("bucket", TOKEN_BUCKET_LUA, key, [rate, burst, time.time(), cost, max_wait])
+    if result is None:
+        return _local.reserve(key, rate, burst, cost, max_wait)
+    return float(result)
+
+
+def _reserve_tokens(upstream: str, policy: UpstreamPolicy, max_wait: float) -> float:
+    return reserve_tokens(f"{KEY_PREFIX}:bucket:{upstream}", policy.rate, policy.burst, 1, max_wait)
+
+
+def _spend_quota(upstream: str, policy: UpstreamPolicy, cost: int) -> bool:
+    day = datetime.now(ZoneInfo(policy.quota_timezone)).strftime("%Y%m%d")
+    key = f"{KEY_PREFIX}:quota:{upstream}:{day}"
+    result = _run_script("quota", QUOTA_LEDGER_LUA, key, [cost, policy.daily_quota, 2 * 86400])
+    if result is None:
+        return _local.spend(key, cost, policy.daily_quota)
+    return int(result) >= 0
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return float(response.headers.get("retry-after", ""))
+    except ValueError:
+        return None
+
+
+async def acquire(endpoint: str, max_wait: Optional[float] = None) -> None:
+    """Waits for permission to call `endpoint`, or raises UpstreamUnavailable."""
+    policy = policy_for(endpoint)
+    if policy is None:
+        return
+    upstream = endpoint.split(".", 1)[0]
+
+    if not breaker_for(upstream).allow():
+        _events[upstream]["circuit_open"] += 1
+        raise UpstreamUnavailable(f"{policy.name} is temporarily unavailable.")
+
+    try:
+        max_wait = policy.max_wait if max_wait is None else max_wait
+        wait = await sync_to_async(_reserve_tokens, thread_sensitive=False)(upstream, policy, max_wait)
+        if wait > max_wait:
+            _events[upstream]["rate_limited"] += 1
+            raise UpstreamUnavailable(f"{policy.name} is busy, try again shortly.")
+
+        if policy.daily_quota is not None:
+            cost = QUOTA_COSTS.get(endpoint, 1)
+            if not await sync_to_async(_spend_quota, thread_sensitive=False)(upstream, policy, cost):
+                _events[upstream]["quota_exhausted"] += 1
+                raise UpstreamUnavailable(f"{policy.name} quota for today is used up.")
+
+        if wait > 0:
+            await asyncio.sleep(wait)
+    except BaseException:
+        breaker_for(upstream).abandon_trial()
+        raise
+
+
+def record_response(endpoint: str, response: Optional[httpx.Response]) -> None:
+    """Feeds the outcome of a call (None for a transport error) to the circuit breaker."""
+    if policy_for(endpoint) is None:
+        return
+    upstream = endpoint.split(".", 1)[0]
+    breaker = breaker_for(upstream)
+    if response is None or response.status_code >= 500:
+        breaker.record_failure()
+    elif response.status_code == 429:
+        breaker.record_failure(retry_after=_retry_after(response))
+    else:
+        breaker.record_success()
+
+
+async def guarded_get(client: httpx.AsyncClient, endpoint: str, url: str, *,
+                      params: Optional[Dict[str, Any]] = None,
+                      headers: Optional[Dict[str, str]] = None,
+                      max_wait: Optional[float] = None) -> httpx.Response:
+    await acquire(endpoint, max_wait=max_wait)
+    try:
+        response = await client.get(url, params=params, headers=headers)
+    except httpx.TransportError:
+        record_response(endpoint, None)
+        raise
+    except BaseException:
+        if policy_for(endpoint) is not None:
+            breaker_for(endpoint.split(".", 1)[0]).abandon_trial()
+        raise
+    record_response(endpoint, response)
+    return response
+
+
+def snapshot() -> Dict[str, Dict[str, Any]]:
+    """Circuit state and refusal counters per upstream, for this worker."""
+    return {
+        upstream: {
+            "circuit": breaker_for(upstream).state,
+            "consecutive_failures": breaker_for(upstream).failures,
+            **_events[upstream],
+        }
+        for upstream in POLICIES
+    }
@@ -1,20 +1,41 @@
-import httpx
 import re
 import io
 import asyncio
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Set
 from decouple import config
-from PIL import Image
 from asgiref.sync import sync_to_async
-from STARS.models import MusicVideo
+from django.core.cache import cache
+from STARS.models import MusicVideo, PerformanceVideo
+from STARS.utils.cache import CacheKeys
+from STARS.utils.colors import average_color
+from .http import get_client
+from .response_cache import cached_get
+from .upstream_guard import UpstreamUnavailable
 
 YOUTUBE_API_URL = "https://www.googleapis.com/youtube/v3"
 YOUTUBE_API_KEY = config("YOUTUBE_API_KEY")
 
+# The `videos` endpoint accepts at most 50 IDs per call
+VIDEOS_BATCH_SIZE = 50
+
+# A video's thumbnail colour never changes
+THUMBNAIL_COLOR_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def existing_video_ids(video_ids: List[str]) -> Set[str]:
+    """The IDs already saved as a music or performance video, in one UNION query."""
+    if not video_ids:
+        return set()
+    music_videos = MusicVideo.objects.filter(youtube_id__in=video_ids).values_list('youtube_id', flat=True)
+    performance_videos = PerformanceVideo.objects.filter(youtube_id__in=video_ids).values_list('youtube_id', flat=True)
+    return set(music_videos.union(performance_videos))
+
 
 class YoutubeService:
-    def __init__(self):
-        self.client = httpx.AsyncClient()
+    @property
+    def client(self):
+        # Shared, pooled client for the current event loop
+        return get_client("youtube")
 
     async def get_video_by_url(self, url: str) -> Dict[str, Any]:
         """
@@ -33,36 +54,65 @@ class YoutubeService:
         """
         Fetches full details for a single video ID.
         """
+        videos = await self.get_videos_by_ids([video_id])
+        return videos[0] if videos else None
+
+    async def get_videos_by_ids(self, video_ids: List[str]) -> List[Dict[str, Any]]:
+        """
+        Fetches full details for many videos, VIDEOS_BATCH_SIZE IDs per `videos`
+        call, and extracts all their thumbnail colors concurrently.
+        Unknown or private videos are left out.
+        """
+        video_ids = list(dict.fromkeys(v for v in video_ids if v))
+        if not video_ids:
+            return []
+
         videos_url = f"{YOUTUBE_API_URL}/videos"
-        videos_params = {
-            "part": "snippet,contentDetails,statistics",
-            "id": video_id,
-            "key": YOUTUBE_API_KEY
-        }
 
-        response = await self.client.get(videos_url, params=videos_params)
-        response.raise_for_status()
-        data = response.json()
+        async def _fetch_batch(batch: List[str]) -> List[Dict[str, Any]]:
+            videos_params = {
+                "part": "snippet,contentDetails,statistics",
+                "id": ",".join(batch),
+                "key": YOUTUBE_API_KEY
+            }
+            response = await cached_get(self.client, "youtube.videos", videos_url, params=videos_params)
+            response.raise_for_status()
+            return response.json().get("items", [])
+
+        batches = await asyncio.gather(*(
+            _fetch_batch(video_ids[i:i + VIDEOS_BATCH_SIZE])
+            for i in range(0, len(video_ids), VIDEOS_BATCH_SIZE)
+        ))
+        items = [item for batch in batches for item in batch]
 
-        items = data.get("items", [])
-        if not items:
-            return None
+        results = []
+        color_thumbnails = {}
+        for item in items:
+            video = self._video_from_item(item)
+            color_thumbnails[video["id"]] = self._color_thumbnail_url(item.get("snippet", {}).get("thumbnails", {}))
+            results.append(video)
+
+        # Cached per video, the rest extracted concurrently
+        colors = await self._get_primary_colors(color_thumbnails)
+        for video in results:
+            video["primary_color"] = colors[video["id"]]
+
+        return results
 
-        item = items[0]
+    def _video_from_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Maps a `videos` API item to our video dict (without the color)."""
         snippet = item.get("snippet", {})
         content_details = item.get("contentDetails", {})
         statistics = item.get("statistics", {})
+        video_id = item.get("id")
 
-        # Duration and Thumbnails
+        # Duration and best thumbnail
         duration_ms = self._parse_duration_to_ms(content_details.get("duration", ""))
         thumbnails = snippet.get("thumbnails", {})
         thumbnail_url = (thumbnails.get("maxres", {}).get("url") or
                          thumbnails.get("high", {}).get("url") or
                          thumbnails.get("medium", {}).get("url"))
 
-        # Primary Color Extraction
-        primary_color = await self._get_primary_color(thumbnail_url)
-
         return {
             "id": video_id,
             "title": snippet.get("title"),
@@ -72,9 +122,12 @@ class YoutubeService:
             "length_ms": duration_ms,
             "view_count": int(statistics.get("viewCount", 0)),
             "url": f"https://www.youtube.com/watch?v={video_id}",
-            "primary_color": primary_color,
         }
 
+    def extract_video_ids(self, urls: List[str]) -> List[str]:
+        """Video IDs of the parseable URLs, deduplicated, in order."""
+        return list(dict.fromkeys(filter(None, (self._extract_video_id(url) for url in urls))))
+
     def _extract_video_id(self, url: str) -> str:
         """
         Extracts the video ID from various YouTube URL formats.
@@ -104,7 +157,12 @@ class YoutubeService:
             "key": YOUTUBE_API_KEY
         }
 
-        response = await self.client.get(search_url, params=search_params)
+        try:
+            response = await cached_get(self.client, "youtube.search", search_url, params=search_params)
+        except UpstreamUnavailable as e:
+            # Out of quota or YouTube is failing: no results instead of an error
+            print(f"YouTube search skipped: {e}")
+            return []
         response.raise_for_status()
         search_data = response.json()
 
@@ -118,13 +176,7 @@ class YoutubeService:
             return []
 
         # 2. Filter out videos that are already in the database
-        #    Checking 'youtube_id' field against the fetched IDs
-        @sync_to_async
-        def get_existing_ids(ids):
-            # Assumes the field name in the model is 'youtube_id'
-            return list(MusicVideo.objects.filter(youtube_id__in=ids).values_list('youtube_id', flat=True))
-
-        existing_ids = set(await get_existing_ids(video_ids))
+        existing_ids = await sync_to_async(existing_video_ids)(video_ids)
 
         # Keep only new IDs
         filtered_ids = [vid for vid in video_ids if vid not in existing_ids]
@@ -132,83 +184,50 @@ class YoutubeService:
         if not filtered_ids:
             return []
 
-        # 3. Call Videos API to get full details for the new videos
-        videos_url = f"{YOUTUBE_API_URL}/videos"
-        videos_params = {
-            "part": "snippet,contentDetails,statistics",
-            "id": ",".join(filtered_ids),
-            "key": YOUTUBE_API_KEY
-        }
+        # 3. Full details (and colors) for the new videos
+        return await self.get_videos_by_ids(filtered_ids)
+
+    def _color_thumbnail_url(self, thumbnails: Dict[str, Any]) -> str:
+        """
+        The smallest thumbnail that is enough for an average colour. "medium"
+        (320x180) comes first because "default" and "high" are 4:3 crops
+        letterboxed with black bars, which would darken the result.
+        """
+        for size in ("medium", "default", "high", "standard", "maxres"):
+            url = thumbnails.get(size, {}).get("url")
+            if url:
+                return url
+        return None
 
-        vid_response = await self.client.get(videos_url, params=videos_params)
-        vid_response.raise_for_status()
-        vid_data = vid_response.json()
+    async def _get_primary_colors(self, thumbnail_urls: Dict[str, str]) -> Dict[str, str]:
+        """Primary colors by video ID, from the cache where possible."""
+        keys = {video_id: f"{CacheKeys.YOUTUBE_THUMBNAIL_COLOR}:{video_id}" for video_id in thumbnail_urls}
+        cached = await sync_to_async(cache.get_many)(list(keys.values()))
+        colors = {video_id: cached[key] for video_id, key in keys.items() if key in cached}
 
-        results = []
-        color_tasks = []
-
-        # 4. Process details and prepare color extraction tasks
-        for item in vid_data.get("items", []):
-            snippet = item.get("snippet", {})
-            content_details = item.get("contentDetails", {})
-            statistics = item.get("statistics", {})
-            video_id = item.get("id")
-
-            # Parse duration
-            duration_iso = content_details.get("duration", "")
-            duration_ms = self._parse_duration_to_ms(duration_iso)
-
-            # Get best thumbnail
-            thumbnails = snippet.get("thumbnails", {})
-            thumbnail_url = thumbnails.get("maxres", {}).get("url") or \
-                            thumbnails.get("high", {}).get("url") or \
-                            thumbnails.get("medium", {}).get("url")
-
-            # Queue up the color extraction
-            color_tasks.append(self._get_primary_color(thumbnail_url))
-
-            # Build initial result object
-            results.append({
-                "id": video_id,
-                "title": snippet.get("title"),
-                "thumbnail": thumbnail_url,
-                "channel_title": snippet.get("channelTitle"),
-                "published_at": snippet.get("publishedAt"),
-                "length_ms": duration_ms,
-                "view_count": int(statistics.get("viewCount", 0)),
-                "url": f"https://www.youtube.com/watch?v={video_id}",
-            })
-
-        # 5. Run all color extraction tasks concurrently
-        colors = await asyncio.gather(*color_tasks)
-
-        # 6. Assign colors to results
-        for result, color in zip(results, colors):
-            result["primary_color"] = color
+        missing = [video_id for video_id in thumbnail_urls if video_id not in colors]
+        extracted = await asyncio.gather(*(self._get_primary_color(thumbnail_urls[v]) for v in missing))
+        colors.update(zip(missing, extracted))
 
-        return results
+        # Failures fall back to black and are retried next time
+        fresh = {keys[v]: color for v, color in zip(missing, extracted) if color != "000000"}
+        if fresh:
+            await sync_to_async(cache.set_many)(fresh, THUMBNAIL_COLOR_TIMEOUT)
+        return colors
 
     async def _get_primary_color(self, image_url: str) -> str:
-        """Downloads the image and calculates the dominant color."""
+        """Downloads the image and calculates its average color."""
         if not image_url:
             return "000000"
 
         try:
-            response = await self.client.get(image_url)
+            response = await get_client("images").get(image_url)
             if response.status_code != 200:
                 return "000000"
 
-            # Open image with PIL
-            image = Image.open(io.BytesIO(response.content))
-
-            # Resize to a smaller size to speed up processing
-            image = image.resize((150, 150))
-
-            # Reduce to a palette of 1 color to get the dominant one
-            dominant_color = image.quantize(colors=1).convert('RGB').getpixel((0, 0))
-
-            # Convert RGB tuple to Hex string
-            return '{:02x}{:02x}{:02x}'.format(*dominant_color)
+            # Decoding and averaging are CPU work, kept off the event loop
+            color = await sync_to_async(average_color, thread_sensitive=False)(io.BytesIO(response.content))
+            return color.lstrip("#") if color else "000000"
 
         except Exception:
             # Fallback to black if anything fails
@@ -230,6 +249,3 @@ class YoutubeService:
 
         total_seconds = (hours * 3600) + (minutes * 60) + seconds
         return total_seconds * 1000
-
-    async def close(self):
-        await self.client.aclose()
\ No newline at end of file
@@ -1,10 +1,14 @@
 """
 Signal handlers for cache invalidation and popularity scoring.
 """
-from django.db.models.signals import post_save, post_delete
+from django.db.backends.signals import connection_created
+from django.db import IntegrityError, transaction
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
 from STARS import models
 from STARS.utils.cache import invalidate_pattern
+from STARS.graphql.operation_cache import bump_tags, tags_for_change
+from STARS.graphql.instrumentation import install_query_recorder
 from asgiref.sync import async_to_sync
 from django.db.models import Count, Q, F
 from django.utils import timezone
@@ -44,4 +48,94 @@ def decrease_popularity(sender, instance, **kwargs):
             target.popularity_score = F('popularity_score') - 11
             target.save(update_fields=['popularity_score'])
     except Exception:
-        pass
\ No newline at end of file
+        pass
+
+def _sync_participants_keys(conversation_ids):
+    through = models.Conversation.participants.through
+    for conversation_id in conversation_ids:
+        user_ids = list(
+            through.objects.filter(conversation_id=conversation_id).values_list('user_id', flat=True)
+        )
+        key = models.Conversation.build_participants_key(user_ids) if user_ids else None
+        conversation = models.Conversation.objects.filter(pk=conversation_id).exclude(participants_key=key)
+        try:
+            with transaction.atomic():
+                conversation.update(participants_key=key)
+        except IntegrityError:
+            # Another conversation already has exactly these participants (the
+            # duplicates 0069 left unkeyed, or this edit made two alike); it keeps the key
+            conversation.update(participants_key=None)
+
+
+@receiver(m2m_changed, sender=models.Conversation.participants.through)
+def sync_conversation_participants_key(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep Conversation.participants_key in step with the participants M2M."""
+    if action == "pre_clear" and reverse:
+        # user.conversations.clear() gives no IDs afterwards; note which conversations lose them
+        instance._cleared_conversation_ids = list(
+            sender.objects.filter(user_id=instance.pk).values_list('conversation_id', flat=True)
+        )
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if reverse:
+        # Edited from the User side: pk_set holds conversation IDs (None on clear)
+        conversation_ids = pk_set if pk_set is not None else instance.__dict__.pop('_cleared_conversation_ids', [])
+    else:
+        conversation_ids = [instance.pk]
+    _sync_participants_keys(conversation_ids)
+
+
+@receiver(pre_delete, sender=models.User)
+def note_deleted_users_conversations(sender, instance, **kwargs):
+    # The cascade removes the user's participant rows without m2m_changed
+    instance._deleted_conversation_ids = list(
+        models.Conversation.participants.through.objects.filter(user_id=instance.pk).values_list(
+            'conversation_id', flat=True
+        )
+    )
+
+
+@receiver(post_delete, sender=models.User)
+def sync_deleted_users_conversations(sender, instance, **kwargs):
+    _sync_participants_keys(instance.__dict__.pop('_deleted_conversation_ids', []))
+
+
+def _in_response_cache(sender) -> bool:
+    return sender._meta.app_label == "STARS" or sender is models.User
+
+
+def _bump_response_tags(tags):
+    try:
+        bump_tags(tags)
+    except Exception as e:
+        # Cached responses then live out their TTL
+        print(f"Could not invalidate cached GraphQL responses: {e}")
+
+
+@receiver(post_save)
+def invalidate_responses_on_save(sender, instance, created, raw=False, **kwargs):
+    """Drop cached GraphQL responses that contain the saved row (see graphql/operation_cache.py)."""
+    if raw or not _in_response_cache(sender):
+        return
+    _bump_response_tags(tags_for_change(instance, created_or_deleted=created))
+
+
+@receiver(post_delete)
+def invalidate_responses_on_delete(sender, instance, **kwargs):
+    if _in_response_cache(sender):
+        _bump_response_tags(tags_for_change(instance, created_or_deleted=True))
+
+
+@receiver(m2m_changed)
+def invalidate_responses_on_m2m(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear") or not _in_response_cache(type(instance)):
+        return
+    tags = {f"{type(instance).__name__}:{instance.pk}"}
+    tags.update(f"{model.__name__}:{pk}" for pk in (pk_set or ()))
+    _bump_response_tags(tags)
+
+
+# SQL accounting for sampled GraphQL operations
+connection_created.connect(install_query_recorder, dispatch_uid="stars_graphql_query_recorder")
@@ -1,3 +1,535 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from graphql import parse
+from django.utils import timezone
+from strawberry.django.context import StrawberryDjangoContext
+
+from STARS import models
+from STARS.graphql.counts import plan_rows
+from STARS.graphql.operation_cache import tags_for
+from STARS.graphql.persisted_queries import query_hash
+from STARS.graphql.query_cost import analyze, budget_for, client_address
+from STARS.graphql.schema import schema
+from STARS.services import jobs, media_uploads, podcast_feeds, podcast_import
+from STARS.services.project_import import import_project
+
+# Redis-free caches, no response cache or cost throttle, no metrics pusher
+GRAPHQL_TEST_SETTINGS = dict(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    GRAPHQL_RESPONSE_CACHE_TTL=0,
+    GRAPHQL_COST_RATE=0,
+    METRICS_PUSH_INTERVAL=0,
+)
+
+
+@override_settings(**GRAPHQL_TEST_SETTINGS)
+class GraphQLQueryCountTestCase(TestCase):
+    """
+    Runs operations through schema.execute and counts their SQL queries.
+    async_to_sync brings the resolvers' sync_to_async calls back to this
+    thread, so its connection (and its test transaction) sees all of them.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        # bulk_create skips the save signals, which talk to Redis
+        cls.users = models.User.objects.bulk_create([models.User(username=f"count-{i}") for i in range(5)])
+        artist_type = ContentType.objects.get_for_model(models.Artist)
+        cls.reviews = models.Review.objects.bulk_create([
+            models.Review(user=cls.users[i % 5], title=f"Review {i}", stars=3, content_type=artist_type, object_id=1)
+            for i in range(30)
+        ])
+        models.Comment.objects.bulk_create([
+            models.Comment(review=review, user=cls.users[i % 5], text=f"Comment {i}")
+            for review in cls.reviews for i in range(3)
+        ])
+        for review in cls.reviews:
+            review.liked_by.add(*cls.users[:3])
+
+    def _context(self, user=None, **headers):
+        request = RequestFactory().post("/graphql/", **headers)
+        request.user = user or AnonymousUser()
+        return StrawberryDjangoContext(request=request, response=HttpResponse())
+
+    def count_queries(self, query: str, variables: dict, user=None) -> int:
+        with CaptureQueriesContext(connection) as captured:
+            result = async_to_sync(schema.execute)(
+                query, variable_values=variables, context_value=self._context(user),
+            )
+        self.assertIsNone(result.errors)
+        return len(captured.captured_queries)
+
+    def assertConstantInPageSize(self, query: str, sizes=(5, 20), user=None, **variables):
+        counts = [self.count_queries(query, {"first": size, **variables}, user) for size in sizes]
+        self.assertEqual(counts[0], counts[1], f"queries per page size {dict(zip(sizes, counts))}")
+
+
+class NestedConnectionTests(GraphQLQueryCountTestCase):
+    def test_nested_comments_are_prefetched(self):
+        self.assertConstantInPageSize("""
+            query ($first: Int!) { reviews(first: $first) { edges { node {
+                id comments(first: 3) { totalCount edges { node { id } } }
+            } } } }
+        """)
+
+    def test_nested_users_are_prefetched(self):
+        self.assertConstantInPageSize("""
+            query ($first: Int!) { reviews(first: $first) { edges { node {
+                id likedBy(first: 3) { edges { node { id } } }
+            } } } }
+        """)
+
+
+class ConversationSeekTests(GraphQLQueryCountTestCase):
+    QUERY = """
+        query ($first: Int!, $after: String) { conversations(first: $first, after: $after) {
+            edges { node { id } } pageInfo { endCursor }
+        } }
+    """
+
+    def test_pages_seek_on_latest_message_time(self):
+        start = timezone.now()
+        conversations = models.Conversation.objects.bulk_create([
+            # Two per timestamp, so the pk settles the order
+            models.Conversation(latest_message_time=start - timedelta(minutes=i // 2)) for i in range(10)
+        ])
+        newest_first = sorted(conversations, key=lambda c: (c.latest_message_time, c.pk), reverse=True)
+
+        ids = []
+        after = None
+        with CaptureQueriesContext(connection) as captured:
+            for _ in range(4):
+                result = async_to_sync(schema.execute)(
+                    self.QUERY, variable_values={"first": 3, "after": after}, context_value=self._context(),
+                )
+                self.assertIsNone(result.errors)
+                page = result.data["conversations"]
+                ids += [edge["node"]["id"] for edge in page["edges"]]
+                after = page["pageInfo"]["endCursor"]
+
+        self.assertEqual(ids, [str(c.pk) for c in newest_first])
+        row_comparison = '("STARS_conversation"."latest_message_time", "STARS_conversation"."id") <'
+        self.assertTrue(any(row_comparison in query["sql"] for query in captured.captured_queries))
+
+
+class ViewerStateTests(GraphQLQueryCountTestCase):
+    FEED_QUERY = """
+        query Feed($first: Int!) { reviews(first: $first) { edges { node {
+            id likedByCurrentUser dislikedByCurrentUser isRereview
+            comments(first: 3) { edges { node { id likedByCurrentUser dislikedByCurrentUser } } }
+        } } } }
+    """
+
+    def test_feed_page_is_constant_in_page_size(self):
+        self.assertConstantInPageSize(self.FEED_QUERY, user=self.users[0])
+
+    def test_feed_page_reports_viewer_state(self):
+        result = async_to_sync(schema.execute)(
+            self.FEED_QUERY, variable_values={"first": 30}, context_value=self._context(self.users[0]),
+        )
+        self.assertIsNone(result.errors)
+        liked = [edge["node"]["likedByCurrentUser"] for edge in result.data["reviews"]["edges"]]
+        # users[0] likes every review (setUpTestData)
+        self.assertEqual(liked, [True] * 30)
+
+
+class ResolverPathTests(GraphQLQueryCountTestCase):
+    def test_aliases_share_their_field_path(self):
+        query = """
+            query { first: reviews(first: 2) { edges { node { author: user { id } } } }
+                    second: reviews(first: 2) { ...Page } }
+            fragment Page on ReviewKeysetConnection { edges { node { user { id } } } }
+        """
+        with override_settings(DEBUG=True):
+            result = async_to_sync(schema.execute)(query, context_value=self._context(HTTP_X_STARS_TIMING="1"))
+        self.assertIsNone(result.errors)
+        paths = {resolver["path"] for resolver in result.extensions["timing"]["resolvers"]}
+        self.assertEqual(paths, {"reviews", "reviews.edges.node.user"})
+
+
+class YoutubeUrlsTests(GraphQLQueryCountTestCase):
+    def test_too_many_urls_are_refused(self):
+        urls = [f"https://youtu.be/video{i:06d}" for i in range(51)]
+        with CaptureQueriesContext(connection) as captured:
+            result = async_to_sync(schema.execute)(
+                "query ($urls: [String!]!) { getYoutubeVideosByUrls(urls: $urls) { id } }",
+                variable_values={"urls": urls}, context_value=self._context(),
+            )
+        self.assertIn("At most 50 URLs", result.errors[0].message)
+        self.assertEqual(len(captured.captured_queries), 0)
+
+
+class PlanRowsTests(TestCase):
+    PLAN = {"Plan": {"Node Type": "Seq Scan", "Plan Rows": 1234}}
+
+    def test_plan_as_django_returns_it_from_psycopg(self):
+        # psycopg decodes the json column to a list; Django json.dumps each element
+        self.assertEqual(plan_rows(json.dumps(self.PLAN)), 1234)
+
+    def test_plan_as_raw_explain_text(self):
+        self.assertEqual(plan_rows(json.dumps([self.PLAN])), 1234)
+
+
+@override_settings(**GRAPHQL_TEST_SETTINGS)
+# Saving the project clears the music search cache, which lives in Redis
+@mock.patch("STARS.signals.invalidate_pattern", new=mock.AsyncMock())
+class ProjectImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = models.User.objects.create(username="importer")
+
+    def setUp(self):
+        # The cover's content type is looked up once per process, not per import
+        ContentType.objects.get_for_model(models.Project)
+
+    def _payload(self, prefix: str, tracks: int):
+        """A ProjectCreateInput-shaped album whose every track features a new artist."""
+        songs = [
+            SimpleNamespace(
+                position=i + 1, disc_number=1, song_id=None, apple_music_id=f"{prefix}-song-{i}",
+                title=f"Track {i}", length=180000, preview_url="", release_date=datetime(2024, 1, 1),
+                is_out=True, apple_music_url="", genres=["Pop", f"{prefix} Genre {i}", "Music"],
+                artists_apple_music_ids=[f"{prefix}-main", f"{prefix}-feat-{i}"],
+            )
+            for i in range(tracks)
+        ]
+        data = SimpleNamespace(
+            apple_music_id=f"{prefix}-album", title="Album", is_single=False, genres=["Pop", "Music"],
+            number_of_songs=tracks, release_date=datetime(2024, 1, 1), record_label="Label",
+            alternative_versions=[], apple_music_url="", artists_apple_music_ids=[f"{prefix}-main"], songs=songs,
+        )
+        artists_data = {
+            am_id: {
+                "name": am_id, "picture": "", "primary_color": None, "secondary_color": None,
+                "apple_music_url": "", "genres": ["Pop", "Music"],
+            }
+            for am_id in [f"{prefix}-main"] + [f"{prefix}-feat-{i}" for i in range(tracks)]
+        }
+        return data, ("https://example.com/cover.jpg", "#000000", "#ffffff"), artists_data
+
+    def count_queries(self, prefix: str, tracks: int) -> int:
+        data, cover_data, artists_data = self._payload(prefix, tracks)
+        with CaptureQueriesContext(connection) as captured:
+            project = import_project(data, cover_data, artists_data, self.user)
+        self.assertEqual(project.project_songs.count(), tracks)
+        return len(captured.captured_queries)
+
+    def test_query_count_is_constant_in_track_count(self):
+        self.assertEqual(self.count_queries("small", 3), self.count_queries("large", 30))
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class JobTests(TestCase):
+    def _running_job(self, attempts: int, locked_for: timedelta) -> models.Job:
+        return models.Job.objects.create(
+            kind="test", status=models.Job.JobStatus.RUNNING, attempts=attempts, max_attempts=3,
+            locked_by="lost-worker", locked_at=timezone.now() - locked_for,
+        )
+
+    def test_stale_jobs_are_requeued_until_out_of_attempts(self):
+        retried = self._running_job(attempts=1, locked_for=timedelta(hours=1))
+        exhausted = self._running_job(attempts=3, locked_for=timedelta(hours=1))
+        alive = self._running_job(attempts=3, locked_for=timedelta(minutes=1))
+
+        self.assertCountEqual(jobs.requeue_stale_jobs(), [retried.pk, exhausted.pk])
+
+        retried.refresh_from_db()
+        exhausted.refresh_from_db()
+        alive.refresh_from_db()
+        self.assertEqual(retried.status, models.Job.JobStatus.QUEUED)
+        self.assertEqual(exhausted.status, models.Job.JobStatus.FAILED)
+        self.assertIsNotNone(exhausted.date_finished)
+        self.assertEqual(alive.status, models.Job.JobStatus.RUNNING)
+
+    def test_heartbeat_refreshes_the_lock_while_the_handler_runs(self):
+        async def handler(ctx, payload):
+            await asyncio.sleep(0.2)
+            job = await database_sync_to_async(models.Job.objects.get)(pk=ctx.job.pk)
+            return {"locked_at": job.locked_at.isoformat()}
+
+        with mock.patch.dict(jobs.HANDLERS, {"test": handler}), \
+                mock.patch.object(jobs, "HEARTBEAT_INTERVAL", timedelta(seconds=0.05)):
+            models.Job.objects.create(kind="test")
+            [job] = jobs.claim_jobs("worker", 1)
+            async_to_sync(jobs.run_job)(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, models.Job.JobStatus.SUCCEEDED)
+        self.assertGreater(datetime.fromisoformat(job.result["locked_at"]), job.date_started)
+
+    def test_swept_job_is_not_overwritten_by_its_old_worker(self):
+        async def handler(ctx, payload):
+            # Meanwhile the job was swept and claimed by another worker
+            await database_sync_to_async(models.Job.objects.filter(pk=ctx.job.pk).update)(locked_by="other")
+            return {}
+
+        with mock.patch.dict(jobs.HANDLERS, {"test": handler}):
+            models.Job.objects.create(kind="test")
+            [job] = jobs.claim_jobs("worker", 1)
+            async_to_sync(jobs.run_job)(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, models.Job.JobStatus.RUNNING)
+        self.assertEqual(job.locked_by, "other")
+
+    def test_progress_leaves_a_swept_job_alone(self):
+        async def handler(ctx, payload):
+            await database_sync_to_async(models.Job.objects.filter(pk=ctx.job.pk).update)(
+                locked_by="other", locked_at=None
+            )
+            await ctx.progress(0.5, "halfway")
+            return {}
+
+        with mock.patch.dict(jobs.HANDLERS, {"test": handler}):
+            models.Job.objects.create(kind="test")
+            [job] = jobs.claim_jobs("worker", 1)
+            async_to_sync(jobs.run_job)(job)
+
+        job.refresh_from_db()
+        self.assertEqual((job.progress, job.locked_at), (0, None))
+
+    def test_reports_are_written_before_the_outcome(self):
+        async def handler(ctx, payload):
+            for i in range(1, 5):
+                ctx.report(i / 10, f"step {i}")
+            raise jobs.PermanentJobError("stop")
+
+        with mock.patch.dict(jobs.HANDLERS, {"test": handler}):
+            models.Job.objects.create(kind="test")
+            [job] = jobs.claim_jobs("worker", 1)
+            async_to_sync(jobs.run_job)(job)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress, job.progress_message), (models.Job.JobStatus.FAILED, 0.4, "step 4"))
+
+class ClientAddressTests(TestCase):
+    def _request(self, forwarded=None):
+        extra = {"HTTP_X_FORWARDED_FOR": forwarded} if forwarded is not None else {}
+        return RequestFactory().post("/graphql/", REMOTE_ADDR="10.0.0.1", **extra)
+
+    @override_settings(GRAPHQL_TRUSTED_PROXY_COUNT=1)
+    def test_spoofed_entries_are_ignored(self):
+        # The client sent "6.6.6.6"; our proxy appended the address it connected from
+        self.assertEqual(client_address(self._request("6.6.6.6, 203.0.113.7")), "203.0.113.7")
+
+    @override_settings(GRAPHQL_TRUSTED_PROXY_COUNT=2)
+    def test_outermost_trusted_proxy(self):
+        self.assertEqual(client_address(self._request("6.6.6.6, 203.0.113.7, 10.1.1.1")), "203.0.113.7")
+
+    @override_settings(GRAPHQL_TRUSTED_PROXY_COUNT=2)
+    def test_fewer_hops_than_proxies_uses_the_peer(self):
+        self.assertEqual(client_address(self._request("203.0.113.7")), "10.0.0.1")
+
+    @override_settings(GRAPHQL_TRUSTED_PROXY_COUNT=0)
+    def test_no_proxies_uses_the_peer(self):
+        self.assertEqual(client_address(self._request("6.6.6.6")), "10.0.0.1")
+
+
+class OperationBudgetTests(TestCase):
+    FEED = "query Feed { reviews(first: 20) { edges { node { id } } } }"
+
+    def test_budget_follows_the_document(self):
+        with override_settings(GRAPHQL_MAX_COST=100, GRAPHQL_OPERATION_COST_BUDGETS={query_hash(self.FEED): 5000}):
+            self.assertEqual(budget_for(self.FEED), 5000)
+            # Another document under the same operation name gets the default
+            self.assertEqual(budget_for("query Feed { users(first: 100) { edges { node { id } } } }"), 100)
+
+
+class MediaUploadTests(TestCase):
+    def setUp(self):
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        spool_settings = override_settings(UPLOAD_SPOOL_DIR=spool_dir.name, UPLOAD_PENDING_TTL=3600)
+        spool_settings.enable()
+        self.addCleanup(spool_settings.disable)
+        self.spool_dir = spool_dir.name
+        self.user = models.User.objects.create(username="uploader")
+
+    def _append(self, upload, offset: int, body: bytes, length=None):
+        return media_uploads.append_chunk(
+            upload.pk, self.user, offset, len(body) if length is None else length, io.BytesIO(body).read
+        )
+
+    def test_chunks_are_appended_in_order(self):
+        upload = media_uploads.start_upload(self.user, "IMAGE", 6)
+        self._append(upload, 0, b"abc")
+        with self.assertRaises(media_uploads.UploadError):
+            self._append(upload, 0, b"abc")
+        upload = self._append(upload, 3, b"def")
+
+        self.assertEqual(upload.received_size, 6)
+        with open(upload.spool_path, "rb") as f:
+            self.assertEqual(f.read(), b"abcdef")
+        # Only the upload's own spool file is left
+        self.assertEqual(os.listdir(self.spool_dir), [os.path.basename(upload.spool_path)])
+
+    def test_short_chunk_is_discarded(self):
+        upload = media_uploads.start_upload(self.user, "IMAGE", 6)
+        with self.assertRaises(media_uploads.UploadError):
+            self._append(upload, 0, b"ab", length=3)
+
+        upload.refresh_from_db()
+        self.assertEqual(upload.received_size, 0)
+        self.assertEqual(os.listdir(self.spool_dir), [os.path.basename(upload.spool_path)])
+
+    def test_abandoned_uploads_expire(self):
+        abandoned = media_uploads.start_upload(self.user, "IMAGE", 6)
+        active = media_uploads.start_upload(self.user, "IMAGE", 6)
+        models.MediaUpload.objects.filter(pk=abandoned.pk).update(date_updated=timezone.now() - timedelta(hours=2))
+        orphan = os.path.join(self.spool_dir, "crashed" + media_uploads.CHUNK_SUFFIX)
+        open(orphan, "wb").close()
+        os.utime(orphan, (0, 0))
+
+        self.assertEqual(media_uploads.expire_stale_uploads(), (1, 2))
+
+        abandoned.refresh_from_db()
+        self.assertEqual(abandoned.status, models.MediaUpload.UploadStatus.FAILED)
+        self.assertEqual(os.listdir(self.spool_dir), [os.path.basename(active.spool_path)])
+
+
+@override_settings(**GRAPHQL_TEST_SETTINGS)
+class ParticipantsKeyTests(TestCase):
+    def test_clearing_a_users_conversations_updates_their_keys(self):
+        alice, bob, carol = models.User.objects.bulk_create([
+            models.User(username=name) for name in ("alice", "bob", "carol")
+        ])
+        conversation = models.Conversation.objects.create()
+        conversation.participants.add(alice, bob, carol)
+
+        carol.conversations.clear()
+
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.participants_key, models.Conversation.build_participants_key([alice.pk, bob.pk]))
+
+    def test_equal_participants_leave_the_key_to_the_first_conversation(self):
+        alice, bob, carol = models.User.objects.bulk_create([
+            models.User(username=name) for name in ("alice", "bob", "carol")
+        ])
+        pair, group = models.Conversation.objects.bulk_create([models.Conversation(), models.Conversation()])
+        pair.participants.add(alice, bob)
+        group.participants.add(alice, bob, carol)
+
+        group.participants.remove(carol)
+
+        pair.refresh_from_db()
+        group.refresh_from_db()
+        self.assertEqual(pair.participants_key, models.Conversation.build_participants_key([alice.pk, bob.pk]))
+        self.assertIsNone(group.participants_key)
+
+    def test_deleting_a_user_updates_their_conversations_keys(self):
+        alice, bob, carol = models.User.objects.bulk_create([
+            models.User(username=name) for name in ("alice", "bob", "carol")
+        ])
+        conversation = models.Conversation.objects.create()
+        conversation.participants.add(alice, bob, carol)
+
+        carol.delete()
+
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.participants_key, models.Conversation.build_participants_key([alice.pk, bob.pk]))
+
+
+
+def doubling_fragments(levels: int, on: str, leaf: str) -> str:
+    """Fragments that each spread the next one twice: 2**levels copies of `leaf` when expanded."""
+    fragments = [f"fragment F{i} on {on} {{ ...F{i + 1} ...F{i + 1} }}" for i in range(levels - 1)]
+    fragments.append(f"fragment F{levels - 1} on {on} {{ {leaf} }}")
+    return "\n".join(fragments)
+
+
+class QueryCostTests(TestCase):
+    PAGE = "query { reviews(first: 5) { ...F0 } }\n"
+    LEAF = "edges { node { user { id } } }"
+
+    def analyze(self, query: str, limit=None):
+        return analyze(schema._schema, parse(query), None, {}, limit)
+
+    def test_spreads_cost_like_inline_selections(self):
+        inline = self.analyze("query { reviews(first: 5) { %s %s } }" % (self.LEAF, self.LEAF))
+        spread = self.analyze(self.PAGE + doubling_fragments(2, "ReviewKeysetConnection", self.LEAF))
+        self.assertEqual((spread.cost, spread.depth), (inline.cost, inline.depth))
+
+    def test_repeated_spreads_are_not_walked_again(self):
+        start = time.perf_counter()
+        cost = self.analyze(self.PAGE + doubling_fragments(40, "ReviewKeysetConnection", self.LEAF))
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertEqual(cost.cost, 1 + 5 * 2 ** 39)
+
+    def test_walk_stops_over_the_limit(self):
+        cost = self.analyze(self.PAGE + doubling_fragments(40, "ReviewKeysetConnection", self.LEAF), limit=1000)
+        self.assertGreater(cost.cost, 1000)
+
+
+class ResponseTagTests(TestCase):
+    def test_repeated_spreads_are_not_walked_again(self):
+        query = "query { __typename reviews(first: 1) { ...F0 } }\n" + doubling_fragments(
+            40, "ReviewKeysetConnection", "edges { node { id } }"
+        )
+        data = {"__typename": "Query", "reviews": {"edges": [{"node": {"id": "1"}}]}}
+        start = time.perf_counter()
+        tags = tags_for(schema._schema, parse(query), None, data)
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertIn("type:Review", tags)
+        self.assertIn("Review:1", tags)
+
+
+class PodcastImportTests(TestCase):
+    ITEMS = [
+        {"collectionId": 1, "collectionName": "First", "genres": ["Comedy", "Podcasts"], "artworkUrl600": "https://a/1"},
+        {"collectionId": 2, "collectionName": "Second", "genres": ["News"], "artworkUrl600": "https://a/2"},
+    ]
+
+    def test_rows_a_concurrent_import_inserted_are_not_claimed(self):
+        resolve_genres = podcast_import.resolve_podcast_genres
+
+        def concurrent_import(names):
+            # Runs after the existing IDs were read, before the insert
+            models.Podcast.objects.bulk_create([models.Podcast(apple_podcasts_id="2", title="Second", host="Other")])
+            return resolve_genres(names)
+
+        with mock.patch.object(podcast_import, "resolve_podcast_genres", concurrent_import):
+            result = podcast_import.bulk_import_podcasts(self.ITEMS)
+
+        first = models.Podcast.objects.get(apple_podcasts_id="1")
+        self.assertEqual((result.created, result.skipped, result.genre_links), (1, 1, 1))
+        self.assertEqual(result.cover_jobs, [(first.pk, "https://a/1")])
+        self.assertFalse(models.PodcastGenresOrdered.objects.exclude(podcast=first).exists())
+
+    def test_single_conflicting_row_inserts_nothing(self):
+        models.Podcast.objects.bulk_create([models.Podcast(apple_podcasts_id="1", title="First", host="Other")])
+        self.assertEqual(podcast_import.insert_new_podcasts([podcast_import.podcast_from_itunes(self.ITEMS[0])]), {})
+
+
+class PodcastFeedRefreshTests(TestCase):
+    def test_lookup_without_feed_is_recorded_and_not_repeated(self):
+        models.Podcast.objects.bulk_create([
+            models.Podcast(apple_podcasts_id="1", title="Found", host="Host"),
+            models.Podcast(apple_podcasts_id="2", title="Missing", host="Host"),
+        ])
+        feed = SimpleNamespace(not_modified=False, etag="", last_modified="", description="About")
+        lookup = mock.AsyncMock(return_value={"1": {"feedUrl": "https://feed/1"}})
+        with mock.patch.object(podcast_feeds.iTunesService, "lookup_podcasts", lookup), \
+                mock.patch.object(podcast_feeds.iTunesService, "fetch_feed_description", mock.AsyncMock(return_value=feed)):
+            first = async_to_sync(podcast_feeds.refresh_podcast_descriptions)()
+            second = async_to_sync(podcast_feeds.refresh_podcast_descriptions)()
+
+        self.assertIsNotNone(models.Podcast.objects.get(apple_podcasts_id="2").feed_checked_at)
+        self.assertEqual((first.checked, first.lookup_missed, first.no_feed), (1, 1, 0))
+        self.assertEqual((second.checked, second.lookup_missed, second.no_feed), (1, 0, 1))
+        self.assertEqual(lookup.await_count, 1)
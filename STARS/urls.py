@@ -1,8 +1,11 @@
-# STARS/urls.py
-
-from django.urls import path
-
 # stars/urls.py
 from django.urls import path
 
-urlpatterns = [] # TEMPORARY]
\ No newline at end of file
+from . import views
+
+urlpatterns = [
+    path('uploads/', views.create_upload, name='upload-create'),
+    path('uploads/<uuid:upload_id>/', views.upload_detail, name='upload-detail'),
+    path('upstream-cache/stats/', views.upstream_cache_stats, name='upstream-cache-stats'),
+    path('metrics', views.metrics_view, name='metrics'),
+]
@@ -9,6 +9,18 @@ import json
 from typing import Optional, Any, Callable
 from asgiref.sync import sync_to_async
 
+from STARS.graphql.instrumentation import record_cache
+from STARS.services.metrics import counter
+
+CACHE_REQUESTS = counter("stars_cache_requests_total", "Cache lookups by CacheKeys prefix", ["prefix", "result"])
+
+
+def _record_lookup(key_prefix: str, hit: bool) -> None:
+    record_cache(key_prefix, hit)
+    # Keys outside CacheKeys would make unbounded label values
+    prefix = key_prefix if key_prefix in CacheKeys.PREFIXES else "other"
+    CACHE_REQUESTS.inc(prefix=prefix, result="hit" if hit else "miss")
+
 
 def make_cache_key(prefix: str, **kwargs) -> str:
     """
@@ -58,6 +70,7 @@ def cache_graphql_query(
 
             # Try to get from cache
             cached_result = await sync_to_async(cache.get)(cache_key)
+            _record_lookup(key_prefix, cached_result is not None)
             if cached_result is not None:
                 return cached_result
 
@@ -76,7 +89,9 @@ def cache_graphql_query(
 
 async def get_cached(key: str) -> Optional[Any]:
     """Get a value from cache asynchronously."""
-    return await sync_to_async(cache.get)(key)
+    value = await sync_to_async(cache.get)(key)
+    _record_lookup(key.split(":", 1)[0], value is not None)
+    return value
 
 
 async def set_cached(key: str, value: Any, timeout: int = 300) -> None:
@@ -157,4 +172,11 @@ class CacheKeys:
     PROJECTS_FROM_SONGS = "projects_from_songs"
 
     POPULAR_PROJECTS_BY_GENRE = "popular_projects_by_genre"
-    POPULAR_PODCASTS_BY_GENRE = "popular_podcasts_by_genre"
\ No newline at end of file
+    POPULAR_PODCASTS_BY_GENRE = "popular_podcasts_by_genre"
+
+    YOUTUBE_THUMBNAIL_COLOR = "youtube_thumbnail_color"
+
+
+CacheKeys.PREFIXES = frozenset(
+    value for name, value in vars(CacheKeys).items() if name.isupper() and isinstance(value, str)
+)
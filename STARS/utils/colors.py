@@ -0,0 +1,126 @@
+"""
+Colour helpers shared by the image pipelines.
+"""
+import colorsys
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# 0.5 to 0.6 is usually a good "comfortable" saturation limit.
+DEFAULT_MAX_SATURATION = 0.55
+
+# Images are shrunk to at most this many pixels per side before quantizing
+PALETTE_SAMPLE_SIZE = 64
+# Bits kept per channel when bucketing pixels (4 -> 4096 buckets)
+PALETTE_BITS = 4
+
+
+def ensure_muted_color(hex_color: str, max_saturation: float = 0.5) -> str:
+    """
+    Parses a hex color, converts to HLS, and caps the saturation.
+    Returns the modified hex string.
+    """
+    if not hex_color:
+        return None
+
+    # 1. Clean the hex string
+    hex_clean = hex_color.lstrip('#')
+    if len(hex_clean) != 6:
+        return hex_color  # Return original if malformed
+
+    # 2. Convert Hex to RGB (0-1 range)
+    r = int(hex_clean[0:2], 16) / 255.0
+    g = int(hex_clean[2:4], 16) / 255.0
+    b = int(hex_clean[4:6], 16) / 255.0
+
+    # 3. Convert RGB to HLS (Hue, Lightness, Saturation)
+    h, l, s = colorsys.rgb_to_hls(r, g, b)
+
+    # 4. "Add Gray" / Desaturate
+    # If the color is more vibrant than our limit, we clamp it down.
+    if s > max_saturation:
+        s = max_saturation
+
+        # 5. Convert back to RGB
+    r_new, g_new, b_new = colorsys.hls_to_rgb(h, l, s)
+
+    # 6. Convert back to Hex
+    def to_int(val):
+        return max(0, min(255, int(val * 255)))
+
+    return f"#{to_int(r_new):02x}{to_int(g_new):02x}{to_int(b_new):02x}"
+
+
+def muted_palette(
+        raw_colors: List[str],
+        fallback: Optional[str] = None,
+        max_saturation: float = DEFAULT_MAX_SATURATION
+) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Takes the raw hex palette of an image (most dominant first) and returns
+    the muted (primary, secondary) pair, using `fallback` for missing entries.
+    """
+    raw_primary = raw_colors[0] if len(raw_colors) > 0 else fallback
+    raw_secondary = raw_colors[1] if len(raw_colors) > 1 else fallback
+
+    return (
+        ensure_muted_color(raw_primary, max_saturation=max_saturation),
+        ensure_muted_color(raw_secondary, max_saturation=max_saturation),
+    )
+
+
+def extract_palette(image_source, count: int = 2, sample_size: int = PALETTE_SAMPLE_SIZE,
+                    bits: int = PALETTE_BITS) -> List[str]:
+    """
+    Returns the `count` most dominant colours of an image as hex strings, most
+    dominant first. `image_source` is a path or file object.
+
+    The image is downscaled first and every pixel is bucketed on a coarse RGB
+    grid; each bucket's colour is the mean of its pixels. Everything after the
+    resize is a handful of vectorized NumPy passes over a few thousand pixels.
+    """
+    with Image.open(image_source) as img:
+        # Lets the JPEG decoder skip most of the full-size decode
+        img.draft("RGB", (sample_size * 4, sample_size * 4))
+        img.thumbnail((sample_size, sample_size))
+        pixels = np.asarray(img.convert("RGBA"), dtype=np.uint8).reshape(-1, 4)
+
+    # Ignore (mostly) transparent pixels
+    pixels = pixels[pixels[:, 3] >= 128, :3]
+    if not len(pixels):
+        return []
+
+    quantized = (pixels >> (8 - bits)).astype(np.int64)
+    buckets = (quantized[:, 0] << (2 * bits)) | (quantized[:, 1] << bits) | quantized[:, 2]
+
+    size = 1 << (3 * bits)
+    counts = np.bincount(buckets, minlength=size)
+    sums = np.stack(
+        [np.bincount(buckets, weights=pixels[:, channel], minlength=size) for channel in range(3)],
+        axis=1,
+    )
+
+    top = np.argsort(counts, kind="stable")[::-1][:count]
+    top = top[counts[top] > 0]
+    means = np.rint(sums[top] / counts[top, None]).astype(int)
+
+    return [f"#{r:02x}{g:02x}{b:02x}" for r, g, b in means]
+
+
+def average_color(image_source, sample_size: int = PALETTE_SAMPLE_SIZE) -> Optional[str]:
+    """
+    Returns the mean colour of an image's opaque pixels as a hex string (what
+    `Image.quantize(colors=1)` yields), computed on a downscaled copy.
+    """
+    with Image.open(image_source) as img:
+        img.draft("RGB", (sample_size * 4, sample_size * 4))
+        img.thumbnail((sample_size, sample_size))
+        pixels = np.asarray(img.convert("RGBA"), dtype=np.uint8).reshape(-1, 4)
+
+    pixels = pixels[pixels[:, 3] >= 128, :3]
+    if not len(pixels):
+        return None
+
+    r, g, b = np.rint(pixels.mean(axis=0)).astype(int)
+    return f"#{r:02x}{g:02x}{b:02x}"
@@ -1,5 +1,140 @@
 # stars/views.py
-from django.core.management import call_command
-from django.http import HttpResponse
+import hmac
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
-import os
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from .models import MediaUpload
+from .services import media_uploads, metrics, response_cache, upstream_guard
+
+
+def _upload_payload(upload: MediaUpload) -> dict:
+    return {
+        "id": str(upload.id),
+        "kind": upload.kind,
+        "status": upload.status,
+        "total_size": upload.total_size,
+        "received_size": upload.received_size,
+        "url": upload.url,
+        "primary_color": upload.primary_color or None,
+        "secondary_color": upload.secondary_color or None,
+    }
+
+
+def _error(message: str, status: int = 400) -> JsonResponse:
+    return JsonResponse({"error": message}, status=status)
+
+
+@csrf_exempt
+async def create_upload(request):
+    """
+    POST multipart/form-data with a `file` part uploads in one request.
+    Any other POST opens a resumable session sized by the Upload-Length header;
+    the bytes are then sent with PUT /uploads/<id>/.
+    """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+
+    user = await request.auser()
+    if not user.is_authenticated:
+        return _error("Authentication required.", status=401)
+
+    kind = request.GET.get("kind") or request.headers.get("Upload-Kind")
+
+    try:
+        if request.content_type == "multipart/form-data":
+            files = await sync_to_async(lambda: request.FILES)()
+            uploaded_file = files.get("file")
+            if uploaded_file is None:
+                return _error("Missing 'file' part.")
+            upload = await media_uploads.upload_from_file(user, kind, uploaded_file)
+        else:
+            total_size = int(request.headers.get("Upload-Length", ""))
+            upload = await sync_to_async(media_uploads.start_upload)(user, kind, total_size)
+    except ValueError:
+        return _error("Upload-Length header must be an integer.")
+    except media_uploads.UploadError as e:
+        return _error(str(e))
+
+    return JsonResponse(_upload_payload(upload), status=201)
+
+
+@csrf_exempt
+async def upload_detail(request, upload_id):
+    """
+    GET returns the upload status (use `received_size` to resume).
+    PUT appends the request body at the Upload-Offset header and finalizes
+    the upload once every byte has arrived.
+    """
+    if request.method not in ("GET", "PUT"):
+        return HttpResponseNotAllowed(["GET", "PUT"])
+
+    user = await request.auser()
+    if not user.is_authenticated:
+        return _error("Authentication required.", status=401)
+
+    if request.method == "GET":
+        upload = await MediaUpload.objects.filter(pk=upload_id, user=user).afirst()
+        if not upload:
+            return _error("Upload not found.", status=404)
+        return JsonResponse(_upload_payload(upload))
+
+    try:
+        offset = int(request.headers.get("Upload-Offset", ""))
+        length = int(request.headers.get("Content-Length", ""))
+    except ValueError:
+        return _error("Upload-Offset and Content-Length headers must be integers.")
+
+    try:
+        upload = await sync_to_async(media_uploads.append_chunk, thread_sensitive=False)(
+            upload_id, user, offset, length, request.read
+        )
+        if upload.received_size == upload.total_size:
+            upload = await media_uploads.finalize_upload(upload)
+    except media_uploads.UploadError as e:
+        return _error(str(e), status=409)
+
+    return JsonResponse(_upload_payload(upload))
+
+
+async def upstream_cache_stats(request):
+    """
+    Staff-only: hit/miss counters of the upstream response cache, and circuit
+    breaker state / refusals per upstream, for this worker process.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    user = await request.auser()
+    if not user.is_staff and not user.is_superuser:
+        return _error("Staff only.", status=403)
+
+    return JsonResponse({
+        "endpoints": response_cache.stats.snapshot(),
+        "upstreams": upstream_guard.snapshot(),
+    })
+
+
+async def metrics_view(request):
+    """
+    Prometheus metrics of every worker process (see services/metrics.py).
+    Scrapers send `Authorization: Bearer <METRICS_TOKEN>`; without a token
+    configured, only staff can read them.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    token = settings.METRICS_TOKEN
+    if token:
+        sent = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+        if not hmac.compare_digest(sent.encode(), token.encode()):
+            return _error("Invalid metrics token.", status=403)
+    else:
+        user = await request.auser()
+        if not user.is_staff and not user.is_superuser:
+            return _error("Staff only.", status=403)
+
+    body = await sync_to_async(metrics.render, thread_sensitive=False)()
+    return HttpResponse(body, content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -13,6 +13,7 @@ from channels.auth import AuthMiddlewareStack
 from django.urls import re_path
 from strawberry.channels.handlers.ws_handler import GraphQLWSConsumer
 from STARS.graphql.schema import schema
+from STARS.services.http import HTTPClientLifespan
 
 # 3. Define the WebSocket routing explicitly
 websocket_urlpatterns = [
@@ -20,7 +21,8 @@ websocket_urlpatterns = [
     re_path(r"^graphql/?$", GraphQLWSConsumer.as_asgi(schema=schema)),
 ]
 
-application = ProtocolTypeRouter({
+# Lifespan events close the shared outbound HTTP clients on shutdown
+application = HTTPClientLifespan(ProtocolTypeRouter({
     # 4. Standard HTTP requests go to Django
     "http": django_asgi_app,
 
@@ -28,4 +30,4 @@ application = ProtocolTypeRouter({
     "websocket": AuthMiddlewareStack(
         URLRouter(websocket_urlpatterns)
     ),
-})
\ No newline at end of file
+}))
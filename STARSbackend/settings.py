@@ -4,6 +4,7 @@ from pathlib import Path
 from decouple import config
 import dj_database_url
 import os
+import tempfile
 import cloudinary
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -183,6 +184,70 @@ DATABASES = {
 #50 MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 52428800
 
+# --- Media uploads ---
+MEDIA_STORAGE_BACKEND = config('MEDIA_STORAGE_BACKEND', default='STARS.services.storage.CloudinaryStorage')
+# Where uploads are spooled on disk before they are sent to storage
+UPLOAD_SPOOL_DIR = config('UPLOAD_SPOOL_DIR', default=os.path.join(tempfile.gettempdir(), 'stars-uploads'))
+#100 MB
+UPLOAD_MAX_SIZE = config('UPLOAD_MAX_SIZE', default=104857600, cast=int)
+#8 MB
+UPLOAD_MAX_CHUNK_SIZE = config('UPLOAD_MAX_CHUNK_SIZE', default=8388608, cast=int)
+# Seconds an upload session may go without a chunk before `manage.py expire_uploads` fails it
+UPLOAD_PENDING_TTL = config('UPLOAD_PENDING_TTL', default=86400, cast=int)
+
+# --- Upstream response cache (Apple Music / iTunes / YouTube) ---
+# Per-endpoint overrides in seconds, merged over the defaults in
+# STARS/services/response_cache.py, e.g. {"apple_music.search": 300}. 0 disables.
+UPSTREAM_CACHE_TTLS = {}
+# How long an expired entry with an ETag is kept around for revalidation
+UPSTREAM_CACHE_REVALIDATE_FOR = config('UPSTREAM_CACHE_REVALIDATE_FOR', default=86400, cast=int)
+
+# --- GraphQL persisted queries (STARS/graphql/persisted_queries.py) ---
+# "auto": clients may register queries by hash; "allowlist": only queries
+# registered with `manage.py register_persisted_queries` run; "off".
+GRAPHQL_PERSISTED_QUERIES = config('GRAPHQL_PERSISTED_QUERIES', default='auto')
+# Parsed documents kept per worker
+GRAPHQL_PERSISTED_QUERIES_LRU_SIZE = config('GRAPHQL_PERSISTED_QUERIES_LRU_SIZE', default=512, cast=int)
+# How long a client-registered query text is kept in the shared cache
+GRAPHQL_PERSISTED_QUERIES_TTL = 30 * 86400
+
+# Seconds a public GraphQL response is cached (STARS/graphql/operation_cache.py); 0 disables
+GRAPHQL_RESPONSE_CACHE_TTL = config('GRAPHQL_RESPONSE_CACHE_TTL', default=60, cast=int)
+
+# --- GraphQL query cost limits (STARS/graphql/query_cost.py) ---
+GRAPHQL_MAX_DEPTH = config('GRAPHQL_MAX_DEPTH', default=10, cast=int)
+GRAPHQL_MAX_ALIASES = config('GRAPHQL_MAX_ALIASES', default=30, cast=int)
+GRAPHQL_MAX_COST = config('GRAPHQL_MAX_COST', default=20000, cast=int)
+# Per-document budgets by persisted query hash (as `register_persisted_queries` prints it),
+# e.g. {"4f1c...e9": 50000}
+GRAPHQL_OPERATION_COST_BUDGETS = {}
+# Cost points each client (user, or IP when anonymous) may spend per second, and its burst; 0 disables
+GRAPHQL_COST_RATE = config('GRAPHQL_COST_RATE', default=2000, cast=int)
+GRAPHQL_COST_BURST = config('GRAPHQL_COST_BURST', default=40000, cast=int)
+# Reverse proxies in front of the app that append to X-Forwarded-For (Render's load balancer);
+# anonymous clients are throttled by the address the outermost one saw. 0 uses REMOTE_ADDR
+GRAPHQL_TRUSTED_PROXY_COUNT = config('GRAPHQL_TRUSTED_PROXY_COUNT', default=1, cast=int)
+
+# Share of GraphQL operations timed per resolver (STARS/graphql/instrumentation.py); staff can
+# request timings for a single operation with the "X-Stars-Timing: 1" header
+GRAPHQL_INSTRUMENTATION_SAMPLE_RATE = config('GRAPHQL_INSTRUMENTATION_SAMPLE_RATE', default=0.01, cast=float)
+
+# --- approximateTotalCount (STARS/graphql/counts.py) ---
+# Rows under which a count is run exactly rather than estimated
+GRAPHQL_APPROXIMATE_COUNT_THRESHOLD = config('GRAPHQL_APPROXIMATE_COUNT_THRESHOLD', default=1000, cast=int)
+# Seconds a filtered exact count is reused
+GRAPHQL_COUNT_CACHE_TTL = config('GRAPHQL_COUNT_CACHE_TTL', default=30, cast=int)
+# Statement timeout of those exact counts; the estimate is returned past it
+GRAPHQL_EXACT_COUNT_TIMEOUT_MS = config('GRAPHQL_EXACT_COUNT_TIMEOUT_MS', default=200, cast=int)
+
+# --- Metrics (/metrics, STARS/services/metrics.py) ---
+# Bearer token for Prometheus scrapers; when empty only staff can read /metrics
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+# Seconds between pushes of each worker's metrics to Redis; 0 keeps them per process
+METRICS_PUSH_INTERVAL = config('METRICS_PUSH_INTERVAL', default=5, cast=int)
+# Distinct GraphQL operation names kept apart in metric labels; later ones are counted as "other"
+METRICS_MAX_OPERATION_NAMES = config('METRICS_MAX_OPERATION_NAMES', default=300, cast=int)
+
 
 # --- Password validation ---
 AUTH_PASSWORD_VALIDATORS = [